@@ -1,14 +1,17 @@
 import cv2
 import numpy as np
 import os
+import threading
+import time
+import traceback
 from PIL import Image
 from PySide6.QtGui import *
 from PySide6.QtWidgets import *
-from PySide6.QtCore import Signal, QObject, Slot, Qt
+from PySide6.QtCore import Signal, QObject, QThread, QTimer, Slot, Qt
 import resources as res
 import segment_engine as seg
 import widgets as wid
-import re
+from sahi.utils.progress import format_duration
 
 # parameters
 # path (change if necessary)
@@ -16,6 +19,8 @@ OUT_BINARY_MASK = 'combined_binary_mask.png'
 OUT_COLOR_MASK = 'combined_color_mask.png'
 OUT_BINARY_SKELETON = 'skeleton_image.png'
 OUT_COLOR_SKELETON = 'skeleton_color.png'
+# maximum duration of a segmentation job (in seconds) before it is aborted
+SEGMENTATION_TIMEOUT = 30 * 60
 
 """
 class CustomOutputStream(QObject):
@@ -34,11 +39,68 @@ sys.stdout = CustomOutputStream()
 """
 
 
+class SegmentationCancelled(Exception):
+    pass
+
+
 class Helper(QObject):
-    updateSignal = Signal(str)
+    # Qt adapter of the progress events of the segmentation (sahi.utils.progress.ProgressEvent)
+    updateSignal = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self._cancel_event = threading.Event()
+        self._deadline = None
+
+    def start(self, timeout=None):
+        # reset the cancellation state before a new job
+        self._cancel_event.clear()
+        self._deadline = time.monotonic() + timeout if timeout else None
+
+    def cancel(self):
+        self._cancel_event.set()
 
-    def emit_update(self, value):
-        self.updateSignal.emit(value)
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise SegmentationCancelled('Segmentation cancelled')
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise SegmentationCancelled('Segmentation timed out')
+
+    def __call__(self, event):
+        # called from the worker thread: abort the job here if requested,
+        # the signal itself is queued to the GUI thread by Qt
+        self.check_cancelled()
+        self.updateSignal.emit(event)
+
+
+class SegmentationWorker(QObject):
+    """
+    Runs the YOLO segmentation and the mask/skeleton/graph computation outside of the GUI thread.
+    Outputs are written to temporary files, the GUI thread moves them in place when the job succeeds.
+    """
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal(str)
+
+    def __init__(self, helper, image_path, output_paths):
+        super().__init__()
+        self.helper = helper
+        self.image_path = image_path
+        self.output_paths = output_paths
+
+    @Slot()
+    def run(self):
+        try:
+            binary = seg.get_binary_mask(self.helper, self.image_path)
+            self.helper.check_cancelled()
+            outputs = seg.compute_outputs_from_binary(binary, *self.output_paths)
+            self.helper.check_cancelled()
+        except SegmentationCancelled as e:
+            self.cancelled.emit(str(e))
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+        else:
+            self.finished.emit(outputs)
 
 
 class CustomDoubleValidator(QDoubleValidator):
@@ -257,6 +319,8 @@ class CrackApp(QMainWindow):
         self.output_color_mask = OUT_COLOR_MASK
         self.output_skeleton = OUT_BINARY_SKELETON
         self.output_color_skeleton = OUT_COLOR_SKELETON
+        self.segment_thread = None
+        self.segment_worker = None
 
         # initialize status
         self.update_progress(nb=100, text="Load an image first!")
@@ -285,6 +349,8 @@ class CrackApp(QMainWindow):
         self.pushButton_show_linemeas.clicked.connect(self.toggle_all_meas)
         self.pushButton_export.clicked.connect(self.export_view)
         self.pushButton_export_view.clicked.connect(self.export_current_view)
+        self.pushButton_cancel.clicked.connect(self.cancel_segment)
+        self.pushButton_cancel.setVisible(False)
 
         # drawing ends
         self.viewer.endDrawing_line_meas.connect(self.get_line_meas)
@@ -563,25 +629,12 @@ class CrackApp(QMainWindow):
                 self.viewer.clean_scene()
                 self.viewer.setPhoto(white_pixmap)
 
+    def output_paths(self):
+        return [self.output_binary_mask, self.output_color_mask, self.output_skeleton, self.output_color_skeleton]
+
     def compute_all_outputs_from_binary(self, binary):
-        color_mask = seg.binary_to_color_mask(binary)
-        skel = seg.binary_to_skeleton(binary)
-        color_skel = seg.binary_to_color_mask(skel)
-
-        # save the 4 images
-        image = Image.fromarray(binary)
-        image.save(self.output_binary_mask)
-        image = Image.fromarray(color_mask)
-        image.save(self.output_color_mask)
-        image = Image.fromarray(skel)
-        image.save(self.output_skeleton)
-        image = Image.fromarray(color_skel)
-        image.save(self.output_color_skeleton)
-
-        # compute junctions from skeleton image
-        self.junctions, self.endpoints = seg.find_junctions_endpoints(self.output_skeleton)
-        self.graph = seg.build_graph(self.junctions, self.endpoints, skel)
-        self.lookup_table = seg.segment_lookup_table(self.graph)
+        outputs = seg.compute_outputs_from_binary(binary, *self.output_paths())
+        self.junctions, self.endpoints, self.graph, self.lookup_table = outputs
 
         # seg.visualize_graph(self.graph, skel)
 
@@ -597,15 +650,62 @@ class CrackApp(QMainWindow):
             self.toggle_all_meas()
 
     def go_segment(self):
-        # execute YOLO script
+        # execute YOLO script in a worker thread
+        if self.segment_thread is not None:
+            return
         self.hand_pan()
 
         self.update_progress(text="Segmenting image with yolo!", nb=0)
-
-        result = seg.get_segmentation_result(self.helper, self.image_path)
-        binary = seg.create_binary_from_yolo(result)
-
-        self.compute_all_outputs_from_binary(binary)
+        self.set_segment_running(True)
+
+        # outputs are written next to the final files and moved in place when the job succeeds
+        tmp_paths = [self.temporary_output_path(path) for path in self.output_paths()]
+
+        self.helper.start(timeout=SEGMENTATION_TIMEOUT)
+        self.segment_thread = QThread(self)
+        self.segment_worker = SegmentationWorker(self.helper, self.image_path, tmp_paths)
+        self.segment_worker.moveToThread(self.segment_thread)
+
+        self.segment_thread.started.connect(self.segment_worker.run)
+        self.segment_worker.finished.connect(self.segment_finished)
+        self.segment_worker.failed.connect(self.segment_failed)
+        self.segment_worker.cancelled.connect(self.segment_cancelled)
+        for signal in (self.segment_worker.finished, self.segment_worker.failed, self.segment_worker.cancelled):
+            signal.connect(self.segment_thread.quit)
+        self.segment_thread.finished.connect(self.segment_worker.deleteLater)
+        self.segment_thread.finished.connect(self.segment_thread_done)
+
+        self.segment_thread.start()
+
+    def cancel_segment(self):
+        if self.segment_thread is not None:
+            self.helper.cancel()
+            self.pushButton_cancel.setEnabled(False)
+            self.update_progress(text="Cancelling segmentation...")
+
+    def temporary_output_path(self, path):
+        root, ext = os.path.splitext(path)
+        return root + '.part' + ext
+
+    def set_segment_running(self, running):
+        # viewing, panning and measuring stay available while a job runs
+        self.actionSegment.setEnabled(not running)
+        self.actionLoad_image.setEnabled(not running)
+        self.actionPaint_mask.setEnabled(not running)
+        self.actionEraser_mask.setEnabled(not running)
+        self.pushButton_cancel.setVisible(running)
+        self.pushButton_cancel.setEnabled(running)
+
+    def segment_thread_done(self):
+        self.segment_thread.deleteLater()
+        self.segment_thread = None
+        self.segment_worker = None
+        self.set_segment_running(False)
+
+    def segment_finished(self, outputs):
+        for path in self.output_paths():
+            os.replace(self.temporary_output_path(path), path)
+        self.junctions, self.endpoints, self.graph, self.lookup_table = outputs
         self.has_mask = True
 
         self.update_progress(text="You can now modify the mask!", nb=100)
@@ -619,21 +719,41 @@ class CrackApp(QMainWindow):
 
         self.update_view()
 
-    def update_yolo_steps(self, text):
-        def extract_numbers(input_string):
-            # This regex pattern looks for two groups of one or more digits,
-            # separated by a non-digit character (like '/')
-            match = re.search(r'(\d+)[^\d]+(\d+)', input_string)
-            if match:
-                first_number = int(match.group(1))
-                second_number = int(match.group(2))
-                return first_number, second_number
-            else:
-                return None, None
-
-        i, num_slices = extract_numbers(text)
-        print(i, num_slices)
-        self.update_progress(text=f'Segmenting slice {i}/{num_slices}', nb=i / num_slices * 100)
+    def remove_temporary_outputs(self):
+        for path in self.output_paths():
+            tmp_path = self.temporary_output_path(path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def segment_failed(self, error):
+        print(error)
+        self.remove_temporary_outputs()
+        self.update_progress(text="Segmentation failed, see console for details", nb=100)
+
+    def segment_cancelled(self, reason):
+        self.remove_temporary_outputs()
+        self.update_progress(text=reason, nb=100)
+
+    def closeEvent(self, event):
+        # stop a running job before the window (and the helper it reports to) is destroyed
+        if self.segment_thread is not None:
+            self.helper.cancel()
+            self.segment_thread.quit()
+            self.segment_thread.wait()
+        super().closeEvent(event)
+
+    def update_yolo_steps(self, event):
+        if event.fraction is None:
+            # plain status messages, e.g. while the model is still loading
+            self.update_progress(text=event.message or event.stage)
+            return
+        if event.stage == 'prediction':
+            text = f'Segmenting slice {event.completed}/{event.total}'
+        else:
+            text = f'{event.stage.capitalize()}...'
+        if event.eta_seconds is not None and event.completed < event.total:
+            text += f' ({format_duration(event.eta_seconds)} left)'
+        self.update_progress(text=text, nb=event.fraction * 100)
 
     def onOutput(self, text):
         if text == 'read':
@@ -794,6 +914,9 @@ def main(argv=None):
     window = CrackApp(is_dark_theme)
     window.showMaximized()
 
+    # load the segmentation model in the background once the window is shown
+    QTimer.singleShot(0, seg.detection_model.start)
+
     # run the application if necessary
     if (app):
         return app.exec_()
@@ -1,6 +1,26 @@
 __version__ = "0.11.15"
 
-from sahi.annotation import BoundingBox, Category, Mask
-from sahi.auto_model import AutoDetectionModel
-from sahi.models.base import DetectionModel
-from sahi.prediction import ObjectPrediction
+import importlib
+
+# top level names are imported on first access, so that importing lightweight modules
+# (e.g. sahi.prefilter, sahi.cache) does not import torch through sahi.models
+_LAZY_ATTRIBUTES = {
+    "BoundingBox": "sahi.annotation",
+    "Category": "sahi.annotation",
+    "Mask": "sahi.annotation",
+    "AutoDetectionModel": "sahi.auto_model",
+    "DetectionModel": "sahi.models.base",
+    "ObjectPrediction": "sahi.prediction",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -7,20 +7,9 @@ from typing import Dict, List, Optional
 import numpy as np
 
 from sahi.utils.coco import CocoAnnotation, CocoPrediction
-from sahi.utils.cv import (
-    get_bbox_from_bool_mask,
-    get_bool_mask_from_coco_segmentation,
-    get_coco_segmentation_from_bool_mask,
-)
+from sahi.utils.cv import get_bool_mask_from_coco_segmentation, get_coco_segmentation_from_bool_mask
 from sahi.utils.shapely import ShapelyAnnotation
 
-try:
-    from pycocotools import mask as mask_utils
-
-    use_rle = True
-except ImportError:
-    use_rle = False
-
 
 class BoundingBox:
     """
@@ -194,13 +183,49 @@ class Mask:
             full_shape=full_shape,
         )
 
+    @classmethod
+    def from_crop(
+        cls,
+        crop,
+        offset: List[int],
+        shape: List[int],
+        full_shape=None,
+        shift_amount: list = [0, 0],
+        packed: bool = False,
+    ):
+        """
+        Init Mask from the region of the mask around the object, without a mask sized array.
+
+        Args:
+            crop: np.ndarray
+                2D mask region, non-zero pixels belong to the object
+            offset: List
+                Position of the region in the mask, should be in the form of [x, y]
+            shape: List
+                Size of the mask, should be in the form of [height, width]
+            full_shape: List
+                Size of the full image after shifting, should be in the form of [height, width]
+            shift_amount: List
+                To shift the box and mask predictions from sliced image to full
+                sized image, should be in the form of [shift_x, shift_y]
+            packed: bool
+                If True, the region is stored bit-packed
+        """
+        mask = cls(bool_mask=None, full_shape=full_shape or shape, shift_amount=shift_amount, packed=packed)
+        mask._set_crop(crop, offset, shape)
+        return mask
+
     def __init__(
         self,
         bool_mask=None,
         full_shape=None,
         shift_amount: list = [0, 0],
+        packed: bool = False,
     ):
         """
+        Only the region around the non-zero pixels of bool_mask is stored, together with its offset
+        and the mask shape. Mask sized arrays are only created when bool_mask is accessed.
+
         Args:
             bool_mask: np.ndarray with bool elements
                 2D mask of object, should have a shape of height*width
@@ -209,17 +234,20 @@ class Mask:
             shift_amount: List
                 To shift the box and mask predictions from sliced image to full
                 sized image, should be in the form of [shift_x, shift_y]
-        """
-
-        if len(bool_mask) > 0:
-            has_bool_mask = True
-        else:
-            has_bool_mask = False
-
+            packed: bool
+                If True, the mask region is stored bit-packed (8x smaller, unpacked on access)
+        """
+        self.packed = packed
+        self._crop = None
+        self._crop_shape = (0, 0)
+        self.offset_x = 0
+        self.offset_y = 0
+        self.shape_height = None
+        self.shape_width = None
+
+        has_bool_mask = bool_mask is not None and len(bool_mask) > 0
         if has_bool_mask:
-            self._mask = self.encode_bool_mask(bool_mask)
-        else:
-            self._mask = None
+            self._set_crop(bool_mask, [0, 0], np.shape(bool_mask))
 
         self.shift_x = shift_amount[0]
         self.shift_y = shift_amount[1]
@@ -228,34 +256,75 @@ class Mask:
             self.full_shape_height = full_shape[0]
             self.full_shape_width = full_shape[1]
         elif has_bool_mask:
-            self.full_shape_height = self.bool_mask.shape[0]
-            self.full_shape_width = self.bool_mask.shape[1]
+            self.full_shape_height = self.shape_height
+            self.full_shape_width = self.shape_width
         else:
             self.full_shape_height = None
             self.full_shape_width = None
 
-    def encode_bool_mask(self, bool_mask):
-        _mask = bool_mask
-        if use_rle:
-            _mask = mask_utils.encode(np.asfortranarray(bool_mask.astype(np.uint8)))
-        return _mask
+    def _set_crop(self, crop, offset: List[int], shape: List[int]):
+        # trims crop to its non-zero pixels
+        crop = np.asarray(crop).astype(bool, copy=False)
+        rows = np.flatnonzero(crop.any(axis=1))
+        cols = np.flatnonzero(crop.any(axis=0))
+        if len(rows) > 0:
+            crop = crop[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1]
+            offset = [offset[0] + int(cols[0]), offset[1] + int(rows[0])]
+        else:
+            crop = np.zeros((0, 0), dtype=bool)
+            offset = [0, 0]
+        self.offset_x, self.offset_y = int(offset[0]), int(offset[1])
+        self.shape_height, self.shape_width = int(shape[0]), int(shape[1])
+        self._crop_shape = crop.shape
+        self._crop = np.packbits(crop) if self.packed else np.ascontiguousarray(crop)
 
-    def decode_bool_mask(self, bool_mask):
-        _mask = bool_mask
-        if use_rle:
-            _mask = mask_utils.decode(bool_mask).astype(bool)
-        return _mask
+    @property
+    def crop(self):
+        """
+        Returns the region of the mask around the object as a 2D bool array, see offset
+        """
+        if self._crop is None:
+            return None
+        if self.packed:
+            height, width = self._crop_shape
+            return np.unpackbits(self._crop, count=height * width).reshape(height, width).astype(bool)
+        return self._crop
+
+    @property
+    def offset(self):
+        """
+        Returns the position of crop in the mask as [x, y]
+        """
+        return [self.offset_x, self.offset_y]
 
     @property
     def bool_mask(self):
-        return self.decode_bool_mask(self._mask)
+        """
+        Returns the mask sized 2D bool array, allocated on each access
+        """
+        if self._crop is None:
+            return None
+        bool_mask = np.zeros((self.shape_height, self.shape_width), dtype=bool)
+        height, width = self._crop_shape
+        bool_mask[self.offset_y : self.offset_y + height, self.offset_x : self.offset_x + width] = self.crop
+        return bool_mask
+
+    def get_bbox(self):
+        """
+        Returns the bbox of the non-zero pixels in mask coordinates as [xmin, ymin, xmax, ymax]
+        (max coordinates included, as get_bbox_from_bool_mask), None if the mask is empty or flat.
+        """
+        height, width = self._crop_shape
+        if height < 2 or width < 2:
+            return None
+        return [self.offset_x, self.offset_y, self.offset_x + width - 1, self.offset_y + height - 1]
 
     @property
     def shape(self):
         """
         Returns mask shape as [height, width]
         """
-        return [self.bool_mask.shape[0], self.bool_mask.shape[1]]
+        return [self.shape_height, self.shape_width]
 
     @property
     def full_shape(self):
@@ -275,32 +344,24 @@ class Mask:
         # Confirm full_shape is specified
         if (self.full_shape_height is None) or (self.full_shape_width is None):
             raise ValueError("full_shape is None")
-        # init full mask
-        mask_fullsized = np.full(
-            (
-                self.full_shape_height,
-                self.full_shape_width,
-            ),
-            0,
-            dtype="float32",
-        )
-
-        # arrange starting ending indexes
-        starting_pixel = [self.shift_x, self.shift_y]
-        ending_pixel = [
-            min(starting_pixel[0] + self.bool_mask.shape[1], self.full_shape_width),
-            min(starting_pixel[1] + self.bool_mask.shape[0], self.full_shape_height),
-        ]
-
-        # convert sliced mask to full mask
-        mask_fullsized[starting_pixel[1] : ending_pixel[1], starting_pixel[0] : ending_pixel[0]] = self.bool_mask[
-            : ending_pixel[1] - starting_pixel[1], : ending_pixel[0] - starting_pixel[0]
-        ]
 
-        return Mask(
-            mask_fullsized,
-            shift_amount=[0, 0],
+        # only the offset moves, the region is clipped to the part lying inside the mask and the full image
+        crop = self.crop
+        height, width = self._crop_shape
+        xmin = max(self.offset_x, 0)
+        ymin = max(self.offset_y, 0)
+        xmax = min(self.offset_x + width, self.shape_width, self.full_shape_width - self.shift_x)
+        ymax = min(self.offset_y + height, self.shape_height, self.full_shape_height - self.shift_y)
+        ymax, xmax = max(ymax, ymin), max(xmax, xmin)
+        crop = crop[ymin - self.offset_y : ymax - self.offset_y, xmin - self.offset_x : xmax - self.offset_x]
+
+        return Mask.from_crop(
+            crop,
+            offset=[xmin + self.shift_x, ymin + self.shift_y],
+            shape=self.full_shape,
             full_shape=self.full_shape,
+            shift_amount=[0, 0],
+            packed=self.packed,
         )
 
     def to_coco_segmentation(self):
@@ -312,7 +373,13 @@ class Mask:
             ...
         ]
         """
-        coco_segmentation = get_coco_segmentation_from_bool_mask(self.bool_mask)
+        if self._crop is None or 0 in self._crop_shape:
+            return []
+        # polygons are traced on the region only, then moved to mask coordinates
+        coco_segmentation = get_coco_segmentation_from_bool_mask(self.crop)
+        for segmentation in coco_segmentation:
+            segmentation[0::2] = [x + self.offset_x for x in segmentation[0::2]]
+            segmentation[1::2] = [y + self.offset_y for y in segmentation[1::2]]
         return coco_segmentation
 
 
@@ -544,6 +611,7 @@ class ObjectAnnotation:
         category_name: Optional[str] = None,
         shift_amount: Optional[List[int]] = [0, 0],
         full_shape: Optional[List[int]] = None,
+        mask: Optional[Mask] = None,
     ):
         """
         Args:
@@ -561,19 +629,23 @@ class ObjectAnnotation:
             full_shape: List
                 Size of the full image after shifting, should be in
                 the form of [height, width]
+            mask: Mask
+                Mask of the object, used as is instead of bool_mask (e.g. a shifted or cropped Mask)
         """
         if not isinstance(category_id, int):
             raise ValueError("category_id must be an integer")
-        if (bbox is None) and (bool_mask is None):
+        if (bbox is None) and (bool_mask is None) and (mask is None):
             raise ValueError("you must provide a bbox or bool_mask")
 
-        if bool_mask is not None:
-            self.mask = Mask(
+        if mask is None and bool_mask is not None:
+            mask = Mask(
                 bool_mask=bool_mask,
                 shift_amount=shift_amount,
                 full_shape=full_shape,
             )
-            bbox_from_bool_mask = get_bbox_from_bool_mask(bool_mask)
+        if mask is not None:
+            self.mask = mask
+            bbox_from_bool_mask = mask.get_bbox()
             # https://github.com/obss/sahi/issues/235
             if bbox_from_bool_mask is not None:
                 bbox = bbox_from_bool_mask
@@ -695,13 +767,14 @@ class ObjectAnnotation:
 
     def get_shifted_object_annotation(self):
         if self.mask:
+            shifted_mask = self.mask.get_shifted_mask()
             return ObjectAnnotation(
                 bbox=self.bbox.get_shifted_box().to_xyxy(),
                 category_id=self.category.id,
-                bool_mask=self.mask.get_shifted_mask().bool_mask,
+                mask=shifted_mask,
                 category_name=self.category.name,
                 shift_amount=[0, 0],
-                full_shape=self.mask.get_shifted_mask().full_shape,
+                full_shape=shifted_mask.full_shape,
             )
         else:
             return ObjectAnnotation(
@@ -4,6 +4,7 @@ from sahi.utils.file import import_model_class
 
 MODEL_TYPE_TO_MODEL_CLASS_NAME = {
     "yolov8": "Yolov8DetectionModel",
+    "yolov8onnx": "OnnxYolov8SegDetectionModel",
     "mmdet": "MmdetDetectionModel",
     "yolov5": "Yolov5DetectionModel",
     "detectron2": "Detectron2DetectionModel",
@@ -11,6 +12,7 @@ MODEL_TYPE_TO_MODEL_CLASS_NAME = {
     "torchvision": "TorchVisionDetectionModel",
     "yolov5sparse": "Yolov5SparseDetectionModel",
     "yolonas": "YoloNasDetectionModel",
+    "remote": "RemoteDetectionModel",
 }
 
 
@@ -54,6 +56,8 @@ class AutoDetectionModel:
                 If True, automatically loads the model at initalization
             image_size: int
                 Inference input size.
+            **kwargs:
+                Model specific arguments, e.g. precision ("fp32", "bf16" or "int8") for "yolov8".
         Returns:
             Returns an instance of a DetectionModel
         Raises:
@@ -0,0 +1,309 @@
+# OBSS SAHI Tool
+# Disk caches for prediction results.
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from sahi.prediction import ObjectPrediction, object_prediction_list_from_compact, object_prediction_list_to_compact
+from sahi.utils.file import get_file_hash
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_EXTENSION = ".pkl"
+
+
+@lru_cache(maxsize=64)
+def _get_file_hash(path: str, size: int, mtime_ns: int) -> str:
+    # size and mtime are part of the lru key, a modified file is hashed again
+    return get_file_hash(path)
+
+
+def get_cached_file_hash(path: str) -> str:
+    """
+    Returns the content hash of the file at path, only hashing it again when its size or modification time changed.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return _get_file_hash(path, stat.st_size, stat.st_mtime_ns)
+
+
+def get_image_hash(image) -> str:
+    """
+    Returns a content hash of an image given as a file path, a numpy array or a PIL image.
+    """
+    if isinstance(image, (str, os.PathLike)):
+        return get_cached_file_hash(str(image))
+    image = np.ascontiguousarray(image)
+    hasher = hashlib.sha256(f"{image.dtype.str}{image.shape}".encode())
+    hasher.update(memoryview(image).cast("B"))
+    return hasher.hexdigest()
+
+
+class DiskCache:
+    """
+    Directory of pickled entries with size-based LRU eviction. Entry modification times are used as
+    last access times, so that no index has to be kept consistent between processes.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = 1 << 30):
+        """
+        Args:
+            cache_dir: str
+                Directory of the cache entries, created if missing.
+            max_size_bytes: int
+                Least recently used entries are evicted when the cache grows larger than this size.
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(**fields) -> str:
+        """
+        Returns a cache key from json serializable fields.
+        """
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CACHE_FILE_EXTENSION)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key: str):
+        """
+        Returns the entry stored under key, or None if there is none or it can not be read.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"removing unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry, evict: bool = True):
+        """
+        Stores entry under key, then evicts least recently used entries if the cache is too large.
+        Callers storing many entries in a row can pass evict=False and call evict() once afterwards.
+        """
+        # write to a temporary file first so that readers never see a partial entry
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_size_bytes.
+        """
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(CACHE_FILE_EXTENSION):
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def clear(self):
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(CACHE_FILE_EXTENSION):
+                self._remove(os.path.join(self.cache_dir, file_name))
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class CachedPredictionResult:
+    """
+    Whole-image result read from a PredictionResultCache. The merged binary mask is decoded on
+    load, predictions are only expanded to full image masks when object_prediction_list is accessed.
+    """
+
+    def __init__(self, entry: Dict):
+        self.shape = tuple(entry["shape"])
+        bits = np.unpackbits(np.frombuffer(entry["binary_mask"], dtype=np.uint8), count=int(np.prod(self.shape)))
+        self.binary_mask = bits.reshape(self.shape) * np.uint8(255)
+        self.compact_prediction_list: List[Dict] = entry["predictions"]
+        self.metadata: Dict = entry.get("metadata", {})
+
+    @property
+    def object_prediction_list(self) -> List[ObjectPrediction]:
+        return object_prediction_list_from_compact(self.compact_prediction_list, full_shape=list(self.shape))
+
+
+class PredictionResultCache(DiskCache):
+    """
+    Disk cache of whole-image segmentation results, keyed by the image content hash, the model file
+    hash (or the key of a remote model) and the prediction parameters. Entries hold the final merged binary mask (bit-packed) and
+    the merged predictions with bbox-cropped bit-packed masks.
+    """
+
+    def make_result_key(
+        self, image_path: str, model_path: Optional[str], model_key: Optional[str] = None, **parameters
+    ) -> str:
+        """
+        Args:
+            image_path: str
+                Path of the predicted image, its content is hashed.
+            model_path: str
+                Path of the model weights, its content is hashed. Not used when model_key is given.
+            model_key: str
+                Identity of a model without local weights, e.g. the remote_model_key of
+                sahi.models.remote.RemoteDetectionModel.
+            parameters:
+                Any parameter changing the result, e.g. slice size, overlap ratio, confidence threshold.
+        """
+        return self.make_key(
+            image=get_cached_file_hash(image_path),
+            model=model_key if model_key is not None else get_cached_file_hash(model_path),
+            parameters=parameters,
+        )
+
+    def get_result(self, key: str) -> Optional[CachedPredictionResult]:
+        entry = self.get(key)
+        if entry is None:
+            return None
+        return CachedPredictionResult(entry)
+
+    def put_result(
+        self,
+        key: str,
+        binary_mask: np.ndarray,
+        object_prediction_list: List[ObjectPrediction],
+        metadata: Optional[Dict] = None,
+    ):
+        """
+        Args:
+            key: str
+                Key from make_result_key.
+            binary_mask: np.ndarray
+                Final merged mask of the image, non-zero pixels are foreground.
+            object_prediction_list: List[ObjectPrediction]
+                Merged predictions of the image.
+            metadata: dict
+                Optional json serializable information stored with the entry (e.g. durations).
+        """
+        entry = {
+            "shape": list(binary_mask.shape),
+            "binary_mask": np.packbits(binary_mask > 0).tobytes(),
+            "predictions": object_prediction_list_to_compact(object_prediction_list),
+            "metadata": metadata or {},
+        }
+        self.put(key, entry)
+
+
+class WindowPredictionCache(DiskCache):
+    """
+    Disk cache of raw per-window predictions, keyed by the image content hash, the window coordinates
+    and the model. Windows shared between runs with different overlap ratios are only predicted once.
+
+    Each entry remembers the confidence threshold it was predicted with. Since predictions below the
+    threshold are dropped after inference, an entry can serve any threshold greater than or equal to
+    its own by filtering on score, lower thresholds are a miss.
+    """
+
+    @staticmethod
+    def make_model_key(detection_model) -> str:
+        """
+        Returns a key identifying the weights and every model setting that changes its raw predictions,
+        except confidence_threshold which is handled per entry.
+        """
+        model_path = detection_model.model_path
+        if model_path is not None and os.path.isfile(model_path):
+            model_path = get_cached_file_hash(model_path)
+        if getattr(detection_model, "remote_model_key", None) is not None:
+            # sahi.models.remote.RemoteDetectionModel, identified by the model the server holds
+            model_path = detection_model.remote_model_key
+        return DiskCache.make_key(
+            model_type=type(detection_model).__name__,
+            model=model_path,
+            image_size=detection_model.image_size,
+            mask_threshold=detection_model.mask_threshold,
+            category_mapping=detection_model.category_mapping,
+            category_remapping=detection_model.category_remapping,
+            precision=getattr(detection_model, "precision", None),
+        )
+
+    def make_window_key(self, image_hash: str, window: List[int], model_key: str) -> str:
+        """
+        Args:
+            image_hash: str
+                Output of get_image_hash for the full image.
+            window: List[int]
+                Window as [xmin, ymin, xmax, ymax] in full image coordinates.
+            model_key: str
+                Output of make_model_key.
+        """
+        return self.make_key(image=image_hash, window=[int(coord) for coord in window], model=model_key)
+
+    def get_window(self, key: str, confidence_threshold: float) -> Optional[List[Dict]]:
+        """
+        Returns the compact predictions (see sahi.prediction.object_prediction_list_to_compact) stored
+        under key with a score >= confidence_threshold, or None if the window has to be predicted.
+        """
+        entry = self.get(key)
+        if entry is None or entry["confidence_threshold"] > confidence_threshold:
+            return None
+        return [compact for compact in entry["predictions"] if compact["score"] >= confidence_threshold]
+
+    def put_window(
+        self,
+        key: str,
+        object_prediction_list: List[ObjectPrediction],
+        confidence_threshold: float,
+        evict: bool = True,
+    ):
+        """
+        Args:
+            key: str
+                Key from make_window_key.
+            object_prediction_list: List[ObjectPrediction]
+                Unshifted predictions of the window.
+            confidence_threshold: float
+                Confidence threshold the window was predicted with.
+            evict: bool
+                See DiskCache.put
+        """
+        entry = {
+            "confidence_threshold": confidence_threshold,
+            "predictions": object_prediction_list_to_compact(object_prediction_list),
+        }
+        self.put(key, entry, evict=evict)
@@ -2,11 +2,13 @@ import fire
 
 from sahi import __version__ as sahi_version
 from sahi.predict import predict, predict_fiftyone
+from sahi.scripts.check_precision import check_precision
 from sahi.scripts.coco2fiftyone import main as coco2fiftyone
 from sahi.scripts.coco2yolov5 import main as coco2yolov5
 from sahi.scripts.coco_error_analysis import analyse
 from sahi.scripts.coco_evaluation import evaluate
 from sahi.scripts.slice_coco import slice
+from sahi.server import serve
 from sahi.utils.import_utils import print_enviroment_info
 
 coco_app = {
@@ -21,6 +23,8 @@ sahi_app = {
     "predict": predict,
     "predict-fiftyone": predict_fiftyone,
     "coco": coco_app,
+    "precision": check_precision,
+    "serve": serve,
     "version": sahi_version,
     "env": print_enviroment_info,
 }
@@ -0,0 +1,97 @@
+# OBSS SAHI Tool
+# Coarse-to-fine slice scheduling from a low resolution prediction of the full image.
+
+from typing import List
+
+import cv2
+import numpy as np
+
+from sahi.prediction import ObjectPrediction
+
+
+class CoarseEvidenceMap:
+    """
+    Low resolution map of the pixels covered by the predictions of a coarse (downscaled) pass over the
+    full image, dilated by a margin. Full resolution slices only need to be predicted where it has evidence.
+    """
+
+    def __init__(
+        self,
+        object_prediction_list: List[ObjectPrediction],
+        full_shape: List[int],
+        margin: int = 64,
+        max_size: int = 1024,
+    ):
+        """
+        Args:
+            object_prediction_list: List[ObjectPrediction]
+                Predictions of the coarse pass in full image coordinates.
+            full_shape: List[int]
+                Size of the full image as [height, width].
+            margin: int
+                Evidence is dilated by this many full resolution pixels, so that objects the coarse pass
+                only partially found still get their neighbouring slices predicted.
+            max_size: int
+                Longest side of the map, the map is never larger than the full image.
+        """
+        height, width = full_shape
+        self.full_shape = [height, width]
+        self.scale = min(1.0, max_size / max(height, width))
+        map_height = max(1, int(np.ceil(height * self.scale)))
+        map_width = max(1, int(np.ceil(width * self.scale)))
+
+        evidence = np.zeros((map_height, map_width), dtype=np.uint8)
+        for object_prediction in object_prediction_list:
+            mask = object_prediction.mask
+            if mask is not None:
+                # the mask region around the object, in full image coordinates for unshifted coarse predictions
+                crop = mask.crop
+                xmin, ymin = mask.offset
+                xmax, ymax = xmin + crop.shape[1], ymin + crop.shape[0]
+            else:
+                xmin, ymin, xmax, ymax = (int(round(coord)) for coord in object_prediction.bbox.to_xyxy())
+                xmin, ymin = max(xmin, 0), max(ymin, 0)
+                xmax, ymax = min(xmax, width), min(ymax, height)
+            if xmax <= xmin or ymax <= ymin:
+                continue
+            map_xmin, map_ymin = int(xmin * self.scale), int(ymin * self.scale)
+            map_xmax = max(int(np.ceil(xmax * self.scale)), map_xmin + 1)
+            map_ymax = max(int(np.ceil(ymax * self.scale)), map_ymin + 1)
+            if mask is None:
+                evidence[map_ymin:map_ymax, map_xmin:map_xmax] = 1
+                continue
+            # area interpolation keeps thin structures as non-zero pixels when downscaling
+            crop = cv2.resize(
+                crop.astype(np.uint8) * np.uint8(255),
+                (map_xmax - map_xmin, map_ymax - map_ymin),
+                interpolation=cv2.INTER_AREA,
+            )
+            evidence[map_ymin:map_ymax, map_xmin:map_xmax] |= (crop > 0).astype(np.uint8)
+
+        radius = int(np.ceil(margin * self.scale))
+        if radius > 0:
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+            evidence = cv2.dilate(evidence, kernel)
+        self.evidence = evidence.astype(bool)
+        # summed area table, evidence in any window is then counted in constant time
+        self._integral = cv2.integral(evidence)
+
+    def has_evidence(self, window: List[int]) -> bool:
+        """
+        Returns True if the window [xmin, ymin, xmax, ymax], in full image coordinates, overlaps evidence.
+        """
+        map_height, map_width = self.evidence.shape
+        xmin = min(int(window[0] * self.scale), map_width - 1)
+        ymin = min(int(window[1] * self.scale), map_height - 1)
+        xmax = min(max(int(np.ceil(window[2] * self.scale)), xmin + 1), map_width)
+        ymax = min(max(int(np.ceil(window[3] * self.scale)), ymin + 1), map_height)
+        integral = self._integral
+        count = integral[ymax, xmax] - integral[ymin, xmax] - integral[ymax, xmin] + integral[ymin, xmin]
+        return count > 0
+
+    @property
+    def coverage(self) -> float:
+        """
+        Fraction of the image with evidence.
+        """
+        return float(np.count_nonzero(self.evidence) / self.evidence.size)
@@ -0,0 +1,173 @@
+# OBSS SAHI Tool
+# Append-only journal of slice predictions, for resuming interrupted sliced predictions.
+
+import logging
+import os
+import pickle
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sahi.cache import DiskCache
+from sahi.prediction import ObjectPrediction, object_prediction_list_to_compact
+
+logger = logging.getLogger(__name__)
+
+
+class SliceJournal:
+    """
+    Records the raw predictions of every slice window of a sliced prediction job in a single file, in the
+    order the windows were merged, keyed by window coordinates. Records are flushed to disk after each slice
+    group, so that a job interrupted at any point (killed, preempted, power loss) can be resumed by calling
+    get_sliced_prediction again with the same journal: recorded windows are replayed in their recorded order
+    and only the remaining windows are predicted. Windows enter the merge in the same order as in an
+    uninterrupted run, so the result is the same.
+
+    The first record identifies the job (image, model and confidence threshold). A journal of another job
+    is discarded when opened, and a last record cut short by a crash is dropped.
+    """
+
+    def __init__(self, path: str, sync: bool = True):
+        """
+        Args:
+            path: str
+                Path of the journal file, created if it does not exist.
+            sync: bool
+                If True, records are fsynced after each slice group so that they survive a power loss,
+                otherwise they are only flushed to the operating system.
+        """
+        self.path = str(path)
+        self.sync = sync
+        self.job_key: Optional[str] = None
+        # compact predictions of the recorded windows, in recorded order
+        self._records: Dict[Tuple[int, ...], List[Dict]] = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_job_key(image_hash: str, model_key: str, confidence_threshold: float) -> str:
+        """
+        Returns the key of a job, raw slice predictions only depend on the image, the model (see
+        sahi.cache.WindowPredictionCache.make_model_key) and its confidence threshold.
+        """
+        return DiskCache.make_key(image=image_hash, model=model_key, confidence_threshold=confidence_threshold)
+
+    def open(self, job_key: str):
+        """
+        Loads the windows recorded for job_key and opens the journal for appending. Records of another job
+        are discarded.
+
+        Args:
+            job_key: str
+                Key of the job, see make_job_key.
+        """
+        self.close()
+        self._records = {}
+        end_offset = 0
+        recorded_job_key = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                try:
+                    recorded_job_key = pickle.load(file)["job"]
+                    end_offset = file.tell()
+                    while True:
+                        record = pickle.load(file)
+                        # a window is recorded once, the first record wins if a caller repeats it
+                        self._records.setdefault(tuple(record["window"]), record["predictions"])
+                        end_offset = file.tell()
+                except EOFError:
+                    pass
+                except Exception as e:
+                    # the process died while writing the last record
+                    logger.warning(f"dropping the incomplete last record of journal {self.path}: {e}")
+
+        if recorded_job_key is not None and recorded_job_key != job_key:
+            logger.warning(f"journal {self.path} belongs to another image, model or threshold, starting over.")
+            self._records = {}
+        if recorded_job_key != job_key:
+            end_offset = 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab" if end_offset else "wb")
+        self._file.truncate(end_offset)
+        self._file.seek(end_offset)
+        if not end_offset:
+            pickle.dump({"job": job_key}, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.flush()
+        self.job_key = job_key
+        if self._records:
+            logger.info(f"resuming from {len(self._records)} windows recorded in {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, window: Sequence[int]) -> bool:
+        return tuple(window) in self._records
+
+    def items(self) -> Iterator[Tuple[List[int], List[Dict]]]:
+        """
+        Yields (window, compact predictions) of the recorded windows in recorded order.
+        """
+        for window, compact_list in list(self._records.items()):
+            yield list(window), compact_list
+
+    def get_window(self, window: Sequence[int]) -> Optional[List[Dict]]:
+        """
+        Returns the compact predictions recorded for window, or None if it was not recorded.
+        """
+        return self._records.get(tuple(window))
+
+    def put_window(self, window: Sequence[int], compact_list: List[Dict]):
+        """
+        Appends the compact predictions (see sahi.prediction.object_prediction_list_to_compact) of window.
+        Records are written to disk by flush().
+        """
+        if self._file is None:
+            raise RuntimeError("open() the journal before recording windows")
+        window = [int(value) for value in window]
+        with self._lock:
+            pickle.dump({"window": window, "predictions": compact_list}, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._records.setdefault(tuple(window), compact_list)
+
+    def put_windows(
+        self, windows: List[Sequence[int]], object_prediction_list_per_slice: List[List[ObjectPrediction]]
+    ):
+        """
+        Records the unshifted predictions of a slice group and flushes them to disk.
+        """
+        for window, slice_object_prediction_list in zip(windows, object_prediction_list_per_slice):
+            self.put_window(
+                window,
+                object_prediction_list_to_compact(
+                    [object_prediction for object_prediction in slice_object_prediction_list if object_prediction]
+                ),
+            )
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """
+        Closes and deletes the journal, e.g. once the result of the job is stored.
+        """
+        self.close()
+        self._records = {}
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __repr__(self):
+        return f"{type(self).__name__}(path={self.path!r}, num_windows={len(self._records)})"
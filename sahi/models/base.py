@@ -6,7 +6,6 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 import numpy as np
 
 from sahi.utils.import_utils import is_available
-from sahi.utils.torch import select_device as select_torch_device
 
 
 class DetectionModel:
@@ -94,6 +93,9 @@ class DetectionModel:
         Sets the device for the model.
         """
         if is_available("torch"):
+            # imported here, backends that do not need torch (e.g. ONNX Runtime) do not pay for its import
+            from sahi.utils.torch import select_device as select_torch_device
+
             self.device = select_torch_device(self.device)
         else:
             raise NotImplementedError()
@@ -118,6 +120,24 @@ class DetectionModel:
         """
         raise NotImplementedError()
 
+    def perform_batch_inference(self, images: List[np.ndarray]):
+        """
+        This function can be implemented to perform prediction on a list of images in a single
+        forward pass. Prediction results should be set to self._original_predictions, one entry per image,
+        so that they can be converted with a shift_amount_list/full_shape_list of the same length.
+        Args:
+            images: List[np.ndarray]
+                A list of numpy arrays that contain the images to be predicted.
+        """
+        raise NotImplementedError()
+
+    @property
+    def supports_batch_inference(self) -> bool:
+        """
+        Returns True if perform_batch_inference is implemented by the model.
+        """
+        return type(self).perform_batch_inference is not DetectionModel.perform_batch_inference
+
     def _create_object_prediction_list_from_original_predictions(
         self,
         shift_amount_list: Optional[List[List[int]]] = [[0, 0]],
@@ -162,8 +182,10 @@ class DetectionModel:
         Args:
             shift_amount: list
                 To shift the box and mask predictions from sliced image to full sized image, should be in the form of [shift_x, shift_y]
+                or List[[shift_x, shift_y],...] after perform_batch_inference()
             full_shape: list
                 Size of the full image after shifting, should be in the form of [height, width]
+                or List[[height, width],...] after perform_batch_inference()
         """
         self._create_object_prediction_list_from_original_predictions(
             shift_amount_list=shift_amount,
@@ -0,0 +1,185 @@
+# OBSS SAHI Tool
+# Detection model predicting with a sahi.server.InferenceServer.
+
+import json
+import logging
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from sahi.models.base import DetectionModel
+from sahi.prediction import object_prediction_list_from_compact
+from sahi.server import DEFAULT_HOST, DEFAULT_PORT, decode_compact_lists, encode_predict_request
+from sahi.utils.compatibility import fix_full_shape_list, fix_shift_amount_list
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteDetectionModel(DetectionModel):
+    """
+    Sends slices to an inference server on the same host (see sahi.server.InferenceServer) instead of
+    loading the model in this process. model_path is the url of the server, e.g. "http://127.0.0.1:8765".
+    Predictions are the same as those of the served model with the confidence_threshold and mask_threshold
+    of this instance. Slices of a batch (batch_size in get_sliced_prediction) are sent in a single request.
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        model: Optional[Any] = None,
+        config_path: Optional[str] = None,
+        device: Optional[str] = None,
+        mask_threshold: float = 0.5,
+        confidence_threshold: float = 0.3,
+        category_mapping: Optional[Dict] = None,
+        category_remapping: Optional[Dict] = None,
+        load_at_init: bool = True,
+        image_size: int = None,
+        timeout: float = 600,
+    ):
+        """
+        Args:
+            model_path: str
+                Url of the inference server. Default: "http://127.0.0.1:8765".
+            timeout: float
+                Maximum time in seconds to wait for the predictions of a request.
+                See DetectionModel for the other arguments, the model itself is chosen by the server.
+        """
+        self.timeout = timeout
+        self.remote_model_key = None
+        self._has_mask = False
+        super().__init__(
+            model_path or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}",
+            model,
+            config_path,
+            device,
+            mask_threshold,
+            confidence_threshold,
+            category_mapping,
+            category_remapping,
+            load_at_init,
+            image_size,
+        )
+
+    def set_device(self):
+        # inference runs on the device of the server, torch is not needed in this process
+        pass
+
+    def load_model(self):
+        """
+        Connects to the server and reads the categories and identity of the served model.
+        """
+        info = self.get_server_info()
+        self.set_model(info)
+
+    def set_model(self, model: Any):
+        """
+        Args:
+            model: dict
+                Server information returned by get_server_info.
+        """
+        self.model = model
+        self.remote_model_key = model["model_key"]
+        self._has_mask = model["has_mask"]
+        if not self.category_mapping:
+            self.category_mapping = model["category_mapping"]
+        if self.image_size is None:
+            self.image_size = model["image_size"]
+
+    def get_server_info(self) -> Dict:
+        """
+        Returns the model information and batching statistics of the server.
+        """
+        return json.loads(self._request("/info"))
+
+    def _request(self, path: str, body: Optional[bytes] = None) -> bytes:
+        url = self.model_path.rstrip("/") + path
+        request = urllib.request.Request(url, data=body, method="GET" if body is None else "POST")
+        if body is not None:
+            request.add_header("Content-Type", "application/octet-stream")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())["error"]
+            except Exception:
+                message = e.reason
+            raise RuntimeError(f"inference server {self.model_path} failed: {message}") from e
+        except urllib.error.URLError as e:
+            raise ConnectionError(
+                f"inference server {self.model_path} is not reachable, start it with 'sahi serve': {e.reason}"
+            ) from e
+
+    def perform_inference(self, image: np.ndarray):
+        """
+        Prediction is performed by the server and the compact predictions are set to self._original_predictions.
+        Args:
+            image: np.ndarray
+                A numpy image array (RGB order)
+        """
+        self.perform_batch_inference([image])
+
+    def perform_batch_inference(self, images: List[np.ndarray]):
+        """
+        Sends images in a single request, the server may predict them together with slices of other clients.
+        The compact predictions of each image, in image coordinates, are set to self._original_predictions.
+        Args:
+            images: List[np.ndarray]
+                A list of numpy image arrays (RGB order)
+        """
+        if self.model is None:
+            raise ValueError("Model is not loaded, load it by calling .load_model()")
+        body = encode_predict_request(
+            images, confidence_threshold=self.confidence_threshold, mask_threshold=self.mask_threshold
+        )
+        self._original_predictions = decode_compact_lists(json.loads(self._request("/predict", body))["predictions"])
+
+    @property
+    def category_names(self):
+        return list(self.category_mapping.values())
+
+    @property
+    def num_categories(self):
+        """
+        Returns number of categories
+        """
+        return len(self.category_mapping)
+
+    @property
+    def has_mask(self):
+        """
+        Returns if model output contains segmentation mask
+        """
+        return self._has_mask
+
+    def _create_object_prediction_list_from_original_predictions(
+        self,
+        shift_amount_list: Optional[List[List[int]]] = [[0, 0]],
+        full_shape_list: Optional[List[List[int]]] = None,
+    ):
+        """
+        self._original_predictions is converted to a list of prediction.ObjectPrediction and set to
+        self._object_prediction_list_per_image.
+        Args:
+            shift_amount_list: list of list
+                To shift the box and mask predictions from sliced image to full sized image, should
+                be in the form of List[[shift_x, shift_y],[shift_x, shift_y],...]
+            full_shape_list: list of list
+                Size of the full image after shifting, should be in the form of
+                List[[height, width],[height, width],...]
+        """
+        # compatilibty for sahi v0.8.15
+        shift_amount_list = fix_shift_amount_list(shift_amount_list)
+        full_shape_list = fix_full_shape_list(full_shape_list)
+
+        self._object_prediction_list_per_image = [
+            object_prediction_list_from_compact(
+                compact_list,
+                shift_amount=shift_amount_list[image_ind],
+                full_shape=None if full_shape_list is None else full_shape_list[image_ind],
+            )
+            for image_ind, compact_list in enumerate(self._original_predictions)
+        ]
@@ -2,22 +2,64 @@
 # Code written by AnNT, 2023.
 
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-import cv2
 import numpy as np
 import torch
 
 logger = logging.getLogger(__name__)
 
+from sahi.annotation import Mask
 from sahi.models.base import DetectionModel
 from sahi.prediction import ObjectPrediction
 from sahi.utils.compatibility import fix_full_shape_list, fix_shift_amount_list
-from sahi.utils.cv import get_bbox_from_bool_mask
 from sahi.utils.import_utils import check_requirements
+from sahi.utils.torch import is_torch_bf16_cpu_supported, quantize_dynamic_int8
+
+YOLOV8_PRECISIONS = ["fp32", "bf16", "int8"]
+# number of pixels of the masks upsampled together when converting predictions (128 MB as float32): 32 masks
+# of a 1024x1024 slice, but a single mask at a time for the full image prediction of a large image
+YOLOV8_MASK_CHUNK_PIXELS = 32 * 1024 * 1024
 
 
 class Yolov8DetectionModel(DetectionModel):
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        model: Optional[Any] = None,
+        config_path: Optional[str] = None,
+        device: Optional[str] = None,
+        mask_threshold: float = 0.5,
+        confidence_threshold: float = 0.3,
+        category_mapping: Optional[Dict] = None,
+        category_remapping: Optional[Dict] = None,
+        load_at_init: bool = True,
+        image_size: int = None,
+        precision: str = "fp32",
+    ):
+        """
+        Args:
+            precision: str
+                Inference precision, one of "fp32", "bf16" (bfloat16 autocast, falls back to fp32 on CPUs
+                without bfloat16 instructions) or "int8" (dynamically quantized Linear/Conv2d layers, CPU only).
+                See DetectionModel for the other arguments.
+        """
+        if precision not in YOLOV8_PRECISIONS:
+            raise ValueError(f"precision should be one of {YOLOV8_PRECISIONS} but given as {precision}")
+        self.precision = precision
+        super().__init__(
+            model_path,
+            model,
+            config_path,
+            device,
+            mask_threshold,
+            confidence_threshold,
+            category_mapping,
+            category_remapping,
+            load_at_init,
+            image_size,
+        )
+
     def check_dependencies(self) -> None:
         check_requirements(["ultralytics"])
 
@@ -43,6 +85,16 @@ class Yolov8DetectionModel(DetectionModel):
                 A YOLOv8 model
         """
 
+        if self.precision == "bf16" and self.device.type == "cpu" and not is_torch_bf16_cpu_supported():
+            logger.warning("CPU does not support bfloat16 natively, using fp32 precision.")
+            self.precision = "fp32"
+        elif self.precision == "int8":
+            if self.device.type != "cpu":
+                raise ValueError(f"int8 precision is only supported on cpu but device is {self.device}")
+            # conv and batchnorm layers are fused first, ultralytics would not fuse quantized layers
+            model.fuse()
+            model.model = quantize_dynamic_int8(model.model)
+
         self.model = model
 
         # set category_mapping
@@ -57,23 +109,34 @@ class Yolov8DetectionModel(DetectionModel):
             image: np.ndarray
                 A numpy array that contains the image to be predicted. 3 channel image should be in RGB order.
         """
+        self.perform_batch_inference([image])
+
+    def perform_batch_inference(self, images: List[np.ndarray]):
+        """
+        Prediction is performed on all images in a single forward pass using self.model and the prediction
+        results are set to self._original_predictions, one entry per image.
+        Args:
+            images: List[np.ndarray]
+                A list of numpy arrays that contain the images to be predicted. 3 channel images should be in RGB order.
+        """
 
         from ultralytics.engine.results import Masks
 
         # Confirm model is loaded
         if self.model is None:
             raise ValueError("Model is not loaded, load it by calling .load_model()")
-        prediction_result = self.model(image[:, :, ::-1], verbose=False)  # YOLOv8 expects numpy arrays to have BGR
+        # YOLOv8 expects numpy arrays to have BGR
+        with torch.autocast(self.device.type, dtype=torch.bfloat16, enabled=self.precision == "bf16"):
+            prediction_result = self.model([image[:, :, ::-1] for image in images], verbose=False)
         if self.has_mask:
 
-            if not prediction_result[0].masks:
-                prediction_result[0].masks = Masks(
-                    torch.tensor([], device=self.model.device), prediction_result[0].boxes.orig_shape
-                )
+            for result in prediction_result:
+                if not result.masks:
+                    result.masks = Masks(torch.tensor([], device=self.model.device), result.boxes.orig_shape)
 
             prediction_result_ = [
                 (
-                    result.boxes.data[result.boxes.data[:, 4] >= self.confidence_threshold],
+                    result.boxes.data[result.boxes.data[:, 4] >= self.confidence_threshold].float(),
                     result.masks.data[result.boxes.data[:, 4] >= self.confidence_threshold],
                 )
                 for result in prediction_result
@@ -88,7 +151,7 @@ class Yolov8DetectionModel(DetectionModel):
                 prediction_result_.append((result_boxes, result_masks))
 
         self._original_predictions = prediction_result_
-        self._original_shape = image.shape
+        self._original_shape_list = [image.shape for image in images]
 
     @property
     def category_names(self):
@@ -109,6 +172,47 @@ class Yolov8DetectionModel(DetectionModel):
         # return True
         return self.model.overrides["task"] == "segment"
 
+    def _get_mask_crops(self, masks: torch.Tensor, shape: Tuple[int, int]) -> List[Tuple[np.ndarray, List[int]]]:
+        """
+        Upsamples the masks of an image to its shape and finds the bounds of their pixels above
+        self.mask_threshold as batched tensor operations on the model device, then thresholds each mask
+        inside its bounds only.
+        Args:
+            masks: torch.Tensor
+                Masks of the predictions of an image at the model input resolution, of shape (N, h, w)
+            shape: Tuple[int, int]
+                Size of the image, as (height, width)
+        Returns:
+            A list of (crop, offset) per mask, crop is a bool array and offset is its position in the image
+            as [x, y]. Crops of empty masks have a zero size.
+        """
+        height, width = shape
+        mask_crops = []
+        # bounds the memory of the upsampled float masks on dense slices and large images
+        chunk_size = max(1, YOLOV8_MASK_CHUNK_PIXELS // (height * width))
+        for start in range(0, len(masks), chunk_size):
+            chunk = masks[start : start + chunk_size]
+            if tuple(chunk.shape[1:]) != (height, width):
+                # same sampling as cv2.resize with INTER_LINEAR
+                chunk = torch.nn.functional.interpolate(
+                    chunk[None].float(), size=(height, width), mode="bilinear", align_corners=False
+                )[0]
+
+            # a row (column) has pixels above the threshold if its maximum is above it
+            rows = (chunk.amax(dim=2) >= self.mask_threshold).to(torch.uint8)
+            columns = (chunk.amax(dim=1) >= self.mask_threshold).to(torch.uint8)
+            ymin = rows.argmax(dim=1)
+            ymax = height - rows.flip(dims=[1]).argmax(dim=1)
+            xmin = columns.argmax(dim=1)
+            xmax = width - columns.flip(dims=[1]).argmax(dim=1)
+            bounds = torch.stack([xmin, ymin, xmax, ymax], dim=1)
+            bounds[rows.amax(dim=1) == 0] = 0
+
+            for mask, (xmin, ymin, xmax, ymax) in zip(chunk, bounds.cpu().tolist()):
+                crop = (mask[ymin:ymax, xmin:xmax] >= self.mask_threshold).cpu().numpy()
+                mask_crops.append((crop, [xmin, ymin]))
+        return mask_crops
+
     def _create_object_prediction_list_from_original_predictions(
         self,
         shift_amount_list: Optional[List[List[int]]] = [[0, 0]],
@@ -133,70 +237,53 @@ class Yolov8DetectionModel(DetectionModel):
 
         # handle all predictions
         object_prediction_list_per_image = []
-        for image_ind, image_predictions in enumerate(original_predictions):
-
-            image_predictions_in_xyxy_format = image_predictions[0]
-            image_predictions_masks = image_predictions[1]
-
+        for image_ind, (image_predictions_in_xyxy_format, image_predictions_masks) in enumerate(original_predictions):
             shift_amount = shift_amount_list[image_ind]
             full_shape = None if full_shape_list is None else full_shape_list[image_ind]
+            original_shape = self._original_shape_list[image_ind][:2]
             object_prediction_list = []
-
-            # process predictions
-            for prediction, bool_mask in zip(
-                image_predictions_in_xyxy_format.cpu().detach().numpy(), image_predictions_masks.cpu().detach().numpy()
-            ):
-                x1 = prediction[0]
-                y1 = prediction[1]
-                x2 = prediction[2]
-                y2 = prediction[3]
-                bbox = [x1, y1, x2, y2]
-                score = prediction[4]
+            object_prediction_list_per_image.append(object_prediction_list)
+            if len(image_predictions_in_xyxy_format) == 0:
+                continue
+
+            predictions = image_predictions_in_xyxy_format.detach().cpu().numpy()
+            # fix negative and out of image box coords
+            bboxes = predictions[:, :4].clip(min=0)
+            if full_shape is not None:
+                bboxes = np.minimum(bboxes, [full_shape[1], full_shape[0], full_shape[1], full_shape[0]])
+            is_valid = (bboxes[:, 0] < bboxes[:, 2]) & (bboxes[:, 1] < bboxes[:, 3])
+            for bbox in bboxes[~is_valid]:
+                logger.warning(f"ignoring invalid prediction with bbox: {bbox.tolist()}")
+
+            if self.has_mask:
+                if not is_valid.all():
+                    image_predictions_masks = image_predictions_masks[torch.from_numpy(is_valid)]
+                mask_crops = self._get_mask_crops(image_predictions_masks, original_shape)
+            else:
+                mask_crops = [None] * int(is_valid.sum())
+
+            for prediction, bbox, mask_crop in zip(predictions[is_valid], bboxes[is_valid], mask_crops):
                 category_id = int(prediction[5])
-                category_name = self.category_mapping[str(category_id)]
-
-                # parse prediction mask
-                if not self.has_mask:
-                    # bool_mask = bool_mask
-                    # check if mask is valid
-                    # https://github.com/obss/sahi/discussions/696
-                    # if get_bbox_from_bool_mask(bool_mask) is None:
-                    #     continue
-                    # else:
-                    bool_mask = None
-                else:
-                    bool_mask = cv2.resize(bool_mask, (self._original_shape[1], self._original_shape[0]))
-                    bool_mask[bool_mask >= 0.5] = 1
-                    bool_mask[bool_mask < 0.5] = 0
-
-                # fix negative box coords
-                bbox[0] = max(0, bbox[0])
-                bbox[1] = max(0, bbox[1])
-                bbox[2] = max(0, bbox[2])
-                bbox[3] = max(0, bbox[3])
-
-                # fix out of image box coords
-                if full_shape is not None:
-                    bbox[0] = min(full_shape[1], bbox[0])
-                    bbox[1] = min(full_shape[0], bbox[1])
-                    bbox[2] = min(full_shape[1], bbox[2])
-                    bbox[3] = min(full_shape[0], bbox[3])
-
-                # ignore invalid predictions
-                if not (bbox[0] < bbox[2]) or not (bbox[1] < bbox[3]):
-                    logger.warning(f"ignoring invalid prediction with bbox: {bbox}")
-                    continue
-
+                mask = None
+                if mask_crop is not None:
+                    crop, offset = mask_crop
+                    # flat or empty masks have no valid bbox
+                    # https://github.com/obss/sahi/issues/235
+                    if crop.shape[0] < 2 or crop.shape[1] < 2:
+                        logger.warning(f"ignoring prediction with empty mask and bbox: {bbox.tolist()}")
+                        continue
+                    mask = Mask.from_crop(
+                        crop, offset, shape=original_shape, full_shape=full_shape, shift_amount=shift_amount
+                    )
                 object_prediction = ObjectPrediction(
-                    bbox=bbox,
+                    bbox=bbox.tolist(),
                     category_id=category_id,
-                    score=score,
-                    bool_mask=bool_mask,
-                    category_name=category_name,
+                    score=float(prediction[4]),
+                    category_name=self.category_mapping[str(category_id)],
                     shift_amount=shift_amount,
                     full_shape=full_shape,
+                    mask=mask,
                 )
                 object_prediction_list.append(object_prediction)
-            object_prediction_list_per_image.append(object_prediction_list)
 
         self._object_prediction_list_per_image = object_prediction_list_per_image
\ No newline at end of file
@@ -0,0 +1,426 @@
+# OBSS SAHI Tool
+# ONNX Runtime backend for exported YOLOv8 segmentation models.
+
+import ast
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+from sahi.annotation import Mask
+from sahi.models.base import DetectionModel
+from sahi.prediction import ObjectPrediction
+from sahi.utils.compatibility import fix_full_shape_list, fix_shift_amount_list
+from sahi.utils.import_utils import check_requirements
+
+
+class OnnxYolov8SegDetectionModel(DetectionModel):
+    """
+    Runs a YOLOv8 model exported with `yolo export format=onnx` on ONNX Runtime. Letterboxing, box
+    decoding, NMS and mask prototype decoding are done in NumPy and follow the ultralytics predictor,
+    so that predictions match Yolov8DetectionModel. Neither torch nor ultralytics needs to be installed: this
+    module does not import them, but sahi.predict still imports torch first when it is installed (see
+    https://github.com/obss/sahi/issues/526).
+    """
+
+    # ultralytics predictor defaults, applied before confidence_threshold as in Yolov8DetectionModel
+    nms_confidence_threshold: float = 0.25
+    nms_iou_threshold: float = 0.7
+    max_det: int = 300
+    max_nms: int = 30000
+    max_wh: int = 7680
+    letterbox_padding_value: int = 114
+
+    def check_dependencies(self) -> None:
+        check_requirements(["onnxruntime"])
+
+    def set_device(self):
+        """
+        Sets the device for the model. ONNX Runtime selects execution providers itself, torch is not needed.
+        """
+        self.device = str(self.device) if self.device else "cpu"
+
+    def load_model(self):
+        """
+        Detection model is initialized and set to self.model.
+        """
+        import onnxruntime
+
+        if self.device.startswith("cuda"):
+            providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        else:
+            providers = ["CPUExecutionProvider"]
+        try:
+            session = onnxruntime.InferenceSession(self.model_path, providers=providers)
+        except Exception as e:
+            raise TypeError("model_path is not a valid onnx model path: ", e)
+        self.set_model(session)
+
+    def set_model(self, model: Any):
+        """
+        Sets the underlying ONNX Runtime session.
+        Args:
+            model: Any
+                An onnxruntime.InferenceSession of an exported YOLOv8 model
+        """
+        self.model = model
+
+        metadata = model.get_modelmeta().custom_metadata_map
+        self._names: Dict[int, str] = ast.literal_eval(metadata["names"]) if "names" in metadata else {0: "0"}
+        self._end2end = metadata.get("end2end", "False") == "True"
+        self._input_name = model.get_inputs()[0].name
+        input_shape = model.get_inputs()[0].shape
+        # exported models have a fixed batch and input size unless exported with dynamic=True
+        self._fixed_batch = isinstance(input_shape[0], int)
+        self._fixed_input_size = isinstance(input_shape[2], int) and isinstance(input_shape[3], int)
+        self._stride = int(metadata.get("stride", 32))
+        if self._fixed_input_size:
+            self._input_size = (input_shape[2], input_shape[3])
+        elif self.image_size is not None:
+            self._input_size = (self.image_size, self.image_size)
+        else:
+            self._input_size = tuple(ast.literal_eval(metadata.get("imgsz", "[640, 640]")))
+
+        # set category_mapping
+        if not self.category_mapping:
+            category_mapping = {str(ind): category_name for ind, category_name in enumerate(self.category_names)}
+            self.category_mapping = category_mapping
+
+    def perform_inference(self, image: np.ndarray):
+        """
+        Prediction is performed using self.model and the prediction result is set to self._original_predictions.
+        Args:
+            image: np.ndarray
+                A numpy array that contains the image to be predicted. 3 channel image should be in RGB order.
+        """
+        self.perform_batch_inference([image])
+
+    def perform_batch_inference(self, images: List[np.ndarray]):
+        """
+        Prediction is performed on all images using self.model and the prediction results are set to
+        self._original_predictions, one entry per image. Models exported with a fixed batch size are run
+        once per image.
+        Args:
+            images: List[np.ndarray]
+                A list of numpy arrays that contain the images to be predicted. 3 channel images should be in RGB order.
+        """
+
+        # Confirm model is loaded
+        if self.model is None:
+            raise ValueError("Model is not loaded, load it by calling .load_model()")
+
+        # dynamic models get the minimum padding when all images have the same shape, as ultralytics does
+        auto = not self._fixed_input_size and len({image.shape for image in images}) == 1
+        letterboxed = [self._letterbox(image, auto=auto) for image in images]
+        blob = np.stack([input_image for input_image, _ in letterboxed]).transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+        if self._fixed_batch:
+            outputs = [self.model.run(None, {self._input_name: blob[ind : ind + 1]}) for ind in range(len(images))]
+            outputs = [np.concatenate(output_list) for output_list in zip(*outputs)]
+        else:
+            outputs = self.model.run(None, {self._input_name: blob})
+
+        prediction_result_ = []
+        for image_ind, (image, (_, letterbox_params)) in enumerate(zip(images, letterboxed)):
+            detections = self._non_max_suppression(outputs[0][image_ind])
+            # box-only models carry no masks
+            masks = None
+            if self.has_mask:
+                masks = self._process_mask(
+                    outputs[1][image_ind], detections[:, 6:], detections[:, :4], letterbox_params["shape"]
+                )
+                masks = self._remove_letterbox_padding(masks, letterbox_params)
+                # only keep predictions with masks inside the image
+                keep = (masks >= self.mask_threshold).any(axis=(1, 2))
+                detections, masks = detections[keep], masks[keep]
+            boxes = self._scale_boxes(detections[:, :4], letterbox_params, image.shape)
+            detections = np.concatenate([boxes, detections[:, 4:6]], axis=1)
+
+            keep = detections[:, 4] >= self.confidence_threshold
+            masks = [None] * int(keep.sum()) if masks is None else masks[keep]
+            prediction_result_.append((detections[keep], masks))
+
+        self._original_predictions = prediction_result_
+        self._original_shape_list = [image.shape for image in images]
+
+    def _letterbox(self, image: np.ndarray, auto: bool = False) -> Tuple[np.ndarray, Dict]:
+        """
+        Resizes image keeping its aspect ratio and pads it to the model input size, as ultralytics.data.augment.LetterBox.
+        If auto, padding is reduced to the minimum multiple of the model stride.
+        """
+        shape = image.shape[:2]
+        new_shape = self._input_size
+        ratio = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+        new_unpad = round(shape[1] * ratio), round(shape[0] * ratio)
+        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+        if auto:
+            dw, dh = dw % self._stride, dh % self._stride
+        dw, dh = dw / 2, dh / 2
+        top, bottom = round(dh - 0.1), round(dh + 0.1)
+        left, right = round(dw - 0.1), round(dw + 0.1)
+
+        if shape[::-1] != new_unpad:
+            image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+        image = cv2.copyMakeBorder(
+            image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(self.letterbox_padding_value,) * 3
+        )
+        return image, {"shape": image.shape[:2], "new_unpad": new_unpad, "top": top, "left": left}
+
+    def _non_max_suppression(self, prediction: np.ndarray) -> np.ndarray:
+        """
+        Decodes the raw output of one image to rows of [x1, y1, x2, y2, score, category_id, mask coefficients...]
+        in letterboxed image coordinates, as ultralytics.utils.nms.non_max_suppression with multi_label=False.
+        """
+        if self._end2end:
+            # exported with nms=True, rows are already decoded
+            detections = prediction[prediction[:, 4] > self.nms_confidence_threshold]
+            return detections[: self.max_det].astype(np.float32)
+
+        num_categories = self.num_categories
+        prediction = prediction.T
+        category_scores = prediction[:, 4 : 4 + num_categories]
+        scores = category_scores.max(axis=1)
+        candidates = scores > self.nms_confidence_threshold
+        prediction, category_scores, scores = prediction[candidates], category_scores[candidates], scores[candidates]
+        if not len(prediction):
+            return np.zeros((0, 6 + prediction.shape[1] - 4 - num_categories), dtype=np.float32)
+
+        boxes = np.empty((len(prediction), 4), dtype=np.float32)
+        boxes[:, :2] = prediction[:, :2] - prediction[:, 2:4] / 2
+        boxes[:, 2:] = prediction[:, :2] + prediction[:, 2:4] / 2
+        category_ids = category_scores.argmax(axis=1).astype(np.float32)
+        detections = np.concatenate(
+            [boxes, scores[:, None], category_ids[:, None], prediction[:, 4 + num_categories :]], axis=1
+        )
+
+        order = np.argsort(-scores, kind="stable")[: self.max_nms]
+        detections = detections[order]
+        # offset boxes by category so that only boxes of the same category suppress each other
+        keep = _nms(detections[:, :4] + detections[:, 5:6] * self.max_wh, self.nms_iou_threshold)
+        return detections[keep[: self.max_det]]
+
+    def _process_mask(
+        self, protos: np.ndarray, mask_coefficients: np.ndarray, boxes: np.ndarray, input_shape: Tuple[int, int]
+    ) -> np.ndarray:
+        """
+        Decodes instance masks from the mask prototypes at the letterboxed input shape and crops them to their
+        boxes, as ultralytics.utils.ops.process_mask with upsample=True. Masks are returned as probabilities,
+        to be thresholded with self.mask_threshold.
+        """
+        num_protos, proto_height, proto_width = protos.shape
+        input_height, input_width = input_shape
+        masks = (mask_coefficients @ protos.reshape(num_protos, -1)).reshape(-1, proto_height, proto_width)
+
+        # masks are stacked along the channel axis, cv2.resize handles at most 128 channels per call
+        upsampled = np.empty((len(masks), input_height, input_width), dtype=np.float32)
+        for start in range(0, len(masks), 128):
+            channels = masks[start : start + 128].transpose(1, 2, 0)
+            resized = cv2.resize(channels, (input_width, input_height), interpolation=cv2.INTER_LINEAR)
+            upsampled[start : start + 128] = resized.reshape(input_height, input_width, -1).transpose(2, 0, 1)
+        # sigmoid, in place
+        masks = upsampled
+        np.negative(masks, out=masks)
+        np.exp(masks, out=masks)
+        masks += 1
+        np.reciprocal(masks, out=masks)
+
+        columns = np.arange(input_width, dtype=np.float32)[None, None, :]
+        rows = np.arange(input_height, dtype=np.float32)[None, :, None]
+        x1, y1, x2, y2 = (boxes[:, ind, None, None] for ind in range(4))
+        masks *= (columns >= x1) & (columns < x2)
+        masks *= (rows >= y1) & (rows < y2)
+        return masks
+
+    @staticmethod
+    def _remove_letterbox_padding(masks: np.ndarray, letterbox_params: Dict) -> np.ndarray:
+        top, left = letterbox_params["top"], letterbox_params["left"]
+        width, height = letterbox_params["new_unpad"]
+        return masks[:, top : top + height, left : left + width]
+
+    @staticmethod
+    def _scale_boxes(boxes: np.ndarray, letterbox_params: Dict, original_shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Rescales boxes from letterboxed to original image coordinates, as ultralytics.utils.ops.scale_boxes.
+        """
+        new_width, new_height = letterbox_params["new_unpad"]
+        gain_x, gain_y = new_width / original_shape[1], new_height / original_shape[0]
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - letterbox_params["left"]) / gain_x).clip(0, original_shape[1])
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - letterbox_params["top"]) / gain_y).clip(0, original_shape[0])
+        return boxes
+
+    def _get_mask_crop(self, mask: np.ndarray, shape: Tuple[int, int]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Upsamples a mask of probabilities to shape with bilinear interpolation (align_corners=False, as the masks
+        of Yolov8DetectionModel) within the bounds of its pixels above self.mask_threshold only, then thresholds
+        it with self.mask_threshold.
+        Returns:
+            (crop, offset), crop is a bool array and offset is its position in the image as [x, y]. Crops of
+            empty masks have a zero size.
+        """
+        # interpolated pixels are above the threshold only next to source pixels above it
+        above = mask >= self.mask_threshold
+        rows = np.flatnonzero(above.any(axis=1))
+        columns = np.flatnonzero(above.any(axis=0))
+        if not len(rows):
+            return np.zeros((0, 0), dtype=bool), [0, 0]
+        (y, source_y), row_weights = _get_linear_weights(mask.shape[0], shape[0], rows[0], rows[-1])
+        (x, source_x), column_weights = _get_linear_weights(mask.shape[1], shape[1], columns[0], columns[-1])
+        source = mask[
+            source_y : source_y + row_weights.shape[1], source_x : source_x + column_weights.shape[1]
+        ]
+        crop = row_weights @ source @ column_weights.T >= self.mask_threshold
+        # trim to the pixels above the threshold
+        crop_rows = np.flatnonzero(crop.any(axis=1))
+        crop_columns = np.flatnonzero(crop.any(axis=0))
+        if not len(crop_rows):
+            return np.zeros((0, 0), dtype=bool), [0, 0]
+        crop = crop[crop_rows[0] : crop_rows[-1] + 1, crop_columns[0] : crop_columns[-1] + 1]
+        return crop, [x + int(crop_columns[0]), y + int(crop_rows[0])]
+
+    @property
+    def category_names(self):
+        return self._names.values()
+
+    @property
+    def num_categories(self):
+        """
+        Returns number of categories
+        """
+        return len(self._names)
+
+    @property
+    def has_mask(self):
+        """
+        Returns if model output contains segmentation mask
+        """
+        return len(self.model.get_outputs()) > 1
+
+    def _create_object_prediction_list_from_original_predictions(
+        self,
+        shift_amount_list: Optional[List[List[int]]] = [[0, 0]],
+        full_shape_list: Optional[List[List[int]]] = None,
+    ):
+        """
+        self._original_predictions is converted to a list of prediction.ObjectPrediction and set to
+        self._object_prediction_list_per_image.
+        Args:
+            shift_amount_list: list of list
+                To shift the box and mask predictions from sliced image to full sized image, should
+                be in the form of List[[shift_x, shift_y],[shift_x, shift_y],...]
+            full_shape_list: list of list
+                Size of the full image after shifting, should be in the form of
+                List[[height, width],[height, width],...]
+        """
+        original_predictions = self._original_predictions
+
+        # compatilibty for sahi v0.8.15
+        shift_amount_list = fix_shift_amount_list(shift_amount_list)
+        full_shape_list = fix_full_shape_list(full_shape_list)
+
+        # handle all predictions
+        object_prediction_list_per_image = []
+        for image_ind, (image_predictions_in_xyxy_format, image_predictions_masks) in enumerate(original_predictions):
+            shift_amount = shift_amount_list[image_ind]
+            full_shape = None if full_shape_list is None else full_shape_list[image_ind]
+            original_shape = self._original_shape_list[image_ind]
+            object_prediction_list = []
+
+            # process predictions
+            for prediction, image_mask in zip(image_predictions_in_xyxy_format, image_predictions_masks):
+                bbox = [prediction[0], prediction[1], prediction[2], prediction[3]]
+                score = prediction[4]
+                category_id = int(prediction[5])
+                category_name = self.category_mapping[str(category_id)]
+
+                # parse prediction mask, only the region around its pixels is upsampled and kept
+                mask = None
+                if self.has_mask:
+                    crop, offset = self._get_mask_crop(image_mask, original_shape[:2])
+                    # flat or empty masks have no valid bbox
+                    # https://github.com/obss/sahi/issues/235
+                    if crop.shape[0] < 2 or crop.shape[1] < 2:
+                        logger.warning(f"ignoring prediction with empty mask and bbox: {bbox}")
+                        continue
+                    mask = Mask.from_crop(
+                        crop,
+                        offset,
+                        shape=list(original_shape[:2]),
+                        full_shape=full_shape,
+                        shift_amount=shift_amount,
+                    )
+
+                # fix out of image box coords
+                if full_shape is not None:
+                    bbox[0] = min(full_shape[1], bbox[0])
+                    bbox[1] = min(full_shape[0], bbox[1])
+                    bbox[2] = min(full_shape[1], bbox[2])
+                    bbox[3] = min(full_shape[0], bbox[3])
+
+                # ignore invalid predictions
+                if not (bbox[0] < bbox[2]) or not (bbox[1] < bbox[3]):
+                    logger.warning(f"ignoring invalid prediction with bbox: {bbox}")
+                    continue
+
+                object_prediction = ObjectPrediction(
+                    bbox=bbox,
+                    category_id=category_id,
+                    score=score,
+                    category_name=category_name,
+                    shift_amount=shift_amount,
+                    full_shape=full_shape,
+                    mask=mask,
+                )
+                object_prediction_list.append(object_prediction)
+            object_prediction_list_per_image.append(object_prediction_list)
+
+        self._object_prediction_list_per_image = object_prediction_list_per_image
+
+
+def _get_linear_weights(source_size: int, size: int, first: int, last: int) -> Tuple[Tuple[int, int], np.ndarray]:
+    """
+    Returns the bilinear interpolation weights (align_corners=False, border pixels repeated) resizing source_size
+    pixels to size pixels, restricted to the output pixels that depend on the source pixels first to last.
+    Returns:
+        ((first output pixel, first source pixel), weights of shape (output pixels, source pixels))
+    """
+    scale = source_size / size
+    # source pixels on each side of each output pixel
+    positions = np.maximum((np.arange(size) + 0.5) * scale - 0.5, 0)
+    lower = np.minimum(positions.astype(np.int64), source_size - 1)
+    upper = np.minimum(lower + 1, source_size - 1)
+    upper_weights = (positions - lower).astype(np.float32)
+    outputs = np.flatnonzero((upper >= first) & (lower <= last))
+    output_start, output_stop = outputs[0], outputs[-1] + 1
+    lower, upper = lower[output_start:output_stop], upper[output_start:output_stop]
+    upper_weights = upper_weights[output_start:output_stop]
+    source_start = lower[0]
+    weights = np.zeros((output_stop - output_start, upper[-1] - source_start + 1), dtype=np.float32)
+    indices = np.arange(len(weights))
+    np.add.at(weights, (indices, lower - source_start), 1 - upper_weights)
+    np.add.at(weights, (indices, upper - source_start), upper_weights)
+    return (int(output_start), int(source_start)), weights
+
+
+def _nms(boxes: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Greedy NMS over boxes sorted by decreasing score, returns the kept indices (as torchvision.ops.nms).
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.arange(len(boxes))
+    keep = []
+    while order.size:
+        ind = order[0]
+        keep.append(ind)
+        rest = order[1:]
+        inter_width = np.maximum(0.0, np.minimum(x2[ind], x2[rest]) - np.maximum(x1[ind], x1[rest]))
+        inter_height = np.maximum(0.0, np.minimum(y2[ind], y2[rest]) - np.maximum(y1[ind], y1[rest]))
+        inter = inter_width * inter_height
+        iou = inter / (areas[ind] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
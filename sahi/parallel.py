@@ -0,0 +1,233 @@
+# OBSS SAHI Tool
+# Multi-process sliced inference for CPU-only machines.
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from sahi.auto_model import MODEL_TYPE_TO_MODEL_CLASS_NAME, AutoDetectionModel
+from sahi.models.base import DetectionModel
+from sahi.prediction import ObjectPrediction, object_prediction_list_from_compact, object_prediction_list_to_compact
+from sahi.utils.import_utils import is_available
+
+logger = logging.getLogger(__name__)
+
+# per-process state of the pool workers
+_worker_detection_model: Optional[DetectionModel] = None
+_worker_shared_image: Optional["SharedImage"] = None
+
+
+class SharedImage:
+    """
+    Numpy image published once in a multiprocessing.shared_memory block so that worker
+    processes can read their slice windows without pickling pixel data.
+    """
+
+    def __init__(self, image: Optional[np.ndarray] = None, descriptor: Optional[Dict] = None):
+        """
+        Args:
+            image: np.ndarray
+                Image to publish. A new shared memory block is created and owned by this instance.
+            descriptor: dict
+                Descriptor of an already published image (see SharedImage.descriptor) to attach to.
+        """
+        if image is not None:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+            self._owner = True
+            self.shape = image.shape
+            self.dtype = image.dtype
+            self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+            self.array[...] = image
+        elif descriptor is not None:
+            self._shm = shared_memory.SharedMemory(name=descriptor["name"])
+            self._owner = False
+            self.shape = tuple(descriptor["shape"])
+            self.dtype = np.dtype(descriptor["dtype"])
+            self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        else:
+            raise ValueError("either image or descriptor must be provided")
+
+    @property
+    def descriptor(self) -> Dict:
+        return {"name": self._shm.name, "shape": list(self.shape), "dtype": self.dtype.str}
+
+    def close(self):
+        # drop the array view first, the buffer can not be released while it is exported
+        self.array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_model_config(detection_model: DetectionModel) -> Dict:
+    """
+    Returns the AutoDetectionModel.from_pretrained arguments needed to load a replica of detection_model.
+    """
+    class_name_to_model_type = {
+        class_name: model_type for model_type, class_name in MODEL_TYPE_TO_MODEL_CLASS_NAME.items()
+    }
+    model_type = class_name_to_model_type.get(type(detection_model).__name__)
+    if model_type is None:
+        raise ValueError(f"{type(detection_model).__name__} can not be replicated in worker processes")
+    if detection_model.model_path is None:
+        raise ValueError("detection_model should be loaded from a model_path to be replicated in worker processes")
+    model_config = {
+        "model_type": model_type,
+        "model_path": detection_model.model_path,
+        "config_path": detection_model.config_path,
+        "device": str(detection_model.device),
+        "mask_threshold": detection_model.mask_threshold,
+        "confidence_threshold": detection_model.confidence_threshold,
+        "category_mapping": detection_model.category_mapping,
+        "category_remapping": detection_model.category_remapping,
+        "image_size": detection_model.image_size,
+    }
+    # backend specific options
+    if hasattr(detection_model, "precision"):
+        model_config["precision"] = detection_model.precision
+    return model_config
+
+
+def _init_worker(model_config: Dict, num_threads: int):
+    global _worker_detection_model
+
+    if is_available("torch"):
+        import torch
+
+        torch.set_num_threads(num_threads)
+    _worker_detection_model = AutoDetectionModel.from_pretrained(**model_config)
+
+
+def _predict_slices(image_descriptor: Dict, slice_bboxes: List[List[int]], full_shape: List[int]) -> List[List[Dict]]:
+    global _worker_shared_image
+
+    # attach to the published image once, it stays mapped until the parent publishes a new one
+    if _worker_shared_image is None or _worker_shared_image.descriptor["name"] != image_descriptor["name"]:
+        if _worker_shared_image is not None:
+            _worker_shared_image.close()
+        _worker_shared_image = SharedImage(descriptor=image_descriptor)
+
+    detection_model = _worker_detection_model
+    image_list = [
+        np.ascontiguousarray(_worker_shared_image.array[slice_bbox[1] : slice_bbox[3], slice_bbox[0] : slice_bbox[2]])
+        for slice_bbox in slice_bboxes
+    ]
+    if len(image_list) > 1 and detection_model.supports_batch_inference:
+        detection_model.perform_batch_inference(image_list)
+        object_prediction_list_per_image = _convert_predictions(detection_model, slice_bboxes, full_shape)
+    else:
+        object_prediction_list_per_image = []
+        for image, slice_bbox in zip(image_list, slice_bboxes):
+            detection_model.perform_inference(image)
+            object_prediction_list_per_image.extend(_convert_predictions(detection_model, [slice_bbox], full_shape))
+
+    # only compact, unshifted predictions are sent back to the parent process
+    return [
+        object_prediction_list_to_compact(object_prediction_list)
+        for object_prediction_list in object_prediction_list_per_image
+    ]
+
+
+def _convert_predictions(
+    detection_model: DetectionModel, slice_bboxes: List[List[int]], full_shape: List[int]
+) -> List[List[ObjectPrediction]]:
+    detection_model.convert_original_predictions(
+        shift_amount=[[slice_bbox[0], slice_bbox[1]] for slice_bbox in slice_bboxes],
+        full_shape=[full_shape] * len(slice_bboxes),
+    )
+    return detection_model.object_prediction_list_per_image
+
+
+class SliceInferencePool:
+    """
+    Pool of worker processes, each holding its own replica of a detection model, used to
+    predict the slices of one image in parallel.
+    """
+
+    def __init__(self, detection_model: DetectionModel, num_workers: int, num_threads: Optional[int] = None):
+        """
+        Args:
+            detection_model: model.DetectionModel
+                Model to replicate. Workers load it again from its model_path.
+            num_workers: int
+                Number of worker processes.
+            num_threads: int
+                Number of torch threads per worker. Defaults to the number of cores divided by num_workers.
+        """
+        if num_workers < 1:
+            raise ValueError(f"num_workers should be a positive integer but given as {num_workers}")
+        if num_threads is None:
+            num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self.num_workers = num_workers
+        # spawn: forking a process that already initialized torch threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(get_model_config(detection_model), num_threads),
+        )
+
+    def predict(
+        self,
+        image: np.ndarray,
+        slice_bboxes: List[List[int]],
+        batch_size: int = 1,
+    ) -> Iterator[List[List[ObjectPrediction]]]:
+        """
+        Predicts all slice windows of image in the worker processes.
+
+        Args:
+            image: np.ndarray
+                Full image in RGB order.
+            slice_bboxes: List[List[int]]
+                Slice windows as [xmin, ymin, xmax, ymax], see sahi.slicing.get_slice_bboxes
+            batch_size: int
+                Number of slices predicted per worker call.
+
+        Yields:
+            For each group of batch_size slices, in slice order, the list of unshifted
+            ObjectPrediction lists of each slice.
+        """
+        full_shape = [image.shape[0], image.shape[1]]
+        groups = [slice_bboxes[ind : ind + batch_size] for ind in range(0, len(slice_bboxes), batch_size)]
+        # keep a few groups in flight per worker, results are consumed in order
+        max_pending = 2 * self.num_workers
+        with SharedImage(image) as shared_image:
+            pending = []
+            for group in groups:
+                future = self._executor.submit(_predict_slices, shared_image.descriptor, group, full_shape)
+                pending.append((group, future))
+                if len(pending) >= max_pending:
+                    yield self._collect(pending.pop(0), full_shape)
+            while pending:
+                yield self._collect(pending.pop(0), full_shape)
+
+    @staticmethod
+    def _collect(pending_group, full_shape: List[int]) -> List[List[ObjectPrediction]]:
+        group, future = pending_group
+        return [
+            object_prediction_list_from_compact(
+                compact_list, shift_amount=[slice_bbox[0], slice_bbox[1]], full_shape=full_shape
+            )
+            for slice_bbox, compact_list in zip(group, future.result())
+        ]
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,234 @@
+# OBSS SAHI Tool
+# Pipelined sliced prediction: slicing, inference, shifting and merging run concurrently.
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from sahi.prediction import ObjectPrediction
+from sahi.reader import ImageReader, open_image_reader
+from sahi.utils.profiler import profile
+
+logger = logging.getLogger(__name__)
+
+# marks the end of a stage output
+_DONE = object()
+
+
+class SlicedPredictionPipeline:
+    """
+    Runs sliced prediction as four stages connected by bounded queues:
+        slice: reads slice windows from the image,
+        inference: predicts each group of slices with predict_fn,
+        shift: converts slice predictions to full image coordinates,
+        merge: collects shifted predictions and merges them incrementally.
+    The first three stages run in their own threads, the merge stage runs in the thread consuming run().
+    Bounded queues apply backpressure, so at most a few groups of slices exist at any time whatever the
+    image size, and the inference stage does not wait for decoding, shifting or merging.
+    """
+
+    def __init__(
+        self,
+        image: Union[np.ndarray, ImageReader],
+        slice_bboxes: List[List[int]],
+        predict_fn: Callable[[List[np.ndarray], List[List[int]]], List[List[ObjectPrediction]]],
+        postprocess: Optional[Callable[[List[ObjectPrediction]], List[ObjectPrediction]]] = None,
+        batch_size: int = 1,
+        merge_buffer_length: Optional[int] = None,
+        queue_size: int = 2,
+    ):
+        """
+        Args:
+            image: np.ndarray or sahi.reader.ImageReader
+                Full image in RGB order, or a reader the slice windows are read from, so that only the slices
+                waiting in the queues are decoded.
+            slice_bboxes: List[List[int]]
+                Slice windows as [xmin, ymin, xmax, ymax], see sahi.slicing.get_slice_bboxes
+            predict_fn: Callable
+                Called with a list of slice images and their windows, returns the unshifted
+                ObjectPrediction list of each slice.
+            postprocess: sahi.postprocess.combine.PostprocessPredictions
+                Used by the merge stage, merging is skipped if None.
+            batch_size: int
+                Number of slices per group sent to predict_fn.
+            merge_buffer_length: int
+                The merge stage merges collected predictions whenever their number exceeds this length.
+                If None, predictions are only collected and should be merged by the caller.
+            queue_size: int
+                Maximum number of groups waiting between two stages.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size should be a positive integer but given as {batch_size}")
+        if queue_size < 1:
+            raise ValueError(f"queue_size should be a positive integer but given as {queue_size}")
+        self.image_reader = open_image_reader(image)
+        self.slice_bboxes = slice_bboxes
+        self.predict_fn = predict_fn
+        self.postprocess = postprocess
+        self.batch_size = batch_size
+        self.merge_buffer_length = merge_buffer_length
+        self.queue_size = queue_size
+
+        self.object_prediction_list: List[ObjectPrediction] = []
+        # the same predictions per slice when postprocess is None, see pop_object_prediction_lists
+        self._slice_object_prediction_lists: List[List[ObjectPrediction]] = []
+        # seconds each stage spent working, excluding the time spent waiting on queues
+        self.durations_in_seconds: Dict[str, float] = {}
+
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+
+    def run(self) -> Iterator[int]:
+        """
+        Runs the pipeline. Predictions are available in object_prediction_list once the generator is exhausted.
+
+        Yields:
+            Number of slices merged so far, after each group.
+        """
+        self.object_prediction_list = []
+        self._slice_object_prediction_lists = []
+        self.durations_in_seconds = {"slice": 0.0, "inference": 0.0, "shift": 0.0, "merge": 0.0}
+        self._stop_event.clear()
+        self._error = None
+
+        slice_queue = queue.Queue(maxsize=self.queue_size)
+        prediction_queue = queue.Queue(maxsize=self.queue_size)
+        shifted_queue = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(self._slice_stage, None, slice_queue),
+                name="sahi-pipeline-slice",
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._run_stage,
+                args=(self._inference_stage, slice_queue, prediction_queue),
+                name="sahi-pipeline-inference",
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._run_stage,
+                args=(self._shift_stage, prediction_queue, shifted_queue),
+                name="sahi-pipeline-shift",
+                daemon=True,
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            num_merged = 0
+            while True:
+                item = self._get(shifted_queue)
+                if item is _DONE:
+                    break
+                num_slices = len(item)
+                time_start = time.time()
+                for slice_object_prediction_list in item:
+                    self.object_prediction_list.extend(slice_object_prediction_list)
+                if self.postprocess is None:
+                    self._slice_object_prediction_lists.extend(item)
+                if (
+                    self.postprocess is not None
+                    and self.merge_buffer_length is not None
+                    and len(self.object_prediction_list) > self.merge_buffer_length
+                ):
+                    with profile("merge", num_predictions=len(self.object_prediction_list)):
+                        self.object_prediction_list = self.postprocess(self.object_prediction_list)
+                self.durations_in_seconds["merge"] += time.time() - time_start
+                num_merged += num_slices
+                yield num_merged
+        finally:
+            # also reached when the consumer stops early, upstream stages must not block on full queues
+            self._stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def pop_object_prediction_lists(self) -> List[List[ObjectPrediction]]:
+        """
+        Returns the shifted predictions of each slice collected so far, in slice order, and clears them. Meant to
+        be called by the consumer of run() between two groups, when predictions are merged by the caller
+        (postprocess None).
+        """
+        slice_object_prediction_lists = self._slice_object_prediction_lists
+        self._slice_object_prediction_lists = []
+        self.object_prediction_list = []
+        return slice_object_prediction_lists
+
+    def _run_stage(self, stage: Callable, input_queue: Optional[queue.Queue], output_queue: queue.Queue):
+        try:
+            stage(input_queue, output_queue)
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._stop_event.set()
+        else:
+            self._put(output_queue, _DONE)
+
+    def _put(self, output_queue: queue.Queue, item) -> bool:
+        while not self._stop_event.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, input_queue: queue.Queue):
+        while True:
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return _DONE
+
+    def _slice_stage(self, input_queue: None, output_queue: queue.Queue):
+        for group_start in range(0, len(self.slice_bboxes), self.batch_size):
+            time_start = time.time()
+            slice_bboxes = self.slice_bboxes[group_start : group_start + self.batch_size]
+            with profile("read_slices", windows=slice_bboxes):
+                image_list = [self.image_reader.read_window(slice_bbox) for slice_bbox in slice_bboxes]
+            self.durations_in_seconds["slice"] += time.time() - time_start
+            if not self._put(output_queue, (slice_bboxes, image_list)):
+                return
+
+    def _inference_stage(self, input_queue: queue.Queue, output_queue: queue.Queue):
+        while True:
+            item = self._get(input_queue)
+            if item is _DONE:
+                return
+            slice_bboxes, image_list = item
+            time_start = time.time()
+            object_prediction_list_per_slice = self.predict_fn(image_list, slice_bboxes)
+            self.durations_in_seconds["inference"] += time.time() - time_start
+            if not self._put(output_queue, object_prediction_list_per_slice):
+                return
+
+    def _shift_stage(self, input_queue: queue.Queue, output_queue: queue.Queue):
+        while True:
+            item = self._get(input_queue)
+            if item is _DONE:
+                return
+            time_start = time.time()
+            with profile("shift", num_slices=len(item)):
+                slice_object_prediction_lists = [
+                    [
+                        object_prediction.get_shifted_object_prediction()
+                        for object_prediction in slice_object_prediction_list
+                        if object_prediction  # if not empty
+                    ]
+                    for slice_object_prediction_list in item
+                ]
+            self.durations_in_seconds["shift"] += time.time() - time_start
+            if not self._put(output_queue, slice_object_prediction_lists):
+                return
@@ -2,11 +2,13 @@
 # Code written by Fatih C Akyon, 2021.
 
 import logging
-from typing import List
+from typing import Dict, List, Tuple
 
+import cv2
+import numpy as np
 import torch
 
-from sahi.postprocess.utils import ObjectPredictionList, has_match, merge_object_prediction_pair
+from sahi.postprocess.utils import BoxGridIndex, ObjectPredictionList, has_match, merge_object_prediction_pair
 from sahi.prediction import ObjectPrediction
 from sahi.utils.import_utils import check_requirements
 
@@ -147,10 +149,123 @@ def nms(
     return keep
 
 
+def _get_match_metric_values(
+    boxes: np.ndarray, areas: np.ndarray, ind: int, candidate_inds: np.ndarray, match_metric: str
+) -> np.ndarray:
+    """
+    Returns the match metric of box ind with each candidate box, computed with the same operations
+    and dtype as the exhaustive implementations.
+    """
+    xx1 = np.maximum(boxes[candidate_inds, 0], boxes[ind, 0])
+    yy1 = np.maximum(boxes[candidate_inds, 1], boxes[ind, 1])
+    xx2 = np.minimum(boxes[candidate_inds, 2], boxes[ind, 2])
+    yy2 = np.minimum(boxes[candidate_inds, 3], boxes[ind, 3])
+    inter = np.maximum(xx2 - xx1, 0) * np.maximum(yy2 - yy1, 0)
+    rem_areas = areas[candidate_inds]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if match_metric == "IOU":
+            return inter / ((rem_areas - inter) + areas[ind])
+        elif match_metric == "IOS":
+            return inter / np.minimum(rem_areas, areas[ind])
+        else:
+            raise ValueError()
+
+
+class _SpatialMatcher:
+    """
+    Finds the boxes matching a box without testing every box. Boxes not intersecting it have a match
+    metric of 0, except when one of the two boxes has no area and the metric is undefined (nan),
+    which the exhaustive implementations count as a match. Boxes without area are thus always tested.
+    """
+
+    def __init__(self, object_predictions_as_tensor: torch.tensor, match_metric: str, match_threshold: float):
+        predictions = object_predictions_as_tensor.detach().cpu().numpy()
+        self.boxes = predictions[:, :4]
+        self.scores = predictions[:, 4]
+        x1, y1, x2, y2 = (self.boxes[:, ind] for ind in range(4))
+        self.areas = (x2 - x1) * (y2 - y1)
+        self.match_metric = match_metric
+        # compared in the dtype of the boxes, as torch does
+        self.match_threshold = self.boxes.dtype.type(match_threshold)
+        self.degenerate_inds = np.flatnonzero(~(self.areas > 0))
+        self.index = BoxGridIndex(self.boxes)
+
+    def get_matches(self, ind: int, is_candidate: np.ndarray) -> np.ndarray:
+        """
+        Returns the indices of the candidate boxes (is_candidate True) matching box ind, in increasing order.
+        """
+        if self.areas[ind] > 0:
+            candidate_inds = self.index.query(self.boxes[ind])
+            if len(self.degenerate_inds) > 0:
+                candidate_inds = np.union1d(candidate_inds, self.degenerate_inds)
+        else:
+            candidate_inds = np.arange(len(self.boxes))
+        candidate_inds = candidate_inds[is_candidate[candidate_inds] & (candidate_inds != ind)]
+        if len(candidate_inds) == 0:
+            return candidate_inds
+        match_metric_value = _get_match_metric_values(
+            self.boxes, self.areas, ind, candidate_inds, self.match_metric
+        )
+        return candidate_inds[~(match_metric_value < self.match_threshold)]
+
+
+def _greedy_nmm_spatial(object_predictions_as_tensor: torch.tensor, match_metric: str, match_threshold: float):
+    matcher = _SpatialMatcher(object_predictions_as_tensor, match_metric, match_threshold)
+    # highest score first, as popping from the end of an ascending sort
+    order = np.argsort(matcher.scores, kind="stable")[::-1]
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    keep_to_merge_list = {}
+    is_remaining = np.ones(len(order), dtype=bool)
+    for ind in order.tolist():
+        if not is_remaining[ind]:
+            continue
+        is_remaining[ind] = False
+        matched_box_inds = matcher.get_matches(ind, is_remaining)
+        is_remaining[matched_box_inds] = False
+        # highest score first
+        keep_to_merge_list[ind] = matched_box_inds[np.argsort(rank[matched_box_inds])].tolist()
+    return keep_to_merge_list
+
+
+def _nmm_spatial(object_predictions_as_tensor: torch.tensor, match_metric: str, match_threshold: float):
+    matcher = _SpatialMatcher(object_predictions_as_tensor, match_metric, match_threshold)
+    order = np.argsort(-matcher.scores, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    keep_to_merge_list = {}
+    merge_to_keep = {}
+    is_candidate = np.ones(len(order), dtype=bool)
+    for pred_ind in order.tolist():
+        matched_box_inds = matcher.get_matches(pred_ind, is_candidate)
+        # lowest score first
+        matched_box_inds = matched_box_inds[np.argsort(-rank[matched_box_inds])].tolist()
+
+        if pred_ind not in merge_to_keep:
+            keep_to_merge_list[pred_ind] = []
+
+            for matched_box_ind in matched_box_inds:
+                if matched_box_ind not in merge_to_keep:
+                    keep_to_merge_list[pred_ind].append(matched_box_ind)
+                    merge_to_keep[matched_box_ind] = pred_ind
+
+        else:
+            keep = merge_to_keep[pred_ind]
+            for matched_box_ind in matched_box_inds:
+                if matched_box_ind not in keep_to_merge_list and matched_box_ind not in merge_to_keep:
+                    keep_to_merge_list[keep].append(matched_box_ind)
+                    merge_to_keep[matched_box_ind] = keep
+
+    return keep_to_merge_list
+
+
 def batched_greedy_nmm(
     object_predictions_as_tensor: torch.tensor,
     match_metric: str = "IOU",
     match_threshold: float = 0.5,
+    spatial_index: bool = True,
 ):
     """
     Apply greedy version of non-maximum merging per category to avoid detecting
@@ -161,6 +276,9 @@ def batched_greedy_nmm(
         match_metric: (str) IOU or IOS
         match_threshold: (float) The overlap thresh for
             match metric.
+        spatial_index: (bool) If True, only boxes sharing a cell of a uniform grid
+            index with a box are tested against it. Results are the same as testing
+            every box, ties in score are broken by prediction index.
     Returns:
         keep_to_merge_list: (Dict[int:List[int]]) mapping from prediction indices
         to keep to a list of prediction indices to be merged.
@@ -169,7 +287,9 @@ def batched_greedy_nmm(
     keep_to_merge_list = {}
     for category_id in torch.unique(category_ids):
         curr_indices = torch.where(category_ids == category_id)[0]
-        curr_keep_to_merge_list = greedy_nmm(object_predictions_as_tensor[curr_indices], match_metric, match_threshold)
+        curr_keep_to_merge_list = greedy_nmm(
+            object_predictions_as_tensor[curr_indices], match_metric, match_threshold, spatial_index
+        )
         curr_indices_list = curr_indices.tolist()
         for curr_keep, curr_merge_list in curr_keep_to_merge_list.items():
             keep = curr_indices_list[curr_keep]
@@ -182,6 +302,7 @@ def greedy_nmm(
     object_predictions_as_tensor: torch.tensor,
     match_metric: str = "IOU",
     match_threshold: float = 0.5,
+    spatial_index: bool = True,
 ):
     """
     Apply greedy version of non-maximum merging to avoid detecting too many
@@ -194,10 +315,17 @@ def greedy_nmm(
         match_metric: (str) IOU or IOS
         match_threshold: (float) The overlap thresh for
             match metric.
+        spatial_index: (bool) If True, only boxes sharing a cell of a uniform grid
+            index with a box are tested against it. Results are the same as testing
+            every box, ties in score are broken by prediction index.
     Returns:
         keep_to_merge_list: (Dict[int:List[int]]) mapping from prediction indices
         to keep to a list of prediction indices to be merged.
     """
+    # with a threshold <= 0 non-intersecting boxes match too, every box has to be tested
+    if spatial_index and match_threshold > 0:
+        return _greedy_nmm_spatial(object_predictions_as_tensor, match_metric, match_threshold)
+
     keep_to_merge_list = {}
 
     # we extract coordinates for every
@@ -305,6 +433,7 @@ def batched_nmm(
     object_predictions_as_tensor: torch.tensor,
     match_metric: str = "IOU",
     match_threshold: float = 0.5,
+    spatial_index: bool = True,
 ):
     """
     Apply non-maximum merging per category to avoid detecting too many
@@ -315,6 +444,9 @@ def batched_nmm(
         match_metric: (str) IOU or IOS
         match_threshold: (float) The overlap thresh for
             match metric.
+        spatial_index: (bool) If True, only boxes sharing a cell of a uniform grid
+            index with a box are tested against it. Results are the same as testing
+            every box, ties in score are broken by prediction index.
     Returns:
         keep_to_merge_list: (Dict[int:List[int]]) mapping from prediction indices
         to keep to a list of prediction indices to be merged.
@@ -323,7 +455,9 @@ def batched_nmm(
     keep_to_merge_list = {}
     for category_id in torch.unique(category_ids):
         curr_indices = torch.where(category_ids == category_id)[0]
-        curr_keep_to_merge_list = nmm(object_predictions_as_tensor[curr_indices], match_metric, match_threshold)
+        curr_keep_to_merge_list = nmm(
+            object_predictions_as_tensor[curr_indices], match_metric, match_threshold, spatial_index
+        )
         curr_indices_list = curr_indices.tolist()
         for curr_keep, curr_merge_list in curr_keep_to_merge_list.items():
             keep = curr_indices_list[curr_keep]
@@ -336,6 +470,7 @@ def nmm(
     object_predictions_as_tensor: torch.tensor,
     match_metric: str = "IOU",
     match_threshold: float = 0.5,
+    spatial_index: bool = True,
 ):
     """
     Apply non-maximum merging to avoid detecting too many
@@ -348,10 +483,17 @@ def nmm(
         match_metric: (str) IOU or IOS
         match_threshold: (float) The overlap thresh for
             match metric.
+        spatial_index: (bool) If True, only boxes sharing a cell of a uniform grid
+            index with a box are tested against it. Results are the same as testing
+            every box, ties in score are broken by prediction index.
     Returns:
         keep_to_merge_list: (Dict[int:List[int]]) mapping from prediction indices
         to keep to a list of prediction indices to be merged.
     """
+    # with a threshold <= 0 non-intersecting boxes match too, every box has to be tested
+    if spatial_index and match_threshold > 0:
+        return _nmm_spatial(object_predictions_as_tensor, match_metric, match_threshold)
+
     keep_to_merge_list = {}
     merge_to_keep = {}
 
@@ -601,3 +743,464 @@ class LSNMSPostprocess(PostprocessPredictions):
             selected_object_predictions = [selected_object_predictions]
 
         return selected_object_predictions
+
+
+class UnionPostprocess(PostprocessPredictions):
+    """
+    Paints the masks of the predictions into a single uint8 canvas (255 where any mask is set) instead
+    of merging predictions. Each call accumulates into the same canvas and returns an empty list, so
+    predictions can be streamed into it and dropped. Predictions without mask are painted as their bbox.
+    Unshifted slice predictions are painted at their shift amount, no full sized mask is ever created.
+    """
+
+    def __init__(
+        self,
+        full_shape: List[int],
+        match_threshold: float = 0.5,
+        match_metric: str = "IOU",
+        class_agnostic: bool = True,
+    ):
+        super().__init__(match_threshold=match_threshold, match_metric=match_metric, class_agnostic=class_agnostic)
+        self.canvas = np.zeros((full_shape[0], full_shape[1]), dtype=np.uint8)
+
+    def __call__(
+        self,
+        object_predictions: List[ObjectPrediction],
+    ):
+        height, width = self.canvas.shape
+        for object_prediction in object_predictions:
+            mask = object_prediction.mask
+            if mask is not None:
+                crop = mask.crop
+                xmin = mask.offset_x + mask.shift_x
+                ymin = mask.offset_y + mask.shift_y
+                xmax, ymax = xmin + crop.shape[1], ymin + crop.shape[0]
+            else:
+                box = object_prediction.bbox.get_shifted_box().to_xyxy()
+                xmin, ymin = int(np.floor(box[0])), int(np.floor(box[1]))
+                xmax, ymax = int(np.ceil(box[2])), int(np.ceil(box[3]))
+                crop = None
+            # clip to the canvas
+            x0, y0 = max(xmin, 0), max(ymin, 0)
+            x1, y1 = min(xmax, width), min(ymax, height)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            if crop is None:
+                self.canvas[y0:y1, x0:x1] = 255
+            else:
+                region = self.canvas[y0:y1, x0:x1]
+                region[crop[y0 - ymin : y1 - ymin, x0 - xmin : x1 - xmin]] = 255
+        return []
+
+
+def _get_taper_weights(length: int, taper_size: int, taper_start: bool, taper_end: bool) -> np.ndarray:
+    """
+    Returns 1D weights of a window side, ramping linearly from the tapered ends (exclusive) to 1 at taper_size.
+    """
+    weights = np.ones(length, dtype=np.float32)
+    if taper_size <= 0:
+        return weights
+    ramp = np.minimum((np.arange(length, dtype=np.float32) + 0.5) / taper_size, 1.0)
+    if taper_start:
+        weights = np.minimum(weights, ramp)
+    if taper_end:
+        weights = np.minimum(weights, ramp[::-1])
+    return weights
+
+
+class HeatmapFusionPostprocess(PostprocessPredictions):
+    """
+    Fuses the predictions of overlapping windows into a per-pixel probability heatmap and thresholds it
+    once, instead of merging predictions. The probability of a pixel in a window is the highest score of
+    the window predictions whose mask (or bbox without mask) covers it, zero elsewhere.
+
+    With fusion="mean", the heatmap is the weighted average of the probabilities of every window covering
+    the pixel, windows predicting nothing there count as zero. With fusion="max", it is their weighted maximum.
+    Weights ramp down linearly over taper_size pixels towards window borders lying inside the image, so that
+    predictions cut by a slice border count less than those of the slice seeing the object whole.
+
+    The heatmap and weights are float16 canvases of the full image size, each window is accumulated in time
+    proportional to its pixels. Windows are added with add_window, calling the instance adds predictions of
+    the full image (e.g. the standard prediction) as one window. Both return an empty list.
+    """
+
+    def __init__(
+        self,
+        full_shape: List[int],
+        fusion: str = "mean",
+        threshold: float = 0.5,
+        taper_size: int = 64,
+        match_threshold: float = 0.5,
+        match_metric: str = "IOU",
+        class_agnostic: bool = True,
+    ):
+        """
+        Args:
+            full_shape: List[int]
+                Size of the full image as [height, width].
+            fusion: str
+                "mean" or "max", see the class description.
+            threshold: float
+                Pixels with a fused probability >= threshold are foreground in canvas.
+            taper_size: int
+                Length in pixels of the weight ramp at window borders inside the image, 0 disables tapering.
+        """
+        if fusion not in ("mean", "max"):
+            raise ValueError(f"fusion should be one of ['mean', 'max'] but given as {fusion}")
+        super().__init__(match_threshold=match_threshold, match_metric=match_metric, class_agnostic=class_agnostic)
+        self.fusion = fusion
+        self.threshold = threshold
+        self.taper_size = taper_size
+        self.heatmap = np.zeros((full_shape[0], full_shape[1]), dtype=np.float16)
+        self.weights = np.zeros_like(self.heatmap) if fusion == "mean" else None
+
+    def add_window(self, window: List[int], object_predictions: List[ObjectPrediction]):
+        """
+        Args:
+            window: List[int]
+                Predicted window as [xmin, ymin, xmax, ymax] in full image coordinates.
+            object_predictions: List[ObjectPrediction]
+                Unshifted predictions of the window, in window coordinates.
+        """
+        height, width = self.heatmap.shape
+        xmin, ymin = max(int(window[0]), 0), max(int(window[1]), 0)
+        xmax, ymax = min(int(window[2]), width), min(int(window[3]), height)
+        if xmax <= xmin or ymax <= ymin:
+            return []
+        window_height, window_width = ymax - ymin, xmax - xmin
+
+        probabilities = np.zeros((window_height, window_width), dtype=np.float32)
+        for object_prediction in object_predictions:
+            score = object_prediction.score.value
+            mask = object_prediction.mask
+            if mask is not None:
+                crop = mask.crop
+                x0, y0 = mask.offset
+                x1, y1 = x0 + crop.shape[1], y0 + crop.shape[0]
+            else:
+                box = object_prediction.bbox.to_xyxy()
+                x0, y0 = int(np.floor(box[0])), int(np.floor(box[1]))
+                x1, y1 = int(np.ceil(box[2])), int(np.ceil(box[3]))
+                crop = None
+            # clip to the window
+            cx0, cy0 = max(x0, 0), max(y0, 0)
+            cx1, cy1 = min(x1, window_width), min(y1, window_height)
+            if cx1 <= cx0 or cy1 <= cy0:
+                continue
+            region = probabilities[cy0:cy1, cx0:cx1]
+            if crop is None:
+                np.maximum(region, score, out=region)
+            else:
+                covered = crop[cy0 - y0 : cy1 - y0, cx0 - x0 : cx1 - x0]
+                region[covered] = np.maximum(region[covered], score)
+
+        # borders on the image border are not tapered, no other window sees beyond them
+        weights = np.outer(
+            _get_taper_weights(window_height, self.taper_size, ymin > 0, ymax < height),
+            _get_taper_weights(window_width, self.taper_size, xmin > 0, xmax < width),
+        )
+        heatmap = self.heatmap[ymin:ymax, xmin:xmax]
+        if self.fusion == "mean":
+            heatmap += weights * probabilities
+            self.weights[ymin:ymax, xmin:xmax] += weights
+        else:
+            np.maximum(heatmap, weights * probabilities, out=heatmap, casting="same_kind")
+        return []
+
+    def __call__(
+        self,
+        object_predictions: List[ObjectPrediction],
+    ):
+        height, width = self.heatmap.shape
+        return self.add_window([0, 0, width, height], object_predictions)
+
+    @property
+    def canvas(self) -> np.ndarray:
+        """
+        Returns the thresholded heatmap as a uint8 mask, 255 where the fused probability is >= threshold.
+        """
+        if self.fusion == "mean":
+            # mean >= threshold without dividing, pixels no window covered have no weight
+            foreground = (self.heatmap >= self.weights * np.float16(self.threshold)) & (self.weights > 0)
+        else:
+            foreground = self.heatmap >= np.float16(self.threshold)
+        return foreground.astype(np.uint8) * np.uint8(255)
+
+
+def _get_owned_intervals(intervals: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """
+    Splits the overlap of consecutive slice intervals (along one axis) at its middle, returns the part of
+    each interval no other interval is closer to the center of.
+    """
+    intervals = sorted(set(intervals))
+    owned_intervals = {}
+    for index, (start, end) in enumerate(intervals):
+        owned_start = start if index == 0 else max(start, (start + intervals[index - 1][1]) // 2)
+        owned_end = end if index == len(intervals) - 1 else min(end, (intervals[index + 1][0] + end) // 2)
+        owned_intervals[(start, end)] = (owned_start, owned_end)
+    return owned_intervals
+
+
+def _get_runs(line: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Returns the [start, end) runs of nonzero values of a 1D array.
+    """
+    padded = np.concatenate([[0], (line > 0).astype(np.int8), [0]])
+    changes = np.flatnonzero(np.diff(padded))
+    return list(zip(changes[::2].tolist(), changes[1::2].tolist()))
+
+
+class SeamStitchPostprocess(PostprocessPredictions):
+    """
+    Stitches slice masks along seams instead of relying on a large slice overlap. Each window only keeps
+    the part of its masks lying in its central region, the part of the window closer to its center than
+    to the center of any overlapping slice, extended by seam_width pixels across each seam. Predictions
+    cut by a slice border, where the model lacks context, are left to the neighbouring slice.
+
+    Masks still broken at a seam (e.g. a crack fading out towards both slice borders) are reconnected by
+    matching border crossings: the runs of mask pixels on the two lines just outside the seam band are
+    paired by position along the seam, and pairs not already connected inside the band are bridged by a
+    band-wide quadrilateral joining them. Seams are only stitched between predicted neighbours.
+
+    Windows are added with add_window and painted into a uint8 canvas, calling the instance paints the
+    predictions of the full image (e.g. the standard prediction) without clipping. Both return an empty list.
+    """
+
+    def __init__(
+        self,
+        full_shape: List[int],
+        slice_bboxes: List[List[int]],
+        seam_width: int = 16,
+        max_bridge_offset: int = 64,
+        max_bridge_width: int = 32,
+        match_threshold: float = 0.5,
+        match_metric: str = "IOU",
+        class_agnostic: bool = True,
+    ):
+        """
+        Args:
+            full_shape: List[int]
+                Size of the full image as [height, width].
+            slice_bboxes: List[List[int]]
+                All slice windows as [xmin, ymin, xmax, ymax], including the ones that will not be predicted,
+                see sahi.slicing.get_slice_bboxes. The central regions are computed from their grid.
+            seam_width: int
+                Number of pixels each window keeps across a seam, beyond its central region.
+            max_bridge_offset: int
+                Maximum distance along the seam between the centers of two bridged crossings. Cracks crossing
+                the seam obliquely shift along it over the band, the default allows about 60 degrees with
+                the default seam_width.
+            max_bridge_width: int
+                Crossings longer than this (e.g. a crack running along the seam) are not bridged.
+        """
+        super().__init__(match_threshold=match_threshold, match_metric=match_metric, class_agnostic=class_agnostic)
+        self._canvas = np.zeros((full_shape[0], full_shape[1]), dtype=np.uint8)
+        self.seam_width = seam_width
+        self.max_bridge_offset = max_bridge_offset
+        self.max_bridge_width = max_bridge_width
+        self._owned_columns = _get_owned_intervals([(bbox[0], bbox[2]) for bbox in slice_bboxes])
+        self._owned_rows = _get_owned_intervals([(bbox[1], bbox[3]) for bbox in slice_bboxes])
+        # right neighbour of each column and bottom neighbour of each row of the grid
+        columns, rows = sorted(self._owned_columns), sorted(self._owned_rows)
+        self._next_columns = dict(zip(columns[:-1], columns[1:]))
+        self._next_rows = dict(zip(rows[:-1], rows[1:]))
+        # (column, row) intervals of the added windows, their seams are stitched once the canvas is requested
+        self._added_windows = set()
+        self._stitched = True
+        self.num_bridges = 0
+
+    def add_window(self, window: List[int], object_predictions: List[ObjectPrediction]):
+        """
+        Args:
+            window: List[int]
+                Predicted window as [xmin, ymin, xmax, ymax] in full image coordinates.
+            object_predictions: List[ObjectPrediction]
+                Unshifted predictions of the window, in window coordinates.
+        """
+        column, row = (int(window[0]), int(window[2])), (int(window[1]), int(window[3]))
+        # windows outside the slice grid are painted whole
+        owned_xmin, owned_xmax = self._owned_columns.get(column, column)
+        owned_ymin, owned_ymax = self._owned_rows.get(row, row)
+        kept_region = [
+            max(column[0], owned_xmin - self.seam_width),
+            max(row[0], owned_ymin - self.seam_width),
+            min(column[1], owned_xmax + self.seam_width),
+            min(row[1], owned_ymax + self.seam_width),
+        ]
+        self._paint(object_predictions, [column[0], row[0]], kept_region)
+        if column in self._owned_columns and row in self._owned_rows:
+            self._added_windows.add((column, row))
+            self._stitched = False
+        return []
+
+    def __call__(
+        self,
+        object_predictions: List[ObjectPrediction],
+    ):
+        height, width = self._canvas.shape
+        self._paint(object_predictions, [0, 0], [0, 0, width, height])
+        return []
+
+    @property
+    def canvas(self) -> np.ndarray:
+        """
+        Returns the stitched masks as a uint8 mask, 255 where any kept mask is set or a seam was bridged.
+        """
+        if not self._stitched:
+            self._stitch_seams()
+            self._stitched = True
+        return self._canvas
+
+    def _paint(self, object_predictions: List[ObjectPrediction], shift_amount: List[int], region: List[int]):
+        height, width = self._canvas.shape
+        region_xmin, region_ymin = max(region[0], 0), max(region[1], 0)
+        region_xmax, region_ymax = min(region[2], width), min(region[3], height)
+        for object_prediction in object_predictions:
+            mask = object_prediction.mask
+            if mask is not None:
+                crop = mask.crop
+                xmin, ymin = mask.offset_x + shift_amount[0], mask.offset_y + shift_amount[1]
+                xmax, ymax = xmin + crop.shape[1], ymin + crop.shape[0]
+            else:
+                box = object_prediction.bbox.to_xyxy()
+                xmin, ymin = int(np.floor(box[0])) + shift_amount[0], int(np.floor(box[1])) + shift_amount[1]
+                xmax, ymax = int(np.ceil(box[2])) + shift_amount[0], int(np.ceil(box[3])) + shift_amount[1]
+                crop = None
+            # clip to the kept region
+            x0, y0 = max(xmin, region_xmin), max(ymin, region_ymin)
+            x1, y1 = min(xmax, region_xmax), min(ymax, region_ymax)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            if crop is None:
+                self._canvas[y0:y1, x0:x1] = 255
+            else:
+                canvas_region = self._canvas[y0:y1, x0:x1]
+                canvas_region[crop[y0 - ymin : y1 - ymin, x0 - xmin : x1 - xmin]] = 255
+
+    def _stitch_seams(self):
+        height, width = self._canvas.shape
+        for column, row in self._added_windows:
+            owned_xmin, owned_xmax = self._owned_columns[column]
+            owned_ymin, owned_ymax = self._owned_rows[row]
+            # seams with the right and bottom neighbours, each seam is stitched once
+            right_column = self._next_columns.get(column)
+            if right_column is not None and (right_column, row) in self._added_windows:
+                seam = self._owned_columns[right_column][0]
+                first, last = seam - self.seam_width - 1, seam + self.seam_width
+                if first >= 0 and last < width:
+                    band = self._canvas[max(owned_ymin - self.seam_width, 0) : owned_ymax + self.seam_width]
+                    self._bridge_band(band[:, first : last + 1])
+            bottom_row = self._next_rows.get(row)
+            if bottom_row is not None and (column, bottom_row) in self._added_windows:
+                seam = self._owned_rows[bottom_row][0]
+                first, last = seam - self.seam_width - 1, seam + self.seam_width
+                if first >= 0 and last < height:
+                    band = self._canvas[first : last + 1]
+                    band = band[:, max(owned_xmin - self.seam_width, 0) : owned_xmax + self.seam_width]
+                    # seam along the first axis
+                    self._bridge_band(band.T)
+
+    def _bridge_band(self, band: np.ndarray):
+        """
+        Bridges the crossings of the first and last columns of a band across a vertical seam, band is a view
+        of the canvas.
+        """
+        first_runs = [run for run in _get_runs(band[:, 0]) if run[1] - run[0] <= self.max_bridge_width]
+        last_runs = [run for run in _get_runs(band[:, -1]) if run[1] - run[0] <= self.max_bridge_width]
+        if not first_runs or not last_runs:
+            return
+        _, labels = cv2.connectedComponents(np.ascontiguousarray(band), connectivity=8)
+        candidates = []
+        for first_index, (first_start, first_end) in enumerate(first_runs):
+            for last_index, (last_start, last_end) in enumerate(last_runs):
+                offset = abs((first_start + first_end) - (last_start + last_end)) / 2
+                if offset <= self.max_bridge_offset:
+                    candidates.append((offset, first_index, last_index))
+        # closest pairs first, each crossing is bridged at most once
+        matched_first, matched_last = set(), set()
+        for _, first_index, last_index in sorted(candidates):
+            if first_index in matched_first or last_index in matched_last:
+                continue
+            matched_first.add(first_index)
+            matched_last.add(last_index)
+            (first_start, first_end), (last_start, last_end) = first_runs[first_index], last_runs[last_index]
+            if labels[first_start, 0] == labels[last_start, -1]:
+                continue
+            # quadrilateral between the two crossings, column by column
+            num_columns = band.shape[1]
+            for index in range(num_columns):
+                t = index / (num_columns - 1)
+                start = int(round(first_start + t * (last_start - first_start)))
+                end = int(round(first_end + t * (last_end - first_end)))
+                band[start:end, index] = 255
+            self.num_bridges += 1
+
+
+class RowStreamingMerger:
+    """
+    Merges the shifted predictions of slice windows predicted row by row (as ordered by
+    sahi.slicing.get_slice_bboxes) while keeping only the predictions of the current rows in memory.
+
+    Predictions are added with the smallest top coordinate of the windows still to come (the frontier).
+    Predictions of later windows lie below the frontier, so once the frontier moved, predictions ending
+    above it can not match any of them anymore: the active predictions are merged with postprocess, those
+    ending above the frontier are painted into a UnionPostprocess canvas and dropped.
+    """
+
+    def __init__(self, postprocess: PostprocessPredictions, full_shape: List[int]):
+        """
+        Args:
+            postprocess: PostprocessPredictions
+                Merges the active predictions, e.g. GreedyNMMPostprocess.
+            full_shape: List[int]
+                Size of the full image as [height, width].
+        """
+        self.postprocess = postprocess
+        self.union = UnionPostprocess(full_shape)
+        self.object_prediction_list: List[ObjectPrediction] = []
+        self.frontier = 0
+        self.num_finalized = 0
+        # largest number of predictions kept in memory at once
+        self.max_num_active = 0
+
+    def add(self, object_predictions: List[ObjectPrediction], frontier: float):
+        """
+        Args:
+            object_predictions: List[ObjectPrediction]
+                Shifted predictions of the windows predicted since the last call.
+            frontier: float
+                Smallest top coordinate of the windows not added yet, float("inf") if there are none.
+        """
+        self.object_prediction_list.extend(object_predictions)
+        self.max_num_active = max(self.max_num_active, len(self.object_prediction_list))
+        if frontier > self.frontier:
+            self.frontier = frontier
+            self._finalize()
+
+    def flush(self):
+        """
+        Merges and finalizes all remaining predictions.
+        """
+        self.add([], float("inf"))
+
+    def _finalize(self):
+        if len(self.object_prediction_list) > 1:
+            self.object_prediction_list = self.postprocess(self.object_prediction_list)
+        finalized = []
+        active = []
+        for object_prediction in self.object_prediction_list:
+            bbox = object_prediction.bbox
+            if bbox.maxy + bbox.shift_y <= self.frontier:
+                finalized.append(object_prediction)
+            else:
+                active.append(object_prediction)
+        self.union(finalized)
+        self.num_finalized += len(finalized)
+        self.object_prediction_list = active
+
+    @property
+    def canvas(self) -> np.ndarray:
+        """
+        Returns the uint8 mask of the finalized predictions, 255 where any of their masks is set.
+        """
+        return self.union.canvas
@@ -7,7 +7,12 @@ from typing import List
 import numpy as np
 
 from sahi.annotation import BoundingBox, Category, Mask
-from sahi.postprocess.utils import calculate_area, calculate_box_union, calculate_intersection_area
+from sahi.postprocess.utils import (
+    calculate_area,
+    calculate_box_union,
+    calculate_intersection_area,
+    get_merged_mask,
+)
 from sahi.prediction import ObjectPrediction
 
 
@@ -132,19 +137,18 @@ class UnionMergePostprocess(PostprocessPredictions):
         merged_category: Category = self._get_merged_category(pred1, pred2)
         if pred1.mask and pred2.mask:
             merged_mask: Mask = self._get_merged_mask(pred1, pred2)
-            bool_mask = merged_mask.bool_mask
             full_shape = merged_mask.full_shape
         else:
-            bool_mask = None
+            merged_mask = None
             full_shape = None
         return ObjectPrediction(
             bbox=merged_bbox.to_xyxy(),
             score=merged_score,
             category_id=merged_category.id,
             category_name=merged_category.name,
-            bool_mask=bool_mask,
             shift_amount=shift_amount,
             full_shape=full_shape,
+            mask=merged_mask,
         )
 
     @staticmethod
@@ -171,11 +175,4 @@ class UnionMergePostprocess(PostprocessPredictions):
 
     @staticmethod
     def _get_merged_mask(pred1: ObjectPrediction, pred2: ObjectPrediction) -> Mask:
-        mask1 = pred1.mask
-        mask2 = pred2.mask
-        union_mask = np.logical_or(mask1.bool_mask, mask2.bool_mask)
-        return Mask(
-            bool_mask=union_mask,
-            full_shape=mask1.full_shape,
-            shift_amount=mask1.shift_amount,
-        )
+        return get_merged_mask(pred1, pred2)
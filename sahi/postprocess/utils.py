@@ -1,5 +1,6 @@
+from collections import defaultdict
 from collections.abc import Sequence
-from typing import List, Union
+from typing import List, Optional, Union
 
 import numpy as np
 import torch
@@ -91,6 +92,70 @@ def object_prediction_list_to_numpy(object_prediction_list: ObjectPredictionList
     return numpy_predictions
 
 
+class BoxGridIndex:
+    """
+    Uniform grid over boxes: each box is registered in the grid cells it covers, so that the boxes possibly
+    intersecting a query box are found by looking at the cells it covers instead of testing every box.
+    Boxes with non-finite coordinates are not registered.
+    """
+
+    def __init__(self, boxes: np.ndarray, cell_size: Optional[float] = None):
+        """
+        Args:
+            boxes: np.ndarray
+                Boxes as an array of [x1, y1, x2, y2] rows.
+            cell_size: float
+                Side of the grid cells, defaults to twice the median box side so that most boxes cover
+                at most four cells.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        is_finite = np.isfinite(boxes).all(axis=1)
+        if cell_size is None:
+            sides = np.maximum(boxes[is_finite, 2] - boxes[is_finite, 0], boxes[is_finite, 3] - boxes[is_finite, 1])
+            sides = sides[sides > 0]
+            cell_size = 2 * float(np.median(sides)) if len(sides) > 0 else 1.0
+        self.cell_size = cell_size
+        self.origin = boxes[is_finite, :2].min(axis=0) if is_finite.any() else np.zeros(2)
+
+        cells = defaultdict(list)
+        for box_ind in np.flatnonzero(is_finite).tolist():
+            col_min, row_min, col_max, row_max = self._get_cell_range(boxes[box_ind])
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    cells[(col, row)].append(box_ind)
+        self._cells = {cell: np.array(box_inds, dtype=np.int64) for cell, box_inds in cells.items()}
+
+    def _get_cell_range(self, box: np.ndarray):
+        col_min, row_min = np.floor((box[:2] - self.origin) / self.cell_size).astype(np.int64).tolist()
+        col_max, row_max = np.floor((box[2:] - self.origin) / self.cell_size).astype(np.int64).tolist()
+        return col_min, row_min, max(col_max, col_min), max(row_max, row_min)
+
+    def query(self, box: Union[List[float], np.ndarray]) -> np.ndarray:
+        """
+        Returns the sorted indices of the boxes sharing a grid cell with box, a superset of the boxes
+        intersecting it.
+        """
+        col_min, row_min, col_max, row_max = self._get_cell_range(np.asarray(box, dtype=np.float64))
+        num_cells = (col_max - col_min + 1) * (row_max - row_min + 1)
+        if num_cells > len(self._cells):
+            # the box covers more cells than there are occupied ones
+            box_inds_list = [
+                box_inds
+                for (col, row), box_inds in self._cells.items()
+                if col_min <= col <= col_max and row_min <= row <= row_max
+            ]
+        else:
+            box_inds_list = [
+                self._cells[(col, row)]
+                for row in range(row_min, row_max + 1)
+                for col in range(col_min, col_max + 1)
+                if (col, row) in self._cells
+            ]
+        if not box_inds_list:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(box_inds_list))
+
+
 def calculate_box_union(box1: Union[List[int], np.ndarray], box2: Union[List[int], np.ndarray]) -> List[int]:
     """
     Args:
@@ -158,11 +223,29 @@ def has_match(
 
 
 def get_merged_mask(pred1: ObjectPrediction, pred2: ObjectPrediction) -> Mask:
+    """
+    Returns the union of the masks of pred1 and pred2. Only the region covering both mask crops is
+    allocated, merging costs the size of the objects, not of the image.
+    """
     mask1 = pred1.mask
     mask2 = pred2.mask
-    union_mask = np.logical_or(mask1.bool_mask, mask2.bool_mask)
-    return Mask(
-        bool_mask=union_mask,
+    height, width = mask1.shape
+    crops = [(mask.crop, mask.offset) for mask in (mask1, mask2) if mask.crop is not None and mask.crop.size > 0]
+    # region covering both crops, clipped to the mask
+    xmin = max(min([offset[0] for _, offset in crops], default=0), 0)
+    ymin = max(min([offset[1] for _, offset in crops], default=0), 0)
+    xmax = min(max([offset[0] + crop.shape[1] for crop, offset in crops], default=0), width)
+    ymax = min(max([offset[1] + crop.shape[0] for crop, offset in crops], default=0), height)
+    union_crop = np.zeros((max(ymax - ymin, 0), max(xmax - xmin, 0)), dtype=bool)
+    for crop, (x, y) in crops:
+        x0, y0 = max(x, xmin), max(y, ymin)
+        x1, y1 = min(x + crop.shape[1], xmax), min(y + crop.shape[0], ymax)
+        if x1 > x0 and y1 > y0:
+            union_crop[y0 - ymin : y1 - ymin, x0 - xmin : x1 - xmin] |= crop[y0 - y : y1 - y, x0 - x : x1 - x]
+    return Mask.from_crop(
+        union_crop,
+        offset=[xmin, ymin],
+        shape=mask1.shape,
         full_shape=mask1.full_shape,
         shift_amount=mask1.shift_amount,
     )
@@ -200,17 +283,16 @@ def merge_object_prediction_pair(
     merged_category: Category = get_merged_category(pred1, pred2)
     if pred1.mask and pred2.mask:
         merged_mask: Mask = get_merged_mask(pred1, pred2)
-        bool_mask = merged_mask.bool_mask
         full_shape = merged_mask.full_shape
     else:
-        bool_mask = None
+        merged_mask = None
         full_shape = None
     return ObjectPrediction(
         bbox=merged_bbox.to_xyxy(),
         score=merged_score,
         category_id=merged_category.id,
         category_name=merged_category.name,
-        bool_mask=bool_mask,
         shift_amount=shift_amount,
         full_shape=full_shape,
+        mask=merged_mask,
     )
@@ -4,8 +4,7 @@
 import logging
 import os
 import time
-from typing import List, Optional
-from PySide6.QtCore import Signal
+from typing import Iterator, List, Optional
 
 from sahi.utils.import_utils import is_available
 
@@ -19,16 +18,27 @@ import numpy as np
 from tqdm import tqdm
 
 from sahi.auto_model import AutoDetectionModel
+from sahi.cache import WindowPredictionCache, get_image_hash
+from sahi.coarse import CoarseEvidenceMap
+from sahi.journal import SliceJournal
 from sahi.models.base import DetectionModel
 from sahi.postprocess.combine import (
     GreedyNMMPostprocess,
+    HeatmapFusionPostprocess,
     LSNMSPostprocess,
     NMMPostprocess,
     NMSPostprocess,
     PostprocessPredictions,
+    RowStreamingMerger,
+    SeamStitchPostprocess,
+    UnionPostprocess,
 )
-from sahi.prediction import ObjectPrediction, PredictionResult
-from sahi.slicing import slice_image
+from sahi.parallel import SliceInferencePool
+from sahi.pipeline import SlicedPredictionPipeline
+from sahi.prefilter import SlicePrefilter
+from sahi.reader import ArrayImageReader, open_image_reader
+from sahi.prediction import ObjectPrediction, PredictionResult, object_prediction_list_from_compact
+from sahi.slicing import SlicedImage, get_slice_bboxes, slice_image
 from sahi.utils.coco import Coco, CocoImage
 from sahi.utils.cv import (
     IMAGE_EXTENSIONS,
@@ -41,6 +51,8 @@ from sahi.utils.cv import (
 )
 from sahi.utils.file import Path, increment_path, list_files, save_json, save_pickle
 from sahi.utils.import_utils import check_requirements
+from sahi.utils.profiler import add_span, count, profile, profiled
+from sahi.utils.progress import ProgressCallback, ProgressTracker
 
 POSTPROCESS_NAME_TO_CLASS = {
     "GREEDYNMM": GreedyNMMPostprocess,
@@ -49,6 +61,12 @@ POSTPROCESS_NAME_TO_CLASS = {
     "LSNMS": LSNMSPostprocess,
 }
 
+# postprocess types fusing windows into a probability heatmap, see HeatmapFusionPostprocess
+HEATMAP_FUSION_TYPES = {
+    "HEATMAP_MEAN": "mean",
+    "HEATMAP_MAX": "max",
+}
+
 LOW_MODEL_CONFIDENCE = 0.1
 
 
@@ -91,22 +109,24 @@ def get_prediction(
     image_as_pil = read_image_as_pil(image)
     # get prediction
     time_start = time.time()
-    detection_model.perform_inference(np.ascontiguousarray(image_as_pil))
+    with profile("inference", num_images=1):
+        detection_model.perform_inference(np.ascontiguousarray(image_as_pil))
     time_end = time.time() - time_start
     durations_in_seconds["prediction"] = time_end
 
     # process prediction
     time_start = time.time()
-    # works only with 1 batch
-    detection_model.convert_original_predictions(
-        shift_amount=shift_amount,
-        full_shape=full_shape,
-    )
-    object_prediction_list: List[ObjectPrediction] = detection_model.object_prediction_list
+    with profile("convert", num_images=1):
+        # works only with 1 batch
+        detection_model.convert_original_predictions(
+            shift_amount=shift_amount,
+            full_shape=full_shape,
+        )
+        object_prediction_list: List[ObjectPrediction] = detection_model.object_prediction_list
 
-    # postprocess matching predictions
-    if postprocess is not None:
-        object_prediction_list = postprocess(object_prediction_list)
+        # postprocess matching predictions
+        if postprocess is not None:
+            object_prediction_list = postprocess(object_prediction_list)
 
     time_end = time.time() - time_start
     durations_in_seconds["postprocess"] = time_end
@@ -123,8 +143,184 @@ def get_prediction(
     )
 
 
+def get_batch_prediction(
+    image_list: List[np.ndarray],
+    detection_model,
+    shift_amount_list: List[List[int]],
+    full_shape_list: Optional[List[List[int]]] = None,
+    postprocess: Optional[PostprocessPredictions] = None,
+    verbose: int = 0,
+) -> List[PredictionResult]:
+    """
+    Function for performing prediction for a batch of images in a single forward pass of given detection_model.
+
+    Arguments:
+        image_list: List[np.ndarray]
+            Numpy image matrices to be predicted together
+        detection_model: model.DetectionModel
+            Should support batch inference (see DetectionModel.supports_batch_inference)
+        shift_amount_list: List[List[int]]
+            To shift the box and mask predictions from sliced images to full
+            sized image, should be in the form of List[[shift_x, shift_y],...]
+        full_shape_list: List[List[int]]
+            Size of the full image for each sliced image, should be in the form of List[[height, width],...]
+        postprocess: sahi.postprocess.combine.PostprocessPredictions
+        verbose: int
+            0: no print (default)
+            1: print prediction duration
+
+    Returns:
+        A list of PredictionResult, one for each image of image_list.
+    """
+    durations_in_seconds = dict()
+
+    # get prediction
+    time_start = time.time()
+    with profile("inference", num_images=len(image_list)):
+        detection_model.perform_batch_inference([np.ascontiguousarray(image) for image in image_list])
+    time_end = time.time() - time_start
+    durations_in_seconds["prediction"] = time_end
+
+    # process prediction
+    time_start = time.time()
+    with profile("convert", num_images=len(image_list)):
+        detection_model.convert_original_predictions(
+            shift_amount=shift_amount_list,
+            full_shape=full_shape_list,
+        )
+        object_prediction_list_per_image: List[List[ObjectPrediction]] = (
+            detection_model.object_prediction_list_per_image
+        )
+
+        # postprocess matching predictions
+        if postprocess is not None:
+            object_prediction_list_per_image = [
+                postprocess(object_prediction_list) for object_prediction_list in object_prediction_list_per_image
+            ]
+
+    time_end = time.time() - time_start
+    durations_in_seconds["postprocess"] = time_end
+
+    if verbose == 1:
+        print(
+            "Batch prediction of",
+            len(image_list),
+            "images performed in",
+            durations_in_seconds["prediction"],
+            "seconds.",
+        )
+
+    return [
+        PredictionResult(
+            image=image, object_prediction_list=object_prediction_list, durations_in_seconds=durations_in_seconds
+        )
+        for image, object_prediction_list in zip(image_list, object_prediction_list_per_image)
+    ]
+
+
+def _predict_slice_batch(
+    detection_model,
+    image_list: List[np.ndarray],
+    shift_amount_list: List[List[int]],
+    full_shape: List[int],
+) -> List[List[ObjectPrediction]]:
+    """
+    Predicts a group of slices and returns the unshifted ObjectPrediction list of each slice.
+    """
+    windows = [
+        [int(shift_x), int(shift_y), int(shift_x) + image.shape[1], int(shift_y) + image.shape[0]]
+        for (shift_x, shift_y), image in zip(shift_amount_list, image_list)
+    ]
+    with profile("predict_slices", windows=windows):
+        if len(image_list) == 1:
+            prediction_result_list = [
+                get_prediction(
+                    image=image_list[0],
+                    detection_model=detection_model,
+                    shift_amount=shift_amount_list[0],
+                    full_shape=full_shape,
+                )
+            ]
+        else:
+            # perform batch prediction
+            prediction_result_list = get_batch_prediction(
+                image_list=image_list,
+                detection_model=detection_model,
+                shift_amount_list=shift_amount_list,
+                full_shape_list=[full_shape] * len(image_list),
+            )
+    return [prediction_result.object_prediction_list for prediction_result in prediction_result_list]
+
+
+def _iter_sliced_predictions(
+    detection_model,
+    sliced_image_list: List[SlicedImage],
+    full_shape: List[int],
+    batch_size: int = 1,
+) -> Iterator[List[List[ObjectPrediction]]]:
+    """
+    Predicts sliced images in groups of batch_size and yields, for each group, the list of
+    unshifted ObjectPrediction lists of each slice.
+    """
+    for group_start in range(0, len(sliced_image_list), batch_size):
+        batch = sliced_image_list[group_start : group_start + batch_size]
+        with profile("read_slices", windows=[sliced_image.window for sliced_image in batch]):
+            image_list = [sliced_image.image for sliced_image in batch]
+        yield _predict_slice_batch(
+            detection_model,
+            image_list=image_list,
+            shift_amount_list=[sliced_image.starting_pixel for sliced_image in batch],
+            full_shape=full_shape,
+        )
+
+
+def _put_window_predictions(
+    window_cache: WindowPredictionCache,
+    keys: List[str],
+    object_prediction_list_per_slice: List[List[ObjectPrediction]],
+    confidence_threshold: float,
+):
+    for key, slice_object_prediction_list in zip(keys, object_prediction_list_per_slice):
+        window_cache.put_window(
+            key,
+            [object_prediction for object_prediction in slice_object_prediction_list if object_prediction],
+            confidence_threshold,
+            # evicted once after all slices are predicted
+            evict=False,
+        )
+
+
+def _get_standard_prediction(
+    image,
+    detection_model,
+    window_cache: Optional[WindowPredictionCache] = None,
+    window_cache_key: Optional[str] = None,
+) -> List[ObjectPrediction]:
+    """
+    Predicts the full image in a single (downscaled) model call, the result is cached as the
+    prediction of the full image window if window_cache is given.
+    """
+    if window_cache is not None:
+        compact_list = window_cache.get_window(window_cache_key, detection_model.confidence_threshold)
+        if compact_list is not None:
+            return object_prediction_list_from_compact(compact_list)
+    with profile("standard_prediction"):
+        prediction_result = get_prediction(
+            image=image,
+            detection_model=detection_model,
+            shift_amount=[0, 0],
+            full_shape=None,
+            postprocess=None,
+        )
+    if window_cache is not None:
+        window_cache.put_window(
+            window_cache_key, prediction_result.object_prediction_list, detection_model.confidence_threshold
+        )
+    return prediction_result.object_prediction_list
+
+
+@profiled()
 def get_sliced_prediction(
-    helper,
     image,
     detection_model=None,
     slice_height: int = None,
@@ -139,13 +335,27 @@ def get_sliced_prediction(
     verbose: int = 1,
     merge_buffer_length: int = None,
     auto_slice_resolution: bool = True,
+    batch_size: int = 1,
+    num_workers: int = 0,
+    slice_prefilter: Optional[SlicePrefilter] = None,
+    pipelined: bool = False,
+    pipeline_queue_size: int = 2,
+    window_cache: Optional[WindowPredictionCache] = None,
+    journal: Optional[SliceJournal] = None,
+    coarse_to_fine: bool = False,
+    coarse_margin: int = 64,
+    coarse_confidence_threshold: Optional[float] = None,
+    stream_merge: bool = False,
+    progress_callback: Optional[ProgressCallback] = None,
+    heatmap_threshold: Optional[float] = None,
 ) -> PredictionResult:
     """
     Function for slice image + get predicion for each slice + combine predictions in full image.
 
     Args:
         image: str or np.ndarray
-            Location of image or numpy image matrix to slice
+            Location of image or numpy image matrix to slice. Slices of image files are decoded only when
+            they are predicted, tiled TIFF and .npy files are read window by window (see sahi.reader).
         detection_model: model.DetectionModel
         slice_height: int
             Height of each slice.  Defaults to ``None``.
@@ -161,10 +371,20 @@ def get_sliced_prediction(
             Default to ``0.2``.
         perform_standard_pred: bool
             Perform a standard prediction on top of sliced predictions to increase large object
-            detection accuracy. Default: True.
+            detection accuracy. It reads the full image, disable it for images that do not fit in memory.
+            Default: True.
         postprocess_type: str
             Type of the postprocess to be used after sliced inference while merging/eliminating predictions.
-            Options are 'NMM', 'GRREDYNMM' or 'NMS'. Default is 'GRREDYNMM'.
+            Options are 'NMM', 'GRREDYNMM', 'NMS' or 'UNION'. Default is 'GRREDYNMM'.
+            'UNION' does not merge predictions: masks are painted into a single uint8 canvas as they are
+            predicted, the result has an empty object_prediction_list and the canvas as binary_mask.
+            'HEATMAP_MEAN' and 'HEATMAP_MAX' fuse the scores of overlapping windows into a per-pixel heatmap
+            with weights tapered towards slice borders (weighted average or maximum), thresholded once at
+            heatmap_threshold into binary_mask. The object_prediction_list is empty as well. The standard
+            prediction is not fused by 'HEATMAP_MEAN', it would count as zero wherever it predicts nothing.
+            'SEAM_STITCH' paints each slice only within its central region plus a seam band, and reconnects
+            masks broken at slice seams, so that a low overlap keeps cracks continuous (see
+            sahi.postprocess.combine.SeamStitchPostprocess). The result is in binary_mask as well.
         postprocess_match_metric: str
             Metric to be used during object prediction matching after sliced prediction.
             'IOU' for intersection over union, 'IOS' for intersection over smaller area.
@@ -184,97 +404,531 @@ def get_sliced_prediction(
         auto_slice_resolution: bool
             if slice parameters (slice_height, slice_width) are not given,
             it enables automatically calculate these params from image resolution and orientation.
+        batch_size: int
+            Number of slices stacked into a single model call. Values larger than 1 require a
+            detection model that supports batch inference. Default: 1.
+        num_workers: int
+            If larger than 0, slices are predicted by this many worker processes, each holding its own
+            replica of detection_model (see sahi.parallel.SliceInferencePool). The image is shared
+            with the workers through shared memory. Default: 0 (predict in the calling process).
+        slice_prefilter: sahi.prefilter.SlicePrefilter
+            Called on each slice before inference, slices it rejects (e.g. blank, uniform or no-data
+            windows) are not sent to detection_model. See sahi.prefilter for available prefilters.
+        pipelined: bool
+            If True, slicing, inference, shifting and merging run as concurrent stages connected by
+            bounded queues (see sahi.pipeline.SlicedPredictionPipeline). Slices are cropped on demand
+            instead of being materialized up front. Can not be combined with num_workers.
+        pipeline_queue_size: int
+            Maximum number of slice groups waiting between two pipeline stages. Default: 2.
+        window_cache: sahi.cache.WindowPredictionCache
+            If given, raw predictions of each window are read from and written to this cache, keyed by
+            image content, window coordinates and model. Only windows never predicted before (e.g. new
+            windows after an overlap change) are sent to detection_model.
+        journal: sahi.journal.SliceJournal
+            If given, raw predictions of each slice group are appended to this journal as soon as they are
+            predicted. Calling get_sliced_prediction again with the journal of an interrupted run replays the
+            recorded windows in their recorded order and only predicts the remaining ones, giving the same
+            result as an uninterrupted run (with merge_buffer_length None and stream_merge False, which merge
+            depending on how far the run got). The journal is kept, remove it once the result is stored.
+        coarse_to_fine: bool
+            If True, the full image is first predicted at the model input resolution (as the standard
+            prediction) and full resolution slices are only predicted where the coarse predictions,
+            dilated by coarse_margin, show evidence (see sahi.coarse.CoarseEvidenceMap). The coarse
+            predictions are used as the standard prediction if perform_standard_pred is True.
+        coarse_margin: int
+            Dilation of the coarse evidence in full resolution pixels. Default: 64.
+        coarse_confidence_threshold: float
+            Confidence threshold of the coarse pass, lower than the model one to favour recall.
+            Defaults to the detection_model confidence threshold.
+        stream_merge: bool
+            If True, predictions are merged row of slices by row of slices: once no later slice can
+            reach them, merged predictions are painted into binary_mask and dropped, so that memory
+            scales with a row of slices instead of the image. The object_prediction_list is empty.
+            Ignored for 'UNION' and 'HEATMAP_*' postprocess types, which never keep predictions.
+        progress_callback: sahi.utils.progress.ProgressCallback
+            Called with a sahi.utils.progress.ProgressEvent after each predicted slice group ("prediction"
+            stage, with slices per second, ETA and memory) and around the final merge ("merging" stage).
+            It is called from the calling thread and may raise to abort the prediction. See
+            sahi.utils.progress for tqdm and logging adapters.
+        heatmap_threshold: float
+            Fused score at which pixels are foreground for the 'HEATMAP_MEAN' and 'HEATMAP_MAX' postprocess
+            types. Defaults to the detection_model confidence threshold, so that a prediction seen by a single
+            window is kept.
 
     Returns:
         A Dict with fields:
             object_prediction_list: a list of sahi.prediction.ObjectPrediction
             durations_in_seconds: a dict containing elapsed times for profiling
+            slice_statistics: a dict containing the number of predicted, skipped and cached slices
     """
-    outputSignal = Signal(str)
-
     # for profiling
     durations_in_seconds = dict()
 
-    # currently only 1 batch supported
-    num_batch = 1
+    if batch_size < 1:
+        raise ValueError(f"batch_size should be a positive integer but given as {batch_size}")
+    if batch_size > 1 and not detection_model.supports_batch_inference:
+        logger.warning(f"{type(detection_model).__name__} does not support batch inference, using batch_size=1.")
+        batch_size = 1
+    num_batch = batch_size
+    if pipelined and num_workers > 0:
+        raise ValueError("pipelined and num_workers can not be used together")
 
     # create slices from full image
     time_start = time.time()
-    slice_image_result = slice_image(
-        image=image,
-        slice_height=slice_height,
-        slice_width=slice_width,
-        overlap_height_ratio=overlap_height_ratio,
-        overlap_width_ratio=overlap_width_ratio,
-        auto_slice_resolution=auto_slice_resolution,
-    )
-    num_slices = len(slice_image_result)
+    if num_workers > 0 or pipelined:
+        # slice windows are read from the image when needed, only their coordinates are computed here
+        if num_workers > 0:
+            # the workers share the decoded full image
+            image_reader = ArrayImageReader(np.ascontiguousarray(read_image_as_pil(image)))
+        else:
+            image_reader = open_image_reader(image)
+        slice_bboxes = get_slice_bboxes(
+            image_height=image_reader.height,
+            image_width=image_reader.width,
+            slice_height=slice_height,
+            slice_width=slice_width,
+            overlap_height_ratio=overlap_height_ratio,
+            overlap_width_ratio=overlap_width_ratio,
+            auto_slice_resolution=auto_slice_resolution,
+        )
+        num_slices = len(slice_bboxes)
+        full_shape = image_reader.shape
+    else:
+        slice_image_result = slice_image(
+            image=image,
+            slice_height=slice_height,
+            slice_width=slice_width,
+            overlap_height_ratio=overlap_height_ratio,
+            overlap_width_ratio=overlap_width_ratio,
+            auto_slice_resolution=auto_slice_resolution,
+        )
+        # slices are read from image_reader when they are predicted
+        sliced_image_list = slice_image_result.sliced_image_list
+        image_reader = slice_image_result.image_reader
+        num_slices = len(slice_image_result)
+        full_shape = [
+            slice_image_result.original_image_height,
+            slice_image_result.original_image_width,
+        ]
     time_end = time.time() - time_start
     durations_in_seconds["slice"] = time_end
+    add_span("slice", time_start, time_end, num_slices=num_slices)
+    # every slice window, before any is skipped
+    if num_workers > 0 or pipelined:
+        all_slice_bboxes = list(slice_bboxes)
+    else:
+        all_slice_bboxes = [sliced_image.window for sliced_image in sliced_image_list]
+
+    if window_cache is not None or journal is not None:
+        image_hash = get_image_hash(image)
+        model_key = WindowPredictionCache.make_model_key(detection_model)
+    if window_cache is not None:
+        standard_window_cache_key = window_cache.make_window_key(
+            image_hash, [0, 0, full_shape[1], full_shape[0]], model_key
+        )
+    else:
+        standard_window_cache_key = None
+    if journal is not None:
+        journal.open(SliceJournal.make_job_key(image_hash, model_key, detection_model.confidence_threshold))
+
+    # only keep slices where a coarse pass over the downscaled full image found evidence
+    coarse_object_prediction_list = None
+    num_coarse_skipped_slices = 0
+    if coarse_to_fine and num_slices > 1:
+        time_start_coarse = time.time()
+        confidence_threshold = detection_model.confidence_threshold
+        if coarse_confidence_threshold is not None:
+            detection_model.confidence_threshold = coarse_confidence_threshold
+        try:
+            coarse_object_prediction_list = _get_standard_prediction(
+                image, detection_model, window_cache, standard_window_cache_key
+            )
+        finally:
+            detection_model.confidence_threshold = confidence_threshold
+        evidence_map = CoarseEvidenceMap(coarse_object_prediction_list, full_shape, margin=coarse_margin)
+        if num_workers > 0 or pipelined:
+            slice_bboxes = [slice_bbox for slice_bbox in slice_bboxes if evidence_map.has_evidence(slice_bbox)]
+            num_coarse_skipped_slices = num_slices - len(slice_bboxes)
+        else:
+            sliced_image_list = [
+                sliced_image
+                for sliced_image in sliced_image_list
+                if evidence_map.has_evidence(sliced_image.window)
+            ]
+            num_coarse_skipped_slices = num_slices - len(sliced_image_list)
+        durations_in_seconds["coarse"] = time.time() - time_start_coarse
+        add_span("coarse", time_start_coarse, durations_in_seconds["coarse"], num_skipped=num_coarse_skipped_slices)
+
+    def get_standard_object_prediction_list() -> List[ObjectPrediction]:
+        if coarse_object_prediction_list is not None:
+            # the coarse pass is the standard prediction, possibly made with a lower confidence threshold
+            return [
+                object_prediction
+                for object_prediction in coarse_object_prediction_list
+                if object_prediction.score.value >= detection_model.confidence_threshold
+            ]
+        return _get_standard_prediction(image, detection_model, window_cache, standard_window_cache_key)
+
+    # skip slices without content worth predicting
+    num_predicted_slices = num_slices - num_coarse_skipped_slices
+    if slice_prefilter is not None:
+        time_start_prefilter = time.time()
+        if num_workers > 0 or pipelined:
+            slice_bboxes = [
+                slice_bbox
+                for slice_bbox in slice_bboxes
+                if slice_prefilter(image_reader.read_window(slice_bbox))
+            ]
+            num_predicted_slices = len(slice_bboxes)
+        else:
+            sliced_image_list = [
+                sliced_image for sliced_image in sliced_image_list if slice_prefilter(sliced_image.image)
+            ]
+            num_predicted_slices = len(sliced_image_list)
+        durations_in_seconds["prefilter"] = time.time() - time_start_prefilter
+        add_span("prefilter", time_start_prefilter, durations_in_seconds["prefilter"])
 
     # init match postprocess instance
-    if postprocess_type not in POSTPROCESS_NAME_TO_CLASS.keys():
+    if postprocess_type == "UNION":
+        # painted after every slice group, predictions are never kept
+        postprocess = UnionPostprocess(full_shape)
+        merge_buffer_length = 0
+    elif postprocess_type in HEATMAP_FUSION_TYPES:
+        # every predicted window is accumulated into the heatmap, predictions are never kept
+        taper_size = 64
+        if slice_height is not None and slice_width is not None:
+            # weights cross-fade over the overlap of neighbouring slices
+            taper_size = int(min(overlap_height_ratio * slice_height, overlap_width_ratio * slice_width))
+        if heatmap_threshold is None:
+            heatmap_threshold = detection_model.confidence_threshold
+        postprocess = HeatmapFusionPostprocess(
+            full_shape,
+            fusion=HEATMAP_FUSION_TYPES[postprocess_type],
+            threshold=heatmap_threshold,
+            taper_size=taper_size,
+        )
+        merge_buffer_length = 0
+        if postprocess.fusion == "mean":
+            # a full image window would dilute the average of the slices wherever it predicts nothing
+            perform_standard_pred = False
+    elif postprocess_type == "SEAM_STITCH":
+        # every predicted window is painted within its central region, predictions are never kept
+        seam_width = 16
+        if slice_height is not None and slice_width is not None:
+            # the seam band covers half of the overlap of neighbouring slices
+            overlap = int(min(overlap_height_ratio * slice_height, overlap_width_ratio * slice_width))
+            seam_width = max(1, overlap // 4)
+        postprocess = SeamStitchPostprocess(full_shape, all_slice_bboxes, seam_width=seam_width)
+        merge_buffer_length = 0
+    elif postprocess_type not in POSTPROCESS_NAME_TO_CLASS.keys():
+        postprocess_types = (
+            list(POSTPROCESS_NAME_TO_CLASS.keys()) + ["UNION", "SEAM_STITCH"] + list(HEATMAP_FUSION_TYPES.keys())
+        )
         raise ValueError(
-            f"postprocess_type should be one of {list(POSTPROCESS_NAME_TO_CLASS.keys())} but given as {postprocess_type}"
+            f"postprocess_type should be one of {postprocess_types} "
+            f"but given as {postprocess_type}"
         )
     elif postprocess_type == "UNIONMERGE":
         # deprecated in v0.9.3
         raise ValueError("'UNIONMERGE' postprocess_type is deprecated, use 'GREEDYNMM' instead.")
-    postprocess_constructor = POSTPROCESS_NAME_TO_CLASS[postprocess_type]
-    postprocess = postprocess_constructor(
-        match_threshold=postprocess_match_threshold,
-        match_metric=postprocess_match_metric,
-        class_agnostic=postprocess_class_agnostic,
-    )
+    else:
+        postprocess_constructor = POSTPROCESS_NAME_TO_CLASS[postprocess_type]
+        postprocess = postprocess_constructor(
+            match_threshold=postprocess_match_threshold,
+            match_metric=postprocess_match_metric,
+            class_agnostic=postprocess_class_agnostic,
+        )
+
+    # windows are fused with their unshifted predictions instead of collecting shifted predictions
+    fuse_windows = isinstance(postprocess, (HeatmapFusionPostprocess, SeamStitchPostprocess))
+    stream_merger = None
+    if stream_merge and not fuse_windows and not isinstance(postprocess, UnionPostprocess):
+        stream_merger = RowStreamingMerger(postprocess, full_shape)
+    # shifted predictions of cached windows by window, fed to stream_merger in slice order
+    cached_window_predictions = {}
+
+    # reuse predictions of windows already predicted on this image with this model
+    cached_object_prediction_list = []
+    window_cache_keys = []
+    num_cached_slices = 0
+    num_resumed_slices = 0
+    if window_cache is not None or journal is not None:
+        time_start_cache = time.time()
+        if num_workers > 0 or pipelined:
+            windows = slice_bboxes
+        else:
+            windows = [sliced_image.window for sliced_image in sliced_image_list]
+        # (window, compact predictions) in the order they are merged
+        known_windows = []
+        if journal is not None:
+            # replayed in the order of the interrupted run, windows of other slice parameters are ignored
+            window_set = {tuple(window) for window in windows}
+            known_windows = [
+                (window, compact_list) for window, compact_list in journal.items() if tuple(window) in window_set
+            ]
+            num_resumed_slices = len(known_windows)
+        missed = []
+        for index, window in enumerate(windows):
+            if journal is not None and window in journal:
+                continue
+            compact_list = None
+            if window_cache is not None:
+                key = window_cache.make_window_key(image_hash, window, model_key)
+                compact_list = window_cache.get_window(key, detection_model.confidence_threshold)
+            if compact_list is None:
+                missed.append(index)
+                if window_cache is not None:
+                    window_cache_keys.append(key)
+                continue
+            known_windows.append((window, compact_list))
+            num_cached_slices += 1
+            if journal is not None:
+                journal.put_window(window, compact_list)
+        if journal is not None:
+            journal.flush()
+        count("predictions_before_merge", sum(len(compact_list) for _, compact_list in known_windows))
+        for window, compact_list in known_windows:
+            window_object_prediction_list = object_prediction_list_from_compact(
+                compact_list, shift_amount=[window[0], window[1]], full_shape=full_shape
+            )
+            if fuse_windows:
+                postprocess.add_window(window, window_object_prediction_list)
+                continue
+            shifted_object_prediction_list = [
+                object_prediction.get_shifted_object_prediction() for object_prediction in window_object_prediction_list
+            ]
+            if stream_merger is not None:
+                cached_window_predictions[tuple(window)] = shifted_object_prediction_list
+            else:
+                cached_object_prediction_list.extend(shifted_object_prediction_list)
+        if num_workers > 0 or pipelined:
+            slice_bboxes = [slice_bboxes[index] for index in missed]
+        else:
+            sliced_image_list = [sliced_image_list[index] for index in missed]
+        num_predicted_slices -= num_cached_slices + num_resumed_slices
+        durations_in_seconds["window_cache"] = time.time() - time_start_cache
+        add_span(
+            "window_cache",
+            time_start_cache,
+            durations_in_seconds["window_cache"],
+            num_cached=num_cached_slices,
+            num_resumed=num_resumed_slices,
+        )
 
     # create prediction input
-    num_group = int(num_slices / num_batch)
     if verbose == 1 or verbose == 2:
-        tqdm.write(f"Performing prediction on {num_slices} number of slices.")
-    object_prediction_list = []
+        tqdm.write(f"Performing prediction on {num_predicted_slices} of {num_slices} number of slices.")
+    inference_pool = None
+    pipeline = None
+    if num_workers > 0:
+        inference_pool = SliceInferencePool(detection_model, num_workers=num_workers)
+        prediction_iter = inference_pool.predict(image_reader.array, slice_bboxes, batch_size=num_batch)
+    elif pipelined:
+        window_cache_key_by_bbox = {tuple(bbox): key for bbox, key in zip(slice_bboxes, window_cache_keys)}
+
+        def predict_fn(image_list, group_bboxes):
+            object_prediction_list_per_slice = _predict_slice_batch(
+                detection_model,
+                image_list=image_list,
+                shift_amount_list=[[slice_bbox[0], slice_bbox[1]] for slice_bbox in group_bboxes],
+                full_shape=full_shape,
+            )
+            count("predictions_before_merge", sum(map(len, object_prediction_list_per_slice)))
+            if window_cache is not None:
+                _put_window_predictions(
+                    window_cache,
+                    [window_cache_key_by_bbox[tuple(bbox)] for bbox in group_bboxes],
+                    object_prediction_list_per_slice,
+                    detection_model.confidence_threshold,
+                )
+            if journal is not None:
+                journal.put_windows(group_bboxes, object_prediction_list_per_slice)
+            if fuse_windows:
+                with profile("fuse_windows", num_slices=len(group_bboxes)):
+                    for slice_bbox, slice_object_prediction_list in zip(group_bboxes, object_prediction_list_per_slice):
+                        postprocess.add_window(slice_bbox, slice_object_prediction_list)
+                return [[] for _ in group_bboxes]
+            return object_prediction_list_per_slice
+
+        pipeline = SlicedPredictionPipeline(
+            image=image_reader,
+            slice_bboxes=slice_bboxes,
+            predict_fn=predict_fn,
+            # stream_merger merges the predictions drained after each group instead
+            postprocess=postprocess if stream_merger is None else None,
+            batch_size=num_batch,
+            merge_buffer_length=merge_buffer_length,
+            queue_size=pipeline_queue_size,
+        )
+        prediction_iter = pipeline.run()
+    else:
+        prediction_iter = _iter_sliced_predictions(
+            detection_model, sliced_image_list, full_shape, batch_size=num_batch
+        )
+    if (fuse_windows or journal is not None) and pipeline is None:
+        if inference_pool is not None:
+            predicted_windows = slice_bboxes
+        else:
+            predicted_windows = [sliced_image.window for sliced_image in sliced_image_list]
+    object_prediction_list = cached_object_prediction_list
+    num_processed = 0
+    if stream_merger is not None:
+        if cached_window_predictions:
+            # cached and predicted windows, in slice order
+            stream_windows = windows
+        elif inference_pool is not None or pipeline is not None:
+            stream_windows = slice_bboxes
+        else:
+            stream_windows = [sliced_image.window for sliced_image in sliced_image_list]
+        # smallest top of the windows from each position of the stream on
+        frontiers = [float("inf")]
+        for window in reversed(stream_windows):
+            frontiers.append(min(window[1], frontiers[-1]))
+        frontiers.reverse()
+        # position in the stream after the first num_processed predicted windows
+        predicted_ends = [0] + [
+            position + 1
+            for position, window in enumerate(stream_windows)
+            if tuple(window) not in cached_window_predictions
+        ]
+        stream_position = 0
+
+        def stream(slice_object_prediction_lists: List[List[ObjectPrediction]], num_processed: int):
+            # windows enter the stream one by one in slice order, cached windows when the predicted windows reach
+            # them, so that rows are merged and finalized the same way whatever the batch size and cache state
+            nonlocal stream_position
+            slice_object_prediction_lists = iter(slice_object_prediction_lists)
+            end = predicted_ends[num_processed]
+            while stream_position < len(stream_windows) and (
+                stream_position < end or tuple(stream_windows[stream_position]) in cached_window_predictions
+            ):
+                window = tuple(stream_windows[stream_position])
+                if window in cached_window_predictions:
+                    window_object_prediction_list = cached_window_predictions.pop(window)
+                else:
+                    window_object_prediction_list = next(slice_object_prediction_lists)
+                with profile("merge", num_predictions=len(window_object_prediction_list)):
+                    stream_merger.add(window_object_prediction_list, frontiers[stream_position + 1])
+                stream_position += 1
+
+        if num_slices > 1 and perform_standard_pred:
+            standard_object_prediction_list = get_standard_object_prediction_list()
+            count("predictions_before_merge", len(standard_object_prediction_list))
+            # added first, so that slice predictions can still be merged with it
+            stream_merger.add(standard_object_prediction_list, frontiers[0])
+        stream([], 0)
+    prediction_progress = ProgressTracker(progress_callback, "prediction", total=num_predicted_slices)
+    prediction_progress.update(num_processed)
     # perform sliced prediction
-    for i, group_ind in enumerate(range(num_group)):
-        helper.emit_update(f'step: {i}/{num_slices}')
-
-        # prepare batch (currently supports only 1 batch)
-        image_list = []
-        shift_amount_list = []
-        for image_ind in range(num_batch):
-            image_list.append(slice_image_result.images[group_ind * num_batch + image_ind])
-            shift_amount_list.append(slice_image_result.starting_pixels[group_ind * num_batch + image_ind])
-        # perform batch prediction
-        prediction_result = get_prediction(
-            image=image_list[0],
-            detection_model=detection_model,
-            shift_amount=shift_amount_list[0],
-            full_shape=[
-                slice_image_result.original_image_height,
-                slice_image_result.original_image_width,
-            ],
-        )
-        # convert sliced predictions to full predictions
-        for object_prediction in prediction_result.object_prediction_list:
-            if object_prediction:  # if not empty
-                object_prediction_list.append(object_prediction.get_shifted_object_prediction())
-
-        # merge matching predictions during sliced prediction
-        if merge_buffer_length is not None and len(object_prediction_list) > merge_buffer_length:
-            object_prediction_list = postprocess(object_prediction_list)
+    time_start_slices = time.time()
+    try:
+        if pipeline is not None:
+            # shifting and merging happen in the pipeline stages
+            for num_processed in prediction_iter:
+                if stream_merger is not None:
+                    stream(pipeline.pop_object_prediction_lists(), num_processed)
+                prediction_progress.update(num_processed)
+            object_prediction_list.extend(pipeline.object_prediction_list)
+            for stage, duration in pipeline.durations_in_seconds.items():
+                durations_in_seconds[f"pipeline_{stage}"] = duration
+        else:
+            for object_prediction_list_per_slice in prediction_iter:
+                count("predictions_before_merge", sum(map(len, object_prediction_list_per_slice)))
+                if window_cache is not None:
+                    _put_window_predictions(
+                        window_cache,
+                        window_cache_keys[num_processed : num_processed + len(object_prediction_list_per_slice)],
+                        object_prediction_list_per_slice,
+                        detection_model.confidence_threshold,
+                    )
+                if fuse_windows or journal is not None:
+                    group_windows = predicted_windows[
+                        num_processed : num_processed + len(object_prediction_list_per_slice)
+                    ]
+                if journal is not None:
+                    journal.put_windows(group_windows, object_prediction_list_per_slice)
+                if fuse_windows:
+                    with profile("fuse_windows", num_slices=len(group_windows)):
+                        for window, slice_object_prediction_list in zip(
+                            group_windows, object_prediction_list_per_slice
+                        ):
+                            postprocess.add_window(window, slice_object_prediction_list)
+                else:
+                    # convert sliced predictions to full predictions
+                    with profile("shift", num_slices=len(object_prediction_list_per_slice)):
+                        shifted_object_prediction_lists = [
+                            [
+                                object_prediction.get_shifted_object_prediction()
+                                for object_prediction in slice_object_prediction_list
+                                if object_prediction  # if not empty
+                            ]
+                            for slice_object_prediction_list in object_prediction_list_per_slice
+                        ]
+                    if stream_merger is None:
+                        for shifted_object_prediction_list in shifted_object_prediction_lists:
+                            object_prediction_list.extend(shifted_object_prediction_list)
+                num_processed += len(object_prediction_list_per_slice)
+                if stream_merger is not None:
+                    stream(shifted_object_prediction_lists, num_processed)
+                prediction_progress.update(num_processed)
+
+                # merge matching predictions during sliced prediction
+                if merge_buffer_length is not None and len(object_prediction_list) > merge_buffer_length:
+                    with profile("merge", num_predictions=len(object_prediction_list)):
+                        object_prediction_list = postprocess(object_prediction_list)
+    finally:
+        if inference_pool is not None or pipeline is not None:
+            prediction_iter.close()
+        if inference_pool is not None:
+            inference_pool.close()
+        image_reader.close()
+        if window_cache is not None:
+            window_cache.evict()
+        if journal is not None:
+            journal.close()
+
+    # skipped slices would have cost about as much as the average predicted one
+    num_skipped_slices = (
+        num_slices - num_predicted_slices - num_cached_slices - num_resumed_slices - num_coarse_skipped_slices
+    )
+    seconds_per_slice = (time.time() - time_start_slices) / num_predicted_slices if num_predicted_slices else 0.0
+    slice_statistics = {
+        "num_slices": num_slices,
+        "num_predicted_slices": num_predicted_slices,
+        "num_skipped_slices": num_skipped_slices,
+        "num_cached_slices": num_cached_slices,
+        "num_resumed_slices": num_resumed_slices,
+        "num_coarse_skipped_slices": num_coarse_skipped_slices,
+        "estimated_seconds_saved": num_skipped_slices * seconds_per_slice,
+    }
+
+    if stream_merger is not None:
+        with profile("merge", num_predictions=stream_merger.max_num_active):
+            stream_merger.flush()
+        slice_statistics["max_num_active_predictions"] = stream_merger.max_num_active
 
     # perform standard prediction
-    if num_slices > 1 and perform_standard_pred:
-        prediction_result = get_prediction(
-            image=image,
-            detection_model=detection_model,
-            shift_amount=[0, 0],
-            full_shape=None,
-            postprocess=None,
-        )
-        object_prediction_list.extend(prediction_result.object_prediction_list)
+    if num_slices > 1 and perform_standard_pred and stream_merger is None:
+        standard_object_prediction_list = get_standard_object_prediction_list()
+        count("predictions_before_merge", len(standard_object_prediction_list))
+        if fuse_windows:
+            # fused as one window covering the full image
+            postprocess(standard_object_prediction_list)
+        else:
+            object_prediction_list.extend(standard_object_prediction_list)
 
     # merge matching predictions
-    if len(object_prediction_list) > 1:
-        object_prediction_list = postprocess(object_prediction_list)
+    merging_progress = ProgressTracker(progress_callback, "merging", total=1)
+    merging_progress.update(0)
+    if len(object_prediction_list) > 1 or isinstance(postprocess, UnionPostprocess):
+        with profile("merge", num_predictions=len(object_prediction_list)):
+            object_prediction_list = postprocess(object_prediction_list)
+    merging_progress.update(1)
+    if stream_merger is not None:
+        # predictions merged by stream_merger are painted on its canvas
+        count("predictions_after_merge", stream_merger.num_finalized)
+    else:
+        count("predictions_after_merge", len(object_prediction_list))
 
     time_end = time.time() - time_start
     durations_in_seconds["prediction"] = time_end
@@ -290,9 +944,33 @@ def get_sliced_prediction(
             durations_in_seconds["prediction"],
             "seconds.",
         )
+        if slice_prefilter is not None:
+            print(
+                "Prefilter skipped",
+                num_skipped_slices,
+                "of",
+                num_slices,
+                "slices in",
+                durations_in_seconds["prefilter"],
+                "seconds, saving about",
+                slice_statistics["estimated_seconds_saved"],
+                "seconds.",
+            )
 
     return PredictionResult(
-        image=image, object_prediction_list=object_prediction_list, durations_in_seconds=durations_in_seconds
+        image=image,
+        object_prediction_list=object_prediction_list,
+        durations_in_seconds=durations_in_seconds,
+        slice_statistics=slice_statistics,
+        # the full image is never decoded as a whole
+        image_shape=full_shape,
+        binary_mask=(
+            stream_merger.canvas
+            if stream_merger is not None
+            else postprocess.canvas
+            if isinstance(postprocess, (UnionPostprocess, HeatmapFusionPostprocess, SeamStitchPostprocess))
+            else None
+        ),
     )
 
 
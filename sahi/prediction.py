@@ -7,7 +7,7 @@ from typing import Dict, List, Optional, Union
 import numpy as np
 from PIL import Image
 
-from sahi.annotation import ObjectAnnotation
+from sahi.annotation import Mask, ObjectAnnotation
 from sahi.utils.coco import CocoAnnotation, CocoPrediction
 from sahi.utils.cv import read_image_as_pil, visualize_object_predictions
 from sahi.utils.file import Path
@@ -49,6 +49,7 @@ class ObjectPrediction(ObjectAnnotation):
         score: Optional[float] = 0,
         shift_amount: Optional[List[int]] = [0, 0],
         full_shape: Optional[List[int]] = None,
+        mask: Optional[Mask] = None,
     ):
         """
         Creates ObjectPrediction from bbox, score, category_id, category_name, bool_mask.
@@ -70,6 +71,8 @@ class ObjectPrediction(ObjectAnnotation):
             full_shape: list
                 Size of the full image after shifting, should be in
                 the form of [height, width]
+            mask: sahi.annotation.Mask
+                Mask of the object, used as is instead of bool_mask
         """
         self.score = PredictionScore(score)
         super().__init__(
@@ -79,6 +82,7 @@ class ObjectPrediction(ObjectAnnotation):
             category_name=category_name,
             shift_amount=shift_amount,
             full_shape=full_shape,
+            mask=mask,
         )
 
     def get_shifted_object_prediction(self):
@@ -88,14 +92,16 @@ class ObjectPrediction(ObjectAnnotation):
         Used for mapping sliced predictions over full image.
         """
         if self.mask:
+            # only the mask offset changes, no full image sized array is created
+            shifted_mask = self.mask.get_shifted_mask()
             return ObjectPrediction(
                 bbox=self.bbox.get_shifted_box().to_xyxy(),
                 category_id=self.category.id,
                 score=self.score.value,
-                bool_mask=self.mask.get_shifted_mask().bool_mask,
+                mask=shifted_mask,
                 category_name=self.category.name,
                 shift_amount=[0, 0],
-                full_shape=self.mask.get_shifted_mask().full_shape,
+                full_shape=shifted_mask.full_shape,
             )
         else:
             return ObjectPrediction(
@@ -158,11 +164,37 @@ class PredictionResult:
         object_prediction_list: List[ObjectPrediction],
         image: Union[Image.Image, str, np.ndarray],
         durations_in_seconds: Optional[Dict] = None,
+        slice_statistics: Optional[Dict] = None,
+        binary_mask: Optional[np.ndarray] = None,
+        image_shape: Optional[List[int]] = None,
     ):
-        self.image: Image.Image = read_image_as_pil(image)
-        self.image_width, self.image_height = self.image.size
+        """
+        Args:
+            image: PIL.Image, str or np.ndarray
+                Predicted image, kept as given and only decoded when the image property is accessed.
+            image_shape: List[int]
+                Size of the image as [height, width], read from image if None (which decodes a path).
+        """
+        self._image = image
+        if image_shape is not None:
+            self.image_height, self.image_width = image_shape[:2]
+        elif isinstance(image, np.ndarray):
+            self.image_height, self.image_width = image.shape[:2]
+        else:
+            self.image_width, self.image_height = read_image_as_pil(image).size
         self.object_prediction_list: List[ObjectPrediction] = object_prediction_list
         self.durations_in_seconds = durations_in_seconds
+        self.slice_statistics = slice_statistics
+        # union of all masks as uint8 (0 or 255), set by postprocess_type="UNION", "HEATMAP_MEAN", "HEATMAP_MAX",
+        # "SEAM_STITCH" and by stream_merge=True
+        self.binary_mask = binary_mask
+
+    @property
+    def image(self) -> Image.Image:
+        """
+        Predicted image as RGB PIL.Image, decoded on each access so that results of large images do not hold it.
+        """
+        return read_image_as_pil(self._image)
 
     def export_visuals(
         self,
@@ -230,3 +262,81 @@ class PredictionResult:
                 object_prediction.to_fiftyone_detection(image_height=self.image_height, image_width=self.image_width)
             )
         return fiftyone_detection_list
+
+
+def object_prediction_list_to_compact(object_prediction_list: List[ObjectPrediction]) -> List[Dict]:
+    """
+    Converts a list of ObjectPrediction into a list of plain dicts that are cheap to pickle/transfer.
+    Masks are stored as the bit-packed region around their non-zero pixels.
+
+    Returns:
+        List of dicts with fields: bbox, score, category_id, category_name, mask
+    """
+    compact_list = []
+    for object_prediction in object_prediction_list:
+        compact_mask = None
+        mask = object_prediction.mask
+        if mask is not None:
+            crop = mask.crop
+            compact_mask = {
+                "offset": mask.offset,
+                "crop_shape": list(crop.shape),
+                "shape": mask.shape,
+                "bits": np.packbits(crop).tobytes(),
+            }
+        compact_list.append(
+            {
+                "bbox": [float(coord) for coord in object_prediction.bbox.to_xyxy()],
+                "score": float(object_prediction.score.value),
+                "category_id": int(object_prediction.category.id),
+                "category_name": object_prediction.category.name,
+                "mask": compact_mask,
+            }
+        )
+    return compact_list
+
+
+def object_prediction_list_from_compact(
+    compact_list: List[Dict],
+    shift_amount: Optional[List[int]] = [0, 0],
+    full_shape: Optional[List[int]] = None,
+) -> List[ObjectPrediction]:
+    """
+    Converts the output of object_prediction_list_to_compact back into a list of ObjectPrediction.
+
+    Arguments:
+        compact_list: list of dict
+            Output of object_prediction_list_to_compact
+        shift_amount: list
+            To shift the box and mask predictions from sliced image
+            to full sized image, should be in the form of [shift_x, shift_y]
+        full_shape: list
+            Size of the full image after shifting, should be in
+            the form of [height, width]
+    """
+    object_prediction_list = []
+    for compact in compact_list:
+        mask = None
+        compact_mask = compact["mask"]
+        if compact_mask is not None:
+            crop_height, crop_width = compact_mask["crop_shape"]
+            crop = np.unpackbits(np.frombuffer(compact_mask["bits"], dtype=np.uint8), count=crop_height * crop_width)
+            mask = Mask.from_crop(
+                crop.reshape(crop_height, crop_width),
+                offset=compact_mask["offset"],
+                shape=compact_mask["shape"],
+                full_shape=full_shape,
+                shift_amount=shift_amount,
+            )
+        object_prediction_list.append(
+            ObjectPrediction(
+                bbox=compact["bbox"],
+                category_id=compact["category_id"],
+                category_name=compact["category_name"],
+                score=compact["score"],
+                mask=mask,
+                shift_amount=shift_amount,
+                full_shape=full_shape,
+            )
+        )
+    return object_prediction_list
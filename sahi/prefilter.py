@@ -0,0 +1,102 @@
+# OBSS SAHI Tool
+# Cheap content prefilters used to skip slices that can not contain any object.
+
+from typing import List
+
+import numpy as np
+
+
+def _to_gray(image: np.ndarray) -> np.ndarray:
+    image = np.asarray(image)
+    if image.ndim == 3:
+        return image.mean(axis=2, dtype=np.float32)
+    return image.astype(np.float32)
+
+
+class SlicePrefilter:
+    """
+    Scores a slice with a cheap vectorized statistic and decides whether it is worth predicting.
+    Subclasses implement score(), slices scoring below threshold are skipped.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def score(self, image: np.ndarray) -> float:
+        raise NotImplementedError()
+
+    def __call__(self, image: np.ndarray) -> bool:
+        """
+        Returns True if the slice should be sent to the detection model.
+        """
+        return self.score(image) >= self.threshold
+
+    def __repr__(self):
+        parameters = ", ".join(f"{name}={value!r}" for name, value in vars(self).items())
+        return f"{type(self).__name__}({parameters})"
+
+
+class VarianceSlicePrefilter(SlicePrefilter):
+    """
+    Skips uniform slices (sky, plain concrete) whose grayscale standard deviation is below threshold.
+    """
+
+    def __init__(self, threshold: float = 2.0):
+        super().__init__(threshold=threshold)
+
+    def score(self, image: np.ndarray) -> float:
+        return float(_to_gray(image).std())
+
+
+class EdgeDensitySlicePrefilter(SlicePrefilter):
+    """
+    Skips slices where the fraction of pixels with a gradient above edge_threshold is below threshold.
+    """
+
+    def __init__(self, threshold: float = 0.001, edge_threshold: float = 20.0):
+        super().__init__(threshold=threshold)
+        self.edge_threshold = edge_threshold
+
+    def score(self, image: np.ndarray) -> float:
+        gray = _to_gray(image)
+        if gray.shape[0] < 2 or gray.shape[1] < 2:
+            return 0.0
+        gradient = np.maximum(np.abs(np.diff(gray, axis=0))[:, :-1], np.abs(np.diff(gray, axis=1))[:-1, :])
+        return float(np.count_nonzero(gradient > self.edge_threshold) / gradient.size)
+
+
+class NoDataSlicePrefilter(SlicePrefilter):
+    """
+    Skips slices made mostly of no-data pixels (e.g. black orthophoto borders). The score is the
+    fraction of valid pixels, a pixel is no-data when all its channels equal nodata_value.
+    """
+
+    def __init__(self, threshold: float = 0.02, nodata_value: int = 0):
+        super().__init__(threshold=threshold)
+        self.nodata_value = nodata_value
+
+    def score(self, image: np.ndarray) -> float:
+        image = np.asarray(image)
+        if image.size == 0:
+            return 0.0
+        nodata = image == self.nodata_value
+        if image.ndim == 3:
+            nodata = nodata.all(axis=2)
+        return float(1.0 - np.count_nonzero(nodata) / nodata.size)
+
+
+class ChainSlicePrefilter(SlicePrefilter):
+    """
+    Keeps a slice only if every prefilter of the chain keeps it. Prefilters are evaluated in order
+    and evaluation stops at the first one rejecting the slice, so cheapest ones should come first.
+    """
+
+    def __init__(self, prefilters: List[SlicePrefilter]):
+        super().__init__(threshold=None)
+        self.prefilters = prefilters
+
+    def score(self, image: np.ndarray) -> float:
+        return float(self(image))
+
+    def __call__(self, image: np.ndarray) -> bool:
+        return all(prefilter(image) for prefilter in self.prefilters)
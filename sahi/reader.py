@@ -0,0 +1,316 @@
+# OBSS SAHI Tool
+# Windowed image readers: decode only the slice windows that are requested.
+
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Sequence, Union
+
+import numpy as np
+from PIL import Image
+
+from sahi.utils.cv import read_image_as_pil
+
+logger = logging.getLogger(__name__)
+
+TIFF_EXTENSIONS = [".tif", ".tiff"]
+
+
+def _to_rgb_window(window: np.ndarray) -> np.ndarray:
+    """
+    Converts a decoded window to a HxWx3 uint8 array, like read_image_as_pil does for image files.
+    """
+    if window.ndim == 2:
+        window = np.repeat(window[:, :, None], 3, axis=2)
+    elif window.shape[2] == 1:
+        window = np.repeat(window, 3, axis=2)
+    elif window.shape[2] > 3:
+        # alpha and extra bands are dropped
+        window = window[:, :, :3]
+    if window.dtype == bool:
+        window = window.astype(np.uint8) * np.uint8(255)
+    elif window.dtype != np.uint8:
+        # 16-bit and float values out of the uint8 range saturate, as Pillow converts them to RGB
+        window = np.clip(window, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(window)
+
+
+class ImageReader:
+    """
+    Gives random access to windows of an image without holding the decoded image, so that images larger
+    than the available memory can be sliced. Subclasses set height and width and implement read_window().
+    Readers are safe to use from several threads.
+    """
+
+    height: int
+    width: int
+
+    @property
+    def shape(self) -> List[int]:
+        """
+        Size of the full image as [height, width].
+        """
+        return [self.height, self.width]
+
+    def read_window(self, window: Sequence[int]) -> np.ndarray:
+        """
+        Args:
+            window: List[int]
+                Window to read as [xmin, ymin, xmax, ymax], clipped to the image.
+        Returns:
+            The window as a HxWxC np.ndarray, RGB for image files.
+        """
+        raise NotImplementedError()
+
+    def read(self) -> np.ndarray:
+        """
+        Reads the full image.
+        """
+        return self.read_window([0, 0, self.width, self.height])
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _clip_window(self, window: Sequence[int]) -> List[int]:
+        xmin, ymin, xmax, ymax = (int(value) for value in window)
+        return [max(0, xmin), max(0, ymin), min(self.width, xmax), min(self.height, ymax)]
+
+    def __repr__(self):
+        return f"{type(self).__name__}(height={self.height}, width={self.width})"
+
+
+class ArrayImageReader(ImageReader):
+    """
+    Reads windows of an array. With a np.memmap (see from_npy and from_raw) only the pages of the requested
+    windows are loaded from disk.
+    """
+
+    def __init__(self, array: np.ndarray, convert_rgb: bool = False):
+        """
+        Args:
+            array: np.ndarray
+                Image as a HxW or HxWxC array.
+            convert_rgb: bool
+                If True, windows are converted to HxWx3 uint8 arrays.
+        """
+        if array.ndim not in (2, 3):
+            raise ValueError(f"array should have 2 or 3 dimensions but has shape {array.shape}")
+        self.array = array
+        self.convert_rgb = convert_rgb
+        self.height, self.width = array.shape[:2]
+
+    @classmethod
+    def from_npy(cls, path: str) -> "ArrayImageReader":
+        """
+        Memory maps a .npy file holding a HxW or HxWxC array.
+        """
+        return cls(np.load(path, mmap_mode="r"), convert_rgb=True)
+
+    @classmethod
+    def from_raw(
+        cls, path: str, shape: Sequence[int], dtype: Union[str, np.dtype] = np.uint8, offset: int = 0
+    ) -> "ArrayImageReader":
+        """
+        Memory maps a headerless file of pixels stored row by row.
+
+        Args:
+            path: str
+                Path of the raw file.
+            shape: List[int]
+                Shape of the image as [height, width] or [height, width, channels].
+            dtype: str or np.dtype
+                Data type of the pixels.
+            offset: int
+                Number of header bytes to skip.
+        """
+        return cls(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=tuple(shape)), convert_rgb=True)
+
+    def read_window(self, window: Sequence[int]) -> np.ndarray:
+        xmin, ymin, xmax, ymax = self._clip_window(window)
+        array_window = self.array[ymin:ymax, xmin:xmax]
+        if self.convert_rgb:
+            return _to_rgb_window(array_window)
+        return np.ascontiguousarray(array_window)
+
+    def close(self):
+        if isinstance(self.array, np.memmap) and self.array._mmap is not None:
+            self.array._mmap.close()
+
+
+class TiffImageReader(ImageReader):
+    """
+    Reads windows of the first page of a TIFF file with tifffile. Uncompressed pages are memory mapped,
+    compressed pages are decoded tile by tile (or strip by strip) and only the tiles intersecting a window
+    are read. Tiled TIFFs (e.g. cloud optimized GeoTIFF orthophotos) are the most efficient. Overlapping
+    slices share tiles, the most recently decoded tiles are kept up to max_cache_bytes.
+    """
+
+    def __init__(self, path: str, max_cache_bytes: int = 64 << 20):
+        """
+        Args:
+            path: str
+                Path of the TIFF file.
+            max_cache_bytes: int
+                Maximum size of the decoded tiles kept for the next windows. Default: 64 MiB, enough for a
+                row of 640 pixel slices of a 40000 pixel wide image with 512 pixel tiles.
+        """
+        try:
+            import tifffile
+        except ImportError:
+            raise ImportError("Please run 'pip install -U tifffile' for windowed TIFF reading.")
+
+        self.path = str(path)
+        self._tiff = tifffile.TiffFile(self.path)
+        self._lock = threading.Lock()
+        self._array = None
+        self.max_cache_bytes = max_cache_bytes
+        # decoded segments by index, in least recently used order
+        self._segment_cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._segment_cache_bytes = 0
+        page = self._tiff.pages[0]
+        self._page = page
+        self.height, self.width = page.imagelength, page.imagewidth
+        # palette images are expanded through their colormap, as Pillow does
+        self._palette = None
+        if page.photometric == tifffile.PHOTOMETRIC.PALETTE and page.colormap is not None:
+            self._palette = (np.asarray(page.colormap).T // 256).astype(np.uint8)
+        if page.is_memmappable:
+            self._array = self._tiff.asarray(key=0, out="memmap")
+        elif page.planarconfig != 1 or page.imagedepth > 1:
+            # only contiguous 2D segments are decoded window by window
+            logger.warning(f"{self.path} has planar or volumetric segments, it is decoded at once.")
+            self._array = page.asarray()
+            if page.planarconfig != 1 and page.samplesperpixel > 1:
+                # samples first
+                self._array = np.moveaxis(self._array, 0, -1)
+        else:
+            # (rows, columns) of a segment and number of segments in each row
+            self._segment_shape = page.chunks[:2]
+            self._num_segment_columns = page.chunked[1]
+
+    def read_window(self, window: Sequence[int]) -> np.ndarray:
+        xmin, ymin, xmax, ymax = self._clip_window(window)
+        if self._array is not None:
+            return self._to_rgb_window(self._array[ymin:ymax, xmin:xmax])
+
+        page = self._page
+        segment_height, segment_width = self._segment_shape
+        samples = page.samplesperpixel
+        output = np.zeros((ymax - ymin, xmax - xmin, samples), dtype=page.dtype)
+        for segment_row in range(ymin // segment_height, (ymax - 1) // segment_height + 1):
+            for segment_column in range(xmin // segment_width, (xmax - 1) // segment_width + 1):
+                segment = self._get_segment(segment_row * self._num_segment_columns + segment_column)
+                top = segment_row * segment_height
+                left = segment_column * segment_width
+                y0, y1 = max(ymin, top), min(ymax, top + segment.shape[0])
+                x0, x1 = max(xmin, left), min(xmax, left + segment.shape[1])
+                output[y0 - ymin : y1 - ymin, x0 - xmin : x1 - xmin] = segment[y0 - top : y1 - top, x0 - left : x1 - left]
+        return self._to_rgb_window(output)
+
+    def _to_rgb_window(self, window: np.ndarray) -> np.ndarray:
+        if self._palette is not None:
+            indices = window[:, :, 0] if window.ndim == 3 else window
+            return np.take(self._palette, indices, axis=0, mode="clip")
+        return _to_rgb_window(window)
+
+    def _get_segment(self, index: int) -> np.ndarray:
+        with self._lock:
+            segment = self._segment_cache.get(index)
+            if segment is not None:
+                self._segment_cache.move_to_end(index)
+                return segment
+            filehandle = self._tiff.filehandle
+            filehandle.seek(self._page.dataoffsets[index])
+            data = filehandle.read(self._page.databytecounts[index])
+        segment, _, _ = self._page.decode(data, index, jpegtables=self._page.jpegtables)
+        # (depth, rows, columns, samples), tiles on the image border are padded
+        segment = segment.reshape(segment.shape[-3:])
+        with self._lock:
+            if index not in self._segment_cache:
+                self._segment_cache[index] = segment
+                self._segment_cache_bytes += segment.nbytes
+            while self._segment_cache_bytes > self.max_cache_bytes:
+                _, evicted_segment = self._segment_cache.popitem(last=False)
+                self._segment_cache_bytes -= evicted_segment.nbytes
+        return segment
+
+    def close(self):
+        self._array = None
+        self._segment_cache.clear()
+        self._segment_cache_bytes = 0
+        self._tiff.close()
+
+
+class PillowImageReader(ImageReader):
+    """
+    Reads windows with Image.crop. The size is known from the header, but for most formats Pillow decodes
+    the full image on the first crop and keeps it, in its original mode, until the reader is closed. This
+    still avoids the RGB and numpy copies of the full image, use TiffImageReader or ArrayImageReader for
+    images that do not fit in memory.
+    """
+
+    def __init__(self, image: Union[str, Image.Image]):
+        """
+        Args:
+            image: str or PIL.Image
+                Path of the image file, or an opened image which is not closed by the reader and whose
+                windows are returned in its own mode.
+        """
+        # https://stackoverflow.com/questions/56174099/how-to-load-images-larger-than-max-image-pixels-with-pil
+        Image.MAX_IMAGE_PIXELS = None
+        self._owns_image = not isinstance(image, Image.Image)
+        self.image = Image.open(image) if self._owns_image else image
+        self.width, self.height = self.image.size
+        self._lock = threading.Lock()
+
+    def read_window(self, window: Sequence[int]) -> np.ndarray:
+        xmin, ymin, xmax, ymax = self._clip_window(window)
+        with self._lock:
+            image_window = self.image.crop((xmin, ymin, xmax, ymax))
+        if self._owns_image:
+            if image_window.mode != "RGB":
+                image_window = image_window.convert("RGB")
+        return np.asarray(image_window)
+
+    def close(self):
+        if self._owns_image:
+            self.image.close()
+
+
+def open_image_reader(image: Union[str, Path, Image.Image, np.ndarray, ImageReader]) -> ImageReader:
+    """
+    Returns a reader of an image given as a file path, a PIL image, a numpy array or a reader (returned as is).
+    TIFF files are read with TiffImageReader, .npy files are memory mapped and other files are read with
+    PillowImageReader, falling back to decoding the full image with read_image_as_pil (e.g. for urls).
+    """
+    if isinstance(image, ImageReader):
+        return image
+    if isinstance(image, np.ndarray):
+        return ArrayImageReader(image)
+    if isinstance(image, Image.Image):
+        return PillowImageReader(image)
+
+    image = str(image)
+    suffix = Path(image).suffix.lower()
+    if suffix == ".npy":
+        return ArrayImageReader.from_npy(image)
+    if suffix in TIFF_EXTENSIONS:
+        try:
+            return TiffImageReader(image)
+        except (ImportError, ValueError) as e:
+            # tifffile is missing or can not read the file
+            logger.warning(f"{e} Reading {image} with Pillow.")
+    if not image.startswith("http"):
+        try:
+            return PillowImageReader(image)
+        except (OSError, ValueError):
+            # formats Pillow can not open, see read_image_as_pil
+            pass
+    return ArrayImageReader(np.asarray(read_image_as_pil(image)))
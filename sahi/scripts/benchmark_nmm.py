@@ -0,0 +1,118 @@
+import time
+from typing import List, Union
+
+import fire
+import numpy as np
+import torch
+from terminaltables import AsciiTable
+
+from sahi.postprocess.combine import greedy_nmm, nmm
+
+NMM_FUNCTIONS = {"GREEDYNMM": greedy_nmm, "NMM": nmm}
+
+
+def _make_predictions(num_predictions: int, image_size: int, seed: int) -> torch.tensor:
+    """
+    Synthetic predictions of a dense image: each object is predicted by 1 to 4 overlapping slices,
+    giving clusters of slightly jittered boxes.
+    """
+    rng = np.random.default_rng(seed)
+    num_objects = max(1, num_predictions // 2)
+    centers = rng.uniform(0, image_size, (num_objects, 2))
+    sizes = rng.lognormal(np.log(40), 0.6, (num_objects, 2))
+    object_inds = rng.integers(0, num_objects, num_predictions)
+    jitter = rng.normal(0, 3, (num_predictions, 4))
+    boxes = np.concatenate(
+        [centers[object_inds] - sizes[object_inds] / 2, centers[object_inds] + sizes[object_inds] / 2], axis=1
+    )
+    boxes = boxes + jitter
+    boxes[:, 2:] = np.maximum(boxes[:, 2:], boxes[:, :2] + 1)
+    # distinct scores, the order of predictions with equal scores is left to the sort implementation
+    scores = 0.2 + 0.8 * rng.permutation(num_predictions) / num_predictions
+    category_ids = np.zeros(num_predictions)
+    return torch.from_numpy(np.column_stack([boxes, scores, category_ids]).astype(np.float32))
+
+
+def _time(function, *args, **kwargs):
+    time_start = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - time_start
+
+
+def benchmark_nmm(
+    num_predictions: Union[int, List[int]] = (1000, 10000, 50000),
+    postprocess_type: Union[str, List[str]] = ("GREEDYNMM", "NMM"),
+    match_metric: str = "IOS",
+    match_threshold: float = 0.5,
+    max_exhaustive_predictions: int = 10000,
+    image_size: int = 20000,
+    seed: int = 0,
+):
+    """
+    Times greedy_nmm and nmm with and without the spatial index on synthetic predictions, and checks
+    that both give the same keep_to_merge_list.
+
+    Args:
+        num_predictions (int or list): numbers of predictions to benchmark
+        postprocess_type (str or list): "GREEDYNMM" and/or "NMM"
+        match_metric (str): "IOU" or "IOS"
+        match_threshold (float): match threshold
+        max_exhaustive_predictions (int): the exhaustive search is quadratic, it is only run up to this
+            number of predictions
+        image_size (int): side of the synthetic image the predictions are spread over
+        seed (int): random seed of the synthetic predictions
+    Returns:
+        A list of dicts with the postprocess type, number of predictions, number of kept predictions,
+        durations with and without the spatial index, speedup and whether results are identical.
+    """
+    num_predictions_list = [num_predictions] if isinstance(num_predictions, int) else list(num_predictions)
+    postprocess_type_list = [postprocess_type] if isinstance(postprocess_type, str) else list(postprocess_type)
+    for postprocess_type in postprocess_type_list:
+        if postprocess_type not in NMM_FUNCTIONS:
+            raise ValueError(f"postprocess_type should be one of {list(NMM_FUNCTIONS)} but given as {postprocess_type}")
+
+    results = []
+    for num_predictions in num_predictions_list:
+        predictions = _make_predictions(num_predictions, image_size, seed)
+        for postprocess_type in postprocess_type_list:
+            function = NMM_FUNCTIONS[postprocess_type]
+            keep_to_merge_list, duration = _time(function, predictions, match_metric, match_threshold)
+            exhaustive_duration = None
+            identical = None
+            if num_predictions <= max_exhaustive_predictions:
+                exhaustive_keep_to_merge_list, exhaustive_duration = _time(
+                    function, predictions, match_metric, match_threshold, spatial_index=False
+                )
+                # same keys in the same order, with the same merge lists
+                identical = list(keep_to_merge_list.items()) == list(exhaustive_keep_to_merge_list.items())
+            results.append(
+                {
+                    "postprocess_type": postprocess_type,
+                    "num_predictions": num_predictions,
+                    "num_kept": len(keep_to_merge_list),
+                    "duration": duration,
+                    "exhaustive_duration": exhaustive_duration,
+                    "speedup": exhaustive_duration / duration if exhaustive_duration and duration > 0 else None,
+                    "identical": identical,
+                }
+            )
+
+    table_data = [["postprocess", "predictions", "kept", "grid index (s)", "exhaustive (s)", "speedup", "identical"]]
+    for result in results:
+        table_data.append(
+            [
+                result["postprocess_type"],
+                result["num_predictions"],
+                result["num_kept"],
+                f"{result['duration']:.2f}",
+                "-" if result["exhaustive_duration"] is None else f"{result['exhaustive_duration']:.2f}",
+                "-" if result["speedup"] is None else f"{result['speedup']:.1f}x",
+                "-" if result["identical"] is None else str(result["identical"]),
+            ]
+        )
+    print(AsciiTable(table_data).table)
+    return results
+
+
+if __name__ == "__main__":
+    fire.Fire(benchmark_nmm)
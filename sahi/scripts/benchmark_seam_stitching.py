@@ -0,0 +1,122 @@
+import time
+from typing import List, Union
+
+import cv2
+import fire
+import numpy as np
+from terminaltables import AsciiTable
+
+from sahi.auto_model import AutoDetectionModel
+from sahi.predict import get_sliced_prediction
+
+
+def _predict_binary_mask(
+    detection_model, image_path: str, slice_size: int, overlap_ratio: float, postprocess_type: str
+):
+    time_start = time.time()
+    prediction_result = get_sliced_prediction(
+        image_path,
+        detection_model,
+        slice_height=slice_size,
+        slice_width=slice_size,
+        overlap_height_ratio=overlap_ratio,
+        overlap_width_ratio=overlap_ratio,
+        perform_standard_pred=False,
+        postprocess_type=postprocess_type,
+    )
+    duration = time.time() - time_start
+    return prediction_result.binary_mask > 0, prediction_result.slice_statistics["num_slices"], duration
+
+
+def _mask_iou(mask: np.ndarray, reference_mask: np.ndarray) -> float:
+    union = np.count_nonzero(mask | reference_mask)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(mask & reference_mask) / union
+
+
+def _count_components(mask: np.ndarray) -> int:
+    # cracks broken at slice seams show up as extra components
+    num_labels, _ = cv2.connectedComponents(mask.astype(np.uint8), connectivity=8)
+    return num_labels - 1
+
+
+def benchmark_seam_stitching(
+    model_path: str,
+    image_path: Union[str, List[str]],
+    overlap_ratio: Union[float, List[float]] = (0.1, 0.2, 0.4),
+    reference_overlap_ratio: float = 0.4,
+    slice_size: int = 640,
+    model_type: str = "yolov8",
+    confidence_threshold: float = 0.2,
+    device: str = "cpu",
+):
+    """
+    Compares seam stitching ("SEAM_STITCH") against painting every slice mask ("UNION") at several slice
+    overlaps. Masks are compared to the union mask at reference_overlap_ratio.
+
+    Args:
+        model_path (str): path for the segmentation model
+        image_path (str or list): paths of the reference images
+        overlap_ratio (float or list): slice overlap ratios to benchmark
+        reference_overlap_ratio (float): overlap ratio of the reference union mask
+        slice_size (int): slice height and width
+        model_type (str): model type, see sahi.auto_model.AutoDetectionModel
+        confidence_threshold (float): all predictions with score < confidence_threshold are discarded
+        device (str): "cpu" or "cuda:0"
+    Returns:
+        A list of dicts with the image, postprocess type, overlap ratio, number of slices, mask IoU against
+        the reference, number of connected components and duration of each run.
+    """
+    image_path_list = [image_path] if isinstance(image_path, str) else list(image_path)
+    overlap_ratio_list = [overlap_ratio] if isinstance(overlap_ratio, (int, float)) else list(overlap_ratio)
+    detection_model = AutoDetectionModel.from_pretrained(
+        model_type=model_type,
+        model_path=model_path,
+        confidence_threshold=confidence_threshold,
+        device=device,
+    )
+
+    results = []
+    for image_path in image_path_list:
+        # the first run also pays for lazy initialization
+        reference_mask, _, _ = _predict_binary_mask(
+            detection_model, image_path, slice_size, reference_overlap_ratio, "UNION"
+        )
+        for overlap_ratio in overlap_ratio_list:
+            for postprocess_type in ("UNION", "SEAM_STITCH"):
+                binary_mask, num_slices, duration = _predict_binary_mask(
+                    detection_model, image_path, slice_size, overlap_ratio, postprocess_type
+                )
+                results.append(
+                    {
+                        "image_path": image_path,
+                        "postprocess_type": postprocess_type,
+                        "overlap_ratio": overlap_ratio,
+                        "num_slices": num_slices,
+                        "mask_iou": _mask_iou(binary_mask, reference_mask),
+                        "num_components": _count_components(binary_mask),
+                        "reference_num_components": _count_components(reference_mask),
+                        "duration": duration,
+                    }
+                )
+
+    table_data = [["image", "postprocess", "overlap", "slices", "mask IoU vs reference", "components", "time (s)"]]
+    for result in results:
+        table_data.append(
+            [
+                result["image_path"],
+                result["postprocess_type"],
+                result["overlap_ratio"],
+                result["num_slices"],
+                f"{result['mask_iou']:.4f}",
+                f"{result['num_components']} ({result['reference_num_components']})",
+                f"{result['duration']:.2f}",
+            ]
+        )
+    print(AsciiTable(table_data).table)
+    return results
+
+
+if __name__ == "__main__":
+    fire.Fire(benchmark_seam_stitching)
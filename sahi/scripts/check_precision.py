@@ -0,0 +1,125 @@
+import time
+from typing import List, Union
+
+import fire
+import numpy as np
+from terminaltables import AsciiTable
+
+from sahi.auto_model import AutoDetectionModel
+from sahi.models.yolov8 import YOLOV8_PRECISIONS
+from sahi.predict import get_sliced_prediction
+
+
+def _predict_union_mask(detection_model, image_path: str, slice_size: int, overlap_ratio: float):
+    time_start = time.time()
+    prediction_result = get_sliced_prediction(
+        image_path,
+        detection_model,
+        slice_height=slice_size,
+        slice_width=slice_size,
+        overlap_height_ratio=overlap_ratio,
+        overlap_width_ratio=overlap_ratio,
+        perform_standard_pred=False,
+    )
+    duration = time.time() - time_start
+
+    union_mask = np.zeros((prediction_result.image_height, prediction_result.image_width), dtype=bool)
+    for object_prediction in prediction_result.object_prediction_list:
+        mask = object_prediction.mask
+        if mask is not None:
+            crop = mask.crop
+            x, y = mask.offset
+            union_mask[y : y + crop.shape[0], x : x + crop.shape[1]] |= crop
+    return union_mask, len(prediction_result.object_prediction_list), duration
+
+
+def _mask_iou(mask: np.ndarray, reference_mask: np.ndarray) -> float:
+    union = np.count_nonzero(mask | reference_mask)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(mask & reference_mask) / union
+
+
+def check_precision(
+    model_path: str,
+    image_path: str,
+    precision: Union[str, List[str]] = ("bf16", "int8"),
+    slice_size: int = 640,
+    overlap_ratio: float = 0.4,
+    confidence_threshold: float = 0.2,
+    device: str = "cpu",
+):
+    """
+    Compares reduced precision yolov8 inference against fp32 on a reference image.
+
+    Args:
+        model_path (str): path for the yolov8 model
+        image_path (str): path for the reference image
+        precision (str or list): precisions to compare against fp32, among "bf16" and "int8"
+        slice_size (int): slice height and width
+        overlap_ratio (float): slice overlap ratio
+        confidence_threshold (float): all predictions with score < confidence_threshold are discarded
+        device (str): "cpu" or "cuda:0"
+    Returns:
+        A list of dicts with the precision, mask IoU against fp32, IoU drop, number of predictions,
+        duration and speedup of each run.
+    """
+    precision_list = [precision] if isinstance(precision, str) else list(precision)
+    for precision in precision_list:
+        if precision not in YOLOV8_PRECISIONS:
+            raise ValueError(f"precision should be one of {YOLOV8_PRECISIONS} but given as {precision}")
+    precision_list = ["fp32"] + [precision for precision in precision_list if precision != "fp32"]
+
+    results = []
+    reference_mask = None
+    reference_duration = None
+    for precision in precision_list:
+        detection_model = AutoDetectionModel.from_pretrained(
+            model_type="yolov8",
+            model_path=model_path,
+            confidence_threshold=confidence_threshold,
+            device=device,
+            precision=precision,
+        )
+        # the first run also pays for lazy initialization, it is not timed
+        _predict_union_mask(detection_model, image_path, slice_size, overlap_ratio)
+        union_mask, num_predictions, duration = _predict_union_mask(
+            detection_model, image_path, slice_size, overlap_ratio
+        )
+        if reference_mask is None:
+            reference_mask, reference_duration = union_mask, duration
+        iou = _mask_iou(union_mask, reference_mask)
+        results.append(
+            {
+                # bf16 may have fallen back to fp32 on this CPU
+                "precision": detection_model.precision if precision != "fp32" else "fp32",
+                "requested_precision": precision,
+                "mask_iou": iou,
+                "iou_drop": 1.0 - iou,
+                "num_predictions": num_predictions,
+                "duration": duration,
+                "speedup": reference_duration / duration if duration > 0 else float("inf"),
+            }
+        )
+
+    table_data = [["precision", "mask IoU vs fp32", "IoU drop", "predictions", "time (s)", "speedup"]]
+    for result in results:
+        precision_name = result["requested_precision"]
+        if result["precision"] != precision_name:
+            precision_name += f" (ran as {result['precision']})"
+        table_data.append(
+            [
+                precision_name,
+                f"{result['mask_iou']:.4f}",
+                f"{result['iou_drop']:.4f}",
+                result["num_predictions"],
+                f"{result['duration']:.2f}",
+                f"{result['speedup']:.2f}x",
+            ]
+        )
+    print(AsciiTable(table_data).table)
+    return results
+
+
+if __name__ == "__main__":
+    fire.Fire(check_precision)
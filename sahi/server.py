@@ -0,0 +1,357 @@
+# OBSS SAHI Tool
+# Local inference server sharing one detection model between processes, with dynamic batching.
+
+import base64
+import collections
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from sahi.cache import WindowPredictionCache
+from sahi.models.base import DetectionModel
+from sahi.prediction import object_prediction_list_to_compact
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def encode_predict_request(images: List[np.ndarray], confidence_threshold: float, mask_threshold: float) -> bytes:
+    """
+    Encodes slices and thresholds as an uncompressed .npz body, which the server reads without pickle.
+    """
+    arrays = {f"image_{ind}": np.ascontiguousarray(image) for ind, image in enumerate(images)}
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        num_images=np.asarray(len(images)),
+        thresholds=np.asarray([confidence_threshold, mask_threshold], dtype=np.float64),
+        **arrays,
+    )
+    return buffer.getvalue()
+
+
+def decode_predict_request(body: bytes) -> Dict:
+    with np.load(io.BytesIO(body), allow_pickle=False) as arrays:
+        return {
+            "images": [arrays[f"image_{ind}"] for ind in range(int(arrays["num_images"]))],
+            "confidence_threshold": float(arrays["thresholds"][0]),
+            "mask_threshold": float(arrays["thresholds"][1]),
+        }
+
+
+def encode_compact_lists(compact_lists: List[List[Dict]]) -> List[List[Dict]]:
+    """
+    Makes compact predictions (see sahi.prediction.object_prediction_list_to_compact) json serializable.
+    """
+    encoded_lists = []
+    for compact_list in compact_lists:
+        encoded_list = []
+        for compact in compact_list:
+            compact = dict(compact)
+            if compact["mask"] is not None:
+                compact["mask"] = dict(compact["mask"], bits=base64.b64encode(compact["mask"]["bits"]).decode("ascii"))
+            encoded_list.append(compact)
+        encoded_lists.append(encoded_list)
+    return encoded_lists
+
+
+def decode_compact_lists(encoded_lists: List[List[Dict]]) -> List[List[Dict]]:
+    compact_lists = []
+    for encoded_list in encoded_lists:
+        compact_list = []
+        for compact in encoded_list:
+            if compact["mask"] is not None:
+                compact["mask"]["bits"] = base64.b64decode(compact["mask"]["bits"])
+            compact_list.append(compact)
+        compact_lists.append(compact_list)
+    return compact_lists
+
+
+class _PredictRequest:
+    def __init__(self, request: Dict):
+        self.images = request["images"]
+        # requests are only batched with requests of the same thresholds
+        self.thresholds = (request["confidence_threshold"], request["mask_threshold"])
+        self.future = Future()
+
+
+class DynamicBatcher:
+    """
+    Owns a detection model and predicts the slices of concurrent requests together: the first waiting
+    request opens a batch, requests arriving within max_wait seconds join it until max_batch_size slices
+    are collected, then the whole batch is predicted in a single model call. A single thread runs the
+    model, so that a model that is not thread safe can serve many clients.
+    """
+
+    def __init__(self, detection_model: DetectionModel, max_batch_size: int = 8, max_wait: float = 0.01):
+        """
+        Args:
+            detection_model: model.DetectionModel
+                Model to serve. Batches are predicted with perform_batch_inference if the model supports it.
+            max_batch_size: int
+                Maximum number of slices predicted in a single model call.
+            max_wait: float
+                Maximum time in seconds a request waits for other requests to join its batch.
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size should be a positive integer but given as {max_batch_size}")
+        self.detection_model = detection_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.statistics = {"num_requests": 0, "num_slices": 0, "num_batches": 0, "inference_seconds": 0.0}
+        self._queue: "queue.Queue[Optional[_PredictRequest]]" = queue.Queue()
+        # requests taken from the queue that could not join the current batch
+        self._deferred: "collections.deque[_PredictRequest]" = collections.deque()
+        self._thread = threading.Thread(target=self._run, name="sahi-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: Dict) -> Future:
+        """
+        Queues a decoded request (see decode_predict_request), the future resolves to the compact
+        predictions of each slice.
+        """
+        predict_request = _PredictRequest(request)
+        self._queue.put(predict_request)
+        return predict_request.future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_request(self, timeout: Optional[float] = None) -> Optional[_PredictRequest]:
+        if self._deferred:
+            return self._deferred.popleft()
+        return self._queue.get(timeout=timeout)
+
+    def _run(self):
+        while True:
+            first_request = self._next_request()
+            if first_request is None:
+                break
+            batch = [first_request]
+            num_slices = len(first_request.images)
+            deferred = []
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while num_slices < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._next_request(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                if request.thresholds != first_request.thresholds:
+                    deferred.append(request)
+                    continue
+                batch.append(request)
+                num_slices += len(request.images)
+            self._deferred.extendleft(reversed(deferred))
+            self._predict(batch)
+            if stop:
+                break
+        # fail the requests left when closing
+        while self._deferred or not self._queue.empty():
+            request = self._next_request()
+            if request is not None:
+                request.future.set_exception(RuntimeError("inference server closed"))
+
+    def _predict(self, batch: List[_PredictRequest]):
+        detection_model = self.detection_model
+        detection_model.confidence_threshold, detection_model.mask_threshold = batch[0].thresholds
+        images = [image for request in batch for image in request.images]
+        time_start = time.time()
+        try:
+            compact_lists = []
+            # requests larger than max_batch_size are predicted in several model calls
+            for ind in range(0, len(images), self.max_batch_size):
+                chunk = images[ind : ind + self.max_batch_size]
+                # predictions are converted in slice coordinates, the client shifts them
+                if len(chunk) > 1 and detection_model.supports_batch_inference:
+                    detection_model.perform_batch_inference(chunk)
+                    detection_model.convert_original_predictions(
+                        shift_amount=[[0, 0]] * len(chunk), full_shape=[list(image.shape[:2]) for image in chunk]
+                    )
+                    object_prediction_list_per_image = detection_model.object_prediction_list_per_image
+                else:
+                    object_prediction_list_per_image = []
+                    for image in chunk:
+                        detection_model.perform_inference(image)
+                        detection_model.convert_original_predictions(
+                            shift_amount=[[0, 0]], full_shape=[list(image.shape[:2])]
+                        )
+                        object_prediction_list_per_image.extend(detection_model.object_prediction_list_per_image)
+                self.statistics["num_batches"] += 1
+                compact_lists.extend(
+                    object_prediction_list_to_compact(object_prediction_list)
+                    for object_prediction_list in object_prediction_list_per_image
+                )
+        except Exception as e:
+            logger.exception("batch inference failed")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        self.statistics["num_requests"] += len(batch)
+        self.statistics["num_slices"] += len(images)
+        self.statistics["inference_seconds"] += time.time() - time_start
+        start = 0
+        for request in batch:
+            request.future.set_result(compact_lists[start : start + len(request.images)])
+            start += len(request.images)
+
+
+class _InferenceRequestHandler(BaseHTTPRequestHandler):
+    server: "InferenceServer"
+
+    def do_GET(self):
+        if self.path != "/info":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        self._send_json(200, self.server.info())
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            request = decode_predict_request(self.rfile.read(int(self.headers["Content-Length"])))
+        except Exception as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+            return
+        try:
+            compact_lists = self.server.batcher.submit(request).result()
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"predictions": encode_compact_lists(compact_lists)})
+
+    def _send_json(self, status: int, content: Dict):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """
+    HTTP server owning one detection model for all the sliced predictions of a host: clients use
+    sahi.models.remote.RemoteDetectionModel instead of loading their own copy of the model, and their
+    slice batches are predicted together by a DynamicBatcher.
+
+    Endpoints:
+        GET /info: model information and batching statistics as json
+        POST /predict: slices as an .npz body (see encode_predict_request), returns the compact predictions
+            of each slice as json (see encode_compact_lists)
+
+    Requests are neither authenticated nor encrypted, bind to a local address only.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        detection_model: DetectionModel,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+    ):
+        """
+        Args:
+            detection_model: model.DetectionModel
+                Model to serve.
+            host: str
+                Address to bind to. Default: "127.0.0.1".
+            port: int
+                Port to listen on, 0 picks a free port (see server_address). Default: 8765.
+            max_batch_size: int
+                Maximum number of slices predicted in a single model call.
+            max_wait: float
+                Maximum time in seconds a request waits for other requests to join its batch.
+        """
+        self.detection_model = detection_model
+        self.model_key = WindowPredictionCache.make_model_key(detection_model)
+        self.batcher = DynamicBatcher(detection_model, max_batch_size=max_batch_size, max_wait=max_wait)
+        super().__init__((host, port), _InferenceRequestHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def info(self) -> Dict:
+        detection_model = self.detection_model
+        return {
+            "model_type": type(detection_model).__name__,
+            "model_key": self.model_key,
+            "category_mapping": detection_model.category_mapping,
+            "has_mask": bool(getattr(detection_model, "has_mask", False)),
+            "image_size": detection_model.image_size,
+            "max_batch_size": self.batcher.max_batch_size,
+            "max_wait": self.batcher.max_wait,
+            "statistics": dict(self.batcher.statistics),
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+
+def serve(
+    model_path: str,
+    model_type: str = "yolov8",
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    max_batch_size: int = 8,
+    max_wait_ms: float = 10,
+    device: str = None,
+    image_size: int = None,
+    **kwargs,
+):
+    """
+    Loads a model and serves it to RemoteDetectionModel clients until interrupted.
+
+    Args:
+        model_path (str): path for the model
+        model_type (str): model type, see sahi.auto_model.AutoDetectionModel
+        host (str): address to bind to
+        port (int): port to listen on
+        max_batch_size (int): maximum number of slices predicted in a single model call
+        max_wait_ms (float): maximum time a request waits for other requests to join its batch
+        device (str): "cpu" or "cuda:0"
+        image_size (int): inference input size
+        kwargs: model specific arguments, e.g. precision for "yolov8"
+    """
+    from sahi.auto_model import AutoDetectionModel
+
+    detection_model = AutoDetectionModel.from_pretrained(
+        model_type=model_type, model_path=model_path, device=device, image_size=image_size, **kwargs
+    )
+    server = InferenceServer(
+        detection_model, host=host, port=port, max_batch_size=max_batch_size, max_wait=max_wait_ms / 1000
+    )
+    print(f"Serving {model_path} on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -6,7 +6,7 @@ import logging
 import os
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence, Union
+from typing import Dict, Iterator, List, Optional, Sequence, Union
 
 import numpy as np
 from PIL import Image
@@ -14,8 +14,9 @@ from shapely.errors import TopologicalError
 from tqdm import tqdm
 
 from sahi.annotation import BoundingBox, Mask
+from sahi.reader import ImageReader, open_image_reader
 from sahi.utils.coco import Coco, CocoAnnotation, CocoImage, create_coco_dict
-from sahi.utils.cv import IMAGE_EXTENSIONS_LOSSLESS, IMAGE_EXTENSIONS_LOSSY, read_image_as_pil
+from sahi.utils.cv import IMAGE_EXTENSIONS_LOSSY, read_image_as_pil
 from sahi.utils.file import load_json, save_json
 
 logger = logging.getLogger(__name__)
@@ -146,33 +147,60 @@ def process_coco_annotations(coco_annotation_list: List[CocoAnnotation], slice_b
 
 
 class SlicedImage:
-    def __init__(self, image, coco_image, starting_pixel):
+    def __init__(self, image, coco_image, starting_pixel, image_reader: Optional[ImageReader] = None):
         """
         image: np.array
-            Sliced image.
+            Sliced image. If None, the slice is read from image_reader each time it is accessed.
         coco_image: CocoImage
             Coco styled image object that belong to sliced image.
         starting_pixel: list of list of int
             Starting pixel coordinates of the sliced image.
+        image_reader: sahi.reader.ImageReader
+            Reader of the full image, used when image is None.
         """
-        self.image = image
+        if image is None and image_reader is None:
+            raise ValueError("either image or image_reader should be given")
+        self._image = image
         self.coco_image = coco_image
         self.starting_pixel = starting_pixel
+        self.image_reader = image_reader
+
+    @property
+    def window(self) -> List[int]:
+        """
+        Window of the slice as [xmin, ymin, xmax, ymax] in full image coordinates.
+        """
+        xmin, ymin = self.starting_pixel
+        return [xmin, ymin, xmin + self.coco_image.width, ymin + self.coco_image.height]
+
+    @property
+    def image(self) -> np.ndarray:
+        if self._image is not None:
+            return self._image
+        # not kept, so that only the slices being processed are in memory
+        return self.image_reader.read_window(self.window)
+
+    @image.setter
+    def image(self, image: np.ndarray):
+        self._image = image
 
 
 class SliceImageResult:
-    def __init__(self, original_image_size=None, image_dir: str = None):
+    def __init__(self, original_image_size=None, image_dir: str = None, image_reader: Optional[ImageReader] = None):
         """
         sliced_image_list: list of SlicedImage
         image_dir: str
             Directory of the sliced image exports.
         original_image_size: list of int
             Size of the unsliced original image in [height, width]
+        image_reader: sahi.reader.ImageReader
+            Reader the slices are lazily read from, closed by close().
         """
         self._sliced_image_list: List[SlicedImage] = []
         self.original_image_height = original_image_size[0]
         self.original_image_width = original_image_size[1]
         self.image_dir = image_dir
+        self.image_reader = image_reader
 
     def add_sliced_image(self, sliced_image: SlicedImage):
         if not isinstance(sliced_image, SlicedImage):
@@ -186,7 +214,7 @@ class SliceImageResult:
 
     @property
     def images(self):
-        """Returns sliced images.
+        """Returns sliced images. All slices are read, use iter_images to read them one at a time.
 
         Returns:
             images: a list of np.array
@@ -196,6 +224,11 @@ class SliceImageResult:
             images.append(sliced_image.image)
         return images
 
+    def iter_images(self) -> Iterator[np.ndarray]:
+        """Yields sliced images, reading each one when it is requested."""
+        for sliced_image in self._sliced_image_list:
+            yield sliced_image.image
+
     @property
     def coco_images(self) -> List[CocoImage]:
         """Returns CocoImage representation of SliceImageResult.
@@ -234,11 +267,12 @@ class SliceImageResult:
 
     def __getitem__(self, i):
         def _prepare_ith_dict(i):
+            sliced_image = self._sliced_image_list[i]
             return {
-                "image": self.images[i],
-                "coco_image": self.coco_images[i],
-                "starting_pixel": self.starting_pixels[i],
-                "filename": self.filenames[i],
+                "image": sliced_image.image,
+                "coco_image": sliced_image.coco_image,
+                "starting_pixel": sliced_image.starting_pixel,
+                "filename": sliced_image.coco_image.file_name,
             }
 
         if isinstance(i, np.ndarray):
@@ -258,9 +292,14 @@ class SliceImageResult:
     def __len__(self):
         return len(self._sliced_image_list)
 
+    def close(self):
+        """Closes the image reader, slices can not be read afterwards."""
+        if self.image_reader is not None:
+            self.image_reader.close()
+
 
 def slice_image(
-    image: Union[str, Image.Image],
+    image: Union[str, Image.Image, np.ndarray, ImageReader],
     coco_annotation_list: Optional[CocoAnnotation] = None,
     output_file_name: Optional[str] = None,
     output_dir: Optional[str] = None,
@@ -277,7 +316,9 @@ def slice_image(
     sliced images.
 
     Args:
-        image (str or PIL.Image): File path of image or Pillow Image to be sliced.
+        image (str, PIL.Image, np.ndarray or sahi.reader.ImageReader): File path of image, Pillow Image, numpy
+            image or image reader to be sliced. Slices are read from the image when they are accessed, see
+            sahi.reader.open_image_reader.
         coco_annotation_list (CocoAnnotation): List of CocoAnnotation objects.
         output_file_name (str, optional): Root name of output files (coordinates will
             be appended to this)
@@ -325,13 +366,13 @@ def slice_image(
     if output_dir is not None:
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    # read image
-    image_pil = read_image_as_pil(image)
-    verboselog("image.shape: " + str(image_pil.size))
+    # open image, slices are decoded when they are accessed
+    image_reader = open_image_reader(image)
+    verboselog("image.shape: " + str(image_reader.shape))
 
-    image_width, image_height = image_pil.size
+    image_height, image_width = image_reader.shape
     if not (image_width != 0 and image_height != 0):
-        raise RuntimeError(f"invalid image size: {image_pil.size} for 'slice_image'.")
+        raise RuntimeError(f"invalid image size: {image_reader.shape} for 'slice_image'.")
     slice_bboxes = get_slice_bboxes(
         image_height=image_height,
         image_width=image_width,
@@ -346,39 +387,34 @@ def slice_image(
     n_ims = 0
 
     # init images and annotations lists
-    sliced_image_result = SliceImageResult(original_image_size=[image_height, image_width], image_dir=output_dir)
+    sliced_image_result = SliceImageResult(
+        original_image_size=[image_height, image_width], image_dir=output_dir, image_reader=image_reader
+    )
+
+    # set image file suffixes
+    if out_ext:
+        suffix = out_ext
+    else:
+        try:
+            suffix = Path(image if isinstance(image, (str, Path)) else image.filename).suffix
+            if suffix in IMAGE_EXTENSIONS_LOSSY:
+                suffix = ".png"
+            elif suffix not in Image.registered_extensions():
+                # e.g. .npy slices are exported as images
+                suffix = ".png"
+        except AttributeError:
+            suffix = ".png"
 
-    image_pil_arr = np.asarray(image_pil)
     # iterate over slices
     for slice_bbox in slice_bboxes:
         n_ims += 1
 
-        # extract image
-        tlx = slice_bbox[0]
-        tly = slice_bbox[1]
-        brx = slice_bbox[2]
-        bry = slice_bbox[3]
-        image_pil_slice = image_pil_arr[tly:bry, tlx:brx]
-
         # process annotations if coco_annotations is given
         if coco_annotation_list is not None:
             sliced_coco_annotation_list = process_coco_annotations(coco_annotation_list, slice_bbox, min_area_ratio)
 
-        # set image file suffixes
-        slice_suffixes = "_".join(map(str, slice_bbox))
-        if out_ext:
-            suffix = out_ext
-        else:
-            try:
-                suffix = Path(image_pil.filename).suffix
-                if suffix in IMAGE_EXTENSIONS_LOSSY:
-                    suffix = ".png"
-                elif suffix in IMAGE_EXTENSIONS_LOSSLESS:
-                    suffix = Path(image_pil.filename).suffix
-            except AttributeError:
-                suffix = ".png"
-
         # set image file name and path
+        slice_suffixes = "_".join(map(str, slice_bbox))
         slice_file_name = f"{output_file_name}_{slice_suffixes}{suffix}"
 
         # create coco image
@@ -391,21 +427,30 @@ def slice_image(
             for coco_annotation in sliced_coco_annotation_list:
                 coco_image.add_annotation(coco_annotation)
 
-        # create sliced image and append to sliced_image_result
+        # create sliced image and append to sliced_image_result, the slice is read on access
         sliced_image = SlicedImage(
-            image=image_pil_slice, coco_image=coco_image, starting_pixel=[slice_bbox[0], slice_bbox[1]]
+            image=None,
+            coco_image=coco_image,
+            starting_pixel=[slice_bbox[0], slice_bbox[1]],
+            image_reader=image_reader,
         )
         sliced_image_result.add_sliced_image(sliced_image)
 
     # export slices if output directory is provided
     if output_file_name and output_dir:
-        conc_exec = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
-        conc_exec.map(
-            _export_single_slice,
-            sliced_image_result.images,
-            [output_dir] * len(sliced_image_result),
-            sliced_image_result.filenames,
-        )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as conc_exec:
+            # read and exported in groups, so that at most MAX_WORKERS slices are in memory
+            sliced_image_list = sliced_image_result.sliced_image_list
+            for group_start in range(0, len(sliced_image_list), MAX_WORKERS):
+                group = sliced_image_list[group_start : group_start + MAX_WORKERS]
+                list(
+                    conc_exec.map(
+                        _export_single_slice,
+                        [sliced_image.image for sliced_image in group],
+                        [output_dir] * len(group),
+                        [sliced_image.coco_image.file_name for sliced_image in group],
+                    )
+                )
 
     verboselog(
         "Num slices: " + str(n_ims) + " slice_height: " + str(slice_height) + " slice_width: " + str(slice_width)
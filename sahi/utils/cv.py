@@ -151,6 +151,9 @@ def read_image_as_pil(image: Union[Image.Image, str, np.ndarray], exif_fix: bool
 
     if isinstance(image, Image.Image):
         image_pil = image
+    elif isinstance(image, str) and image.endswith(".npy"):
+        # numpy image saved with np.save
+        image_pil = Image.fromarray(np.load(image)).convert("RGB")
     elif isinstance(image, str):
         # read image if str image path is provided
         try:
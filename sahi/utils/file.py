@@ -2,6 +2,7 @@
 # Code written by Fatih C Akyon, 2020.
 
 import glob
+import hashlib
 import json
 import ntpath
 import os
@@ -197,6 +198,19 @@ def save_pickle(data, save_path):
         pickle.dump(data, outfile)
 
 
+def get_file_hash(path: str, algorithm: str = "sha256", chunk_size: int = 1 << 20) -> str:
+    """
+    Returns the hex digest of the content of the file at path.
+    Example inputs:
+        path: "dirname/image.jpg"
+    """
+    hasher = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 def import_model_class(model_type, class_name):
     """
     Imports a predefined detection class by class name.
@@ -0,0 +1,218 @@
+# OBSS SAHI Tool
+# Opt-in per-stage profiler with json summary and Chrome trace export.
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional
+
+# profiler collecting the spans of every thread of this process, None when profiling is off
+_active_profiler: Optional["Profiler"] = None
+
+
+class Profiler:
+    """
+    Records timed spans of the stages of a prediction and counters, e.g. the number of predictions before
+    and after merging. Profiling is off unless a profiler is active:
+
+        with Profiler() as profiler:
+            result = get_sliced_prediction(image, detection_model, slice_height=640, slice_width=640)
+        profiler.save_summary("profile.json")
+        profiler.save_chrome_trace("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+
+    Spans of all threads (e.g. the stages of sahi.pipeline.SlicedPredictionPipeline) are recorded while the
+    profiler is active. Other processes record their own profiler and hand its events to add_events.
+    """
+
+    def __init__(self):
+        # Chrome trace events: complete ("X") spans, counter ("C") samples and thread name ("M") metadata
+        self.events: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+        self._thread_ids = set()
+        self._lock = threading.Lock()
+        self._previous_profiler = None
+
+    def __enter__(self) -> "Profiler":
+        global _active_profiler
+        self._previous_profiler = _active_profiler
+        _active_profiler = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active_profiler
+        _active_profiler = self._previous_profiler
+        self._previous_profiler = None
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """
+        Times the enclosed block as a span named name, args (json serializable) are shown in the trace.
+        """
+        start_time = time.time()
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start_time, time.perf_counter() - time_start, **args)
+
+    def add_span(self, name: str, start_time: float, duration: float, **args):
+        """
+        Records a span that started at start_time (seconds since the epoch) and lasted duration seconds.
+        """
+        pid = os.getpid()
+        tid = threading.get_ident()
+        event = {
+            "name": name,
+            "cat": "stage",
+            "ph": "X",
+            "ts": start_time * 1e6,
+            "dur": duration * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": args,
+        }
+        with self._lock:
+            if (pid, tid) not in self._thread_ids:
+                self._thread_ids.add((pid, tid))
+                self.events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "tid": tid,
+                        "args": {"name": threading.current_thread().name},
+                    }
+                )
+            self.events.append(event)
+
+    def count(self, name: str, value: float = 1):
+        """
+        Adds value to the counter name, the running total is sampled in the trace.
+        """
+        with self._lock:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            self.events.append(
+                {"name": name, "ph": "C", "ts": time.time() * 1e6, "pid": os.getpid(), "args": {name: total}}
+            )
+
+    def add_events(self, events: List[Dict]):
+        """
+        Merges the events of another profiler, e.g. one recorded in a worker process.
+        """
+        # counter events hold running totals of the other profiler
+        last_totals = {}
+        with self._lock:
+            for event in events:
+                if event["ph"] == "C":
+                    name = event["name"]
+                    total = event["args"][name]
+                    self.counters[name] = self.counters.get(name, 0) + total - last_totals.get(name, 0)
+                    last_totals[name] = total
+                elif event["ph"] == "M":
+                    if (event["pid"], event["tid"]) in self._thread_ids:
+                        continue
+                    self._thread_ids.add((event["pid"], event["tid"]))
+                self.events.append(event)
+
+    def summary(self) -> Dict:
+        """
+        Returns the number of calls, total, mean and maximum duration of each stage, sorted by total
+        duration, and the counters. Spans nest (e.g. "inference" is part of "predict_slices"), the totals of
+        nested stages are not subtracted from their parents.
+        """
+        with self._lock:
+            spans = [event for event in self.events if event["ph"] == "X"]
+            counters = dict(self.counters)
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(span["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stage["count"] += 1
+            stage["total_seconds"] += span["dur"] / 1e6
+            stage["max_seconds"] = max(stage["max_seconds"], span["dur"] / 1e6)
+        for stage in stages.values():
+            stage["mean_seconds"] = stage["total_seconds"] / stage["count"]
+        wall_seconds = 0.0
+        if spans:
+            wall_seconds = (max(span["ts"] + span["dur"] for span in spans) - min(span["ts"] for span in spans)) / 1e6
+        return {
+            "wall_seconds": wall_seconds,
+            "stages": dict(sorted(stages.items(), key=lambda item: item[1]["total_seconds"], reverse=True)),
+            "counters": counters,
+        }
+
+    def save_summary(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def save_chrome_trace(self, path: str):
+        """
+        Writes the spans and counters in the Chrome trace event format.
+        """
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=_to_json)
+
+
+def _to_json(value):
+    # numpy scalars and arrays in span args
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def get_active_profiler() -> Optional[Profiler]:
+    return _active_profiler
+
+
+def profile(name: str, **args):
+    """
+    Returns a context manager timing the enclosed block in the active profiler, which does nothing when
+    profiling is off.
+    """
+    profiler = _active_profiler
+    if profiler is None:
+        return nullcontext()
+    return profiler.span(name, **args)
+
+
+def add_span(name: str, start_time: float, duration: float, **args):
+    """
+    Records a span timed by the caller (start_time from time.time()) in the active profiler, if any.
+    """
+    profiler = _active_profiler
+    if profiler is not None:
+        profiler.add_span(name, start_time, duration, **args)
+
+
+def count(name: str, value: float = 1):
+    """
+    Adds value to a counter of the active profiler, if any.
+    """
+    profiler = _active_profiler
+    if profiler is not None:
+        profiler.count(name, value)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """
+    Decorator timing each call of a function as a span named name, the function name by default.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active_profiler is None:
+                return function(*args, **kwargs)
+            with _active_profiler.span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,254 @@
+# OBSS SAHI Tool
+# Structured progress events of long running predictions, with tqdm and logging adapters.
+
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Protocol
+
+from tqdm import tqdm
+
+from sahi.utils.import_utils import is_available
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProgressEvent:
+    """
+    State of a stage of a long running task, e.g. the slices of get_sliced_prediction.
+    """
+
+    # name of the stage, e.g. "slicing", "prediction" or "merging"
+    stage: str
+    # number of completed and total items of the stage, total is 0 if unknown
+    completed: int = 0
+    total: int = 0
+    # items per second over the last updates, None until measured
+    items_per_second: Optional[float] = None
+    # estimated remaining time of the stage in seconds, None until measured
+    eta_seconds: Optional[float] = None
+    # resident memory of the process in bytes, None if it can not be measured
+    memory_bytes: Optional[int] = None
+    # status text, e.g. "Loading segmentation model..."
+    message: Optional[str] = None
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """
+        Completed fraction of the stage between 0 and 1, None if the total is unknown.
+        """
+        if self.total <= 0:
+            return None
+        return min(1.0, self.completed / self.total)
+
+    def format(self) -> str:
+        """
+        Returns a one line description, e.g. "prediction 340/4000 slices, 2.1/s, ETA 29:02, 1.8 GB".
+        """
+        if self.message is not None and self.total <= 0:
+            return self.message
+        parts = [f"{self.stage} {self.completed}/{self.total}" if self.total > 0 else self.stage]
+        if self.items_per_second is not None:
+            parts.append(f"{self.items_per_second:.1f}/s")
+        if self.eta_seconds is not None and self.completed < self.total:
+            parts.append(f"ETA {format_duration(self.eta_seconds)}")
+        if self.memory_bytes is not None:
+            parts.append(f"{self.memory_bytes / 1024 ** 3:.1f} GB")
+        if self.message is not None:
+            parts.append(self.message)
+        return ", ".join(parts)
+
+
+class ProgressCallback(Protocol):
+    """
+    Receives progress events. Callbacks are called from the thread doing the work, and may raise to abort it.
+    """
+
+    def __call__(self, event: ProgressEvent) -> None:
+        ...
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Formats a duration as [h:]mm:ss.
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def get_memory_usage() -> Optional[int]:
+    """
+    Returns the resident memory of this process in bytes, with psutil if installed, else from /proc on Linux.
+    """
+    if is_available("psutil"):
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ProgressTracker:
+    """
+    Turns completed counts of a stage into progress events for a callback. The rate is measured over the
+    last updates, so that the ETA follows slowdowns (e.g. dense regions of an image) instead of the average
+    since the start, and slow first items (model warm up) stop weighing on it.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[ProgressCallback],
+        stage: str,
+        total: int = 0,
+        window: int = 20,
+    ):
+        """
+        Args:
+            callback: ProgressCallback
+                Called with each event, nothing is measured if None.
+            stage: str
+                Name of the stage.
+            total: int
+                Number of items of the stage, 0 if unknown.
+            window: int
+                Number of most recent updates the rate is measured over.
+        """
+        self.callback = callback
+        self.stage = stage
+        self.total = total
+        self.completed = 0
+        # (time, completed) of the last updates
+        self._history = deque(maxlen=window + 1)
+        self._history.append((time.monotonic(), 0))
+
+    def update(self, completed: int, message: Optional[str] = None):
+        """
+        Reports that completed items of the stage are done.
+        """
+        self.completed = completed
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        self._history.append((now, completed))
+        items_per_second = None
+        eta_seconds = None
+        start_time, start_completed = self._history[0]
+        if completed > start_completed and now > start_time:
+            items_per_second = (completed - start_completed) / (now - start_time)
+            if self.total > 0:
+                eta_seconds = max(0, self.total - completed) / items_per_second
+        self.callback(
+            ProgressEvent(
+                stage=self.stage,
+                completed=completed,
+                total=self.total,
+                items_per_second=items_per_second,
+                eta_seconds=eta_seconds,
+                memory_bytes=get_memory_usage(),
+                message=message,
+            )
+        )
+
+    def advance(self, num_items: int = 1, message: Optional[str] = None):
+        self.update(self.completed + num_items, message=message)
+
+
+def report_message(callback: Optional[ProgressCallback], stage: str, message: str):
+    """
+    Sends a status message without counts, e.g. while a model is loading.
+    """
+    if callback is not None:
+        callback(ProgressEvent(stage=stage, message=message, memory_bytes=get_memory_usage()))
+
+
+class TqdmProgress:
+    """
+    Shows one tqdm bar per stage, stages reported while another stage is running (e.g. the slices of each
+    image of a batch) get a bar below it, which is cleared when the stage is complete.
+    """
+
+    def __init__(self, units: Optional[Dict[str, str]] = None, leave_stages=("images",)):
+        """
+        Args:
+            units: dict
+                Unit shown after the rate of each stage, e.g. {"prediction": "slice"}. Default: "it".
+            leave_stages: tuple
+                Stages whose bars are kept on screen when complete.
+        """
+        self.units = units or {}
+        self.leave_stages = leave_stages
+        self._bars: Dict[str, tqdm] = {}
+
+    def __call__(self, event: ProgressEvent):
+        if event.total <= 0:
+            if event.message is not None:
+                tqdm.write(event.message)
+            return
+        bar = self._bars.get(event.stage)
+        if bar is not None and (event.completed < bar.n or bar.total != event.total):
+            # the stage started again, e.g. for the next image
+            bar.close()
+            del self._bars[event.stage]
+            bar = None
+        if bar is None:
+            bar = tqdm(
+                total=event.total,
+                desc=event.stage,
+                unit=self.units.get(event.stage, "it"),
+                position=len(self._bars),
+                leave=event.stage in self.leave_stages,
+            )
+            self._bars[event.stage] = bar
+        if event.memory_bytes is not None:
+            bar.set_postfix(memory=f"{event.memory_bytes / 1024 ** 3:.1f}GB", refresh=False)
+        bar.update(event.completed - bar.n)
+        if event.completed >= event.total:
+            bar.close()
+            del self._bars[event.stage]
+
+    def close(self):
+        for bar in self._bars.values():
+            bar.close()
+        self._bars.clear()
+
+
+class LoggingProgress:
+    """
+    Logs progress events at most every interval seconds per stage, and always the first and last event
+    of a stage, for headless runs whose output goes to a log file.
+    """
+
+    def __init__(self, logger: logging.Logger = logger, interval: float = 30.0, level: int = logging.INFO):
+        """
+        Args:
+            logger: logging.Logger
+                Logger to write to.
+            interval: float
+                Minimum time in seconds between two logged events of a stage.
+            level: int
+                Logging level of the events.
+        """
+        self.logger = logger
+        self.interval = interval
+        self.level = level
+        self._last_logged: Dict[str, float] = {}
+
+    def __call__(self, event: ProgressEvent):
+        now = time.monotonic()
+        last_logged = self._last_logged.get(event.stage)
+        is_last = event.total > 0 and event.completed >= event.total
+        if last_logged is not None and not is_last and now - last_logged < self.interval:
+            return
+        self._last_logged[event.stage] = now
+        if is_last:
+            del self._last_logged[event.stage]
+        self.logger.log(self.level, event.format())
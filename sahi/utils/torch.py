@@ -82,3 +82,42 @@ def select_device(device: str):
         arg = "cpu"
 
     return torch.device(arg)
+
+
+def is_torch_bf16_cpu_supported():
+    """
+    Returns True if the CPU has native bfloat16 instructions (AVX512-BF16 or AMX), without them
+    bfloat16 autocast is emulated and slower than float32.
+    """
+    if not is_available("torch"):
+        return False
+    is_avx512_bf16_supported = getattr(torch.cpu, "_is_avx512_bf16_supported", lambda: False)
+    is_amx_tile_supported = getattr(torch.cpu, "_is_amx_tile_supported", lambda: False)
+    return is_avx512_bf16_supported() or is_amx_tile_supported()
+
+
+def quantize_dynamic_int8(model):
+    """
+    Replaces the Linear and Conv2d layers of model with dynamically quantized int8 layers: weights are
+    quantized once, activations are quantized on the fly at each forward pass. Runs on CPU only.
+
+    Args:
+        model: torch.nn.Module
+
+    Returns:
+        torch.nn.Module
+    """
+    import warnings
+
+    from torch.ao.nn.quantized import dynamic as nnqd
+    from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+    with warnings.catch_warnings():
+        # eager mode quantization is deprecated in favour of torchao, but still the only dependency free option
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return quantize_dynamic(
+            model,
+            qconfig_spec={torch.nn.Linear: default_dynamic_qconfig, torch.nn.Conv2d: default_dynamic_qconfig},
+            mapping={torch.nn.Linear: nnqd.Linear, torch.nn.Conv2d: nnqd.Conv2d},
+            dtype=torch.qint8,
+        )
@@ -1,41 +1,236 @@
 import cv2
-import matplotlib.pyplot as plt
+import json
 import networkx as nx
 import numpy as np
 import os
+import threading
+from PIL import Image
 from scipy.ndimage import convolve
 from skimage.morphology import skeletonize
 
 # custom modules
 import resources as res
-from sahi import AutoDetectionModel
-from sahi.predict import get_sliced_prediction
+from sahi.cache import PredictionResultCache, WindowPredictionCache
+from sahi.journal import SliceJournal
+from sahi.prefilter import ChainSlicePrefilter, NoDataSlicePrefilter, VarianceSlicePrefilter
+from sahi.utils.profiler import profile, profiled
+from sahi.utils.progress import report_message
 
 model_path = res.find('other/best.pt')
 
-detection_model = AutoDetectionModel.from_pretrained(
-    model_type='yolov8',
-    model_path=model_path,
-    confidence_threshold=0.2,
-    device='cpu'
-)
+# sliced prediction parameters, also part of the result cache key
+CONFIDENCE_THRESHOLD = 0.2
+SLICE_SIZE = 640
+OVERLAP_RATIO = 0.4
+# predict the whole image at low resolution first and only slice where it found cracks
+COARSE_TO_FINE = False
+# 'UNION' paints every predicted mask, 'HEATMAP_MEAN' averages the scores of overlapping slices
+# (down-weighting slice borders) and keeps pixels above HEATMAP_THRESHOLD
+POSTPROCESS_TYPE = 'UNION'
+HEATMAP_THRESHOLD = CONFIDENCE_THRESHOLD
+# pixels of a predicted mask are kept above this probability
+MASK_THRESHOLD = 0.5
+# url of a shared inference server started with 'python whatthecrack.py serve', slices are then predicted
+# by the model of the server (which should serve the same best.pt) instead of a copy loaded in this process
+INFERENCE_SERVER_URL = os.environ.get('WHATTHECRACK_SERVER')
+
+
+class LazyModel:
+    # loads a model in a background thread, so that importing this module and opening the window stay fast
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loaded = threading.Event()
+        self._model = None
+        self._error = None
+
+    def start(self):
+        # starts loading if not already started, returns immediately
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name='model-loader', daemon=True)
+                self._thread.start()
+
+    def _load(self):
+        try:
+            self._model = self._loader()
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._loaded.set()
+
+    def is_loaded(self):
+        return self._loaded.is_set()
+
+    def get(self, check_cancelled=None):
+        # waits for the model only if loading is not finished, check_cancelled may raise to stop waiting
+        self.start()
+        while not self._loaded.wait(0.1):
+            if check_cancelled is not None:
+                check_cancelled()
+        if self._error is not None:
+            raise RuntimeError('Loading the segmentation model failed') from self._error
+        return self._model
+
+
+def load_detection_model():
+    # torch and ultralytics are only imported here, in the loading thread
+    from sahi import AutoDetectionModel
+
+    if INFERENCE_SERVER_URL:
+        return AutoDetectionModel.from_pretrained(
+            model_type='remote',
+            model_path=INFERENCE_SERVER_URL,
+            confidence_threshold=CONFIDENCE_THRESHOLD,
+            mask_threshold=MASK_THRESHOLD
+        )
+    return AutoDetectionModel.from_pretrained(
+        model_type='yolov8',
+        model_path=model_path,
+        confidence_threshold=CONFIDENCE_THRESHOLD,
+        mask_threshold=MASK_THRESHOLD,
+        device='cpu'
+    )
+
+
+detection_model = LazyModel(load_detection_model)
+
+# segmentation results of already processed images, least recently used ones are dropped above 2 GB
+RESULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'whatthecrack', 'results')
+result_cache = PredictionResultCache(RESULT_CACHE_DIR, max_size_bytes=2 * 1024 ** 3)
+
+# raw predictions of each slice window, re-running with another overlap or a higher confidence
+# threshold only predicts the windows never seen before
+WINDOW_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'whatthecrack', 'windows')
+window_cache = WindowPredictionCache(WINDOW_CACHE_DIR, max_size_bytes=4 * 1024 ** 3)
+
+# slice predictions of the image being segmented, an interrupted segmentation (closed app, killed batch)
+# resumes where it stopped, the journal is removed once the result is cached
+JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'whatthecrack', 'journals')
+
+
+# slices that are almost entirely black borders or perfectly uniform can not contain cracks
+slice_prefilter = ChainSlicePrefilter([
+    NoDataSlicePrefilter(threshold=0.02, nodata_value=0),
+    VarianceSlicePrefilter(threshold=2.0),
+])
+
 
+@profiled()
+def get_segmentation_result(helper, img_path, batch_size=4, num_workers=0, prefilter=slice_prefilter, journal=None):
+    # helper receives progress events (sahi.utils.progress), its optional check_cancelled() may raise to stop
+    # num_workers > 0 predicts the slices in that many processes, each with its own model replica
+    # prefilter=None sends every slice to the model, journal (sahi.journal.SliceJournal) makes it resumable
+    from sahi.predict import get_sliced_prediction
+
+    if not detection_model.is_loaded():
+        report_message(helper, 'loading', 'Loading segmentation model...')
+    model = detection_model.get(check_cancelled=getattr(helper, 'check_cancelled', None))
 
-def get_segmentation_result(helper, img_path):
     result = get_sliced_prediction(
-        helper,
         img_path,
-        detection_model,
-        slice_height=640,
-        slice_width=640,
-        overlap_height_ratio=0.4,
-        overlap_width_ratio=0.4
+        model,
+        slice_height=SLICE_SIZE,
+        slice_width=SLICE_SIZE,
+        overlap_height_ratio=OVERLAP_RATIO,
+        overlap_width_ratio=OVERLAP_RATIO,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        slice_prefilter=prefilter,
+        window_cache=window_cache,
+        journal=journal,
+        coarse_to_fine=COARSE_TO_FINE,
+        # only the binary mask is used, predictions are painted into one canvas instead of merged
+        postprocess_type=POSTPROCESS_TYPE,
+        heatmap_threshold=HEATMAP_THRESHOLD,
+        # overlap slicing, inference and mask shifting when predicting in this process
+        pipelined=num_workers == 0,
+        progress_callback=helper
     )
 
+    stats = result.slice_statistics
+    if stats['num_skipped_slices']:
+        print(f"Skipped {stats['num_skipped_slices']}/{stats['num_slices']} empty slices, "
+              f"saved about {stats['estimated_seconds_saved']:.1f} s")
+    if stats['num_coarse_skipped_slices']:
+        print(f"Coarse pass ruled out {stats['num_coarse_skipped_slices']}/{stats['num_slices']} slices")
+    if stats['num_cached_slices']:
+        print(f"Reused cached predictions of {stats['num_cached_slices']}/{stats['num_slices']} slices")
+    if stats['num_resumed_slices']:
+        print(f"Resumed after {stats['num_resumed_slices']}/{stats['num_slices']} slices of an interrupted run")
+
     return result
 
 
+def get_segmentation_parameters(prefilter=slice_prefilter):
+    # every parameter changing the binary mask of an image, besides the image and the model
+    return dict(
+        confidence_threshold=CONFIDENCE_THRESHOLD,
+        slice_size=SLICE_SIZE,
+        overlap_ratio=OVERLAP_RATIO,
+        coarse_to_fine=COARSE_TO_FINE,
+        postprocess_type=POSTPROCESS_TYPE,
+        heatmap_threshold=HEATMAP_THRESHOLD,
+        mask_threshold=MASK_THRESHOLD,
+        prefilter=repr(prefilter)
+    )
+
+
+def get_result_cache_key(img_path, prefilter=slice_prefilter):
+    model_key = None
+    if INFERENCE_SERVER_URL:
+        # the server chooses the model, the local weights may be missing or differ from it
+        model_key = detection_model.get().remote_model_key
+    return result_cache.make_result_key(
+        img_path, model_path, model_key=model_key, **get_segmentation_parameters(prefilter)
+    )
+
+
+@profiled()
+def load_cached_binary(img_path, prefilter=slice_prefilter):
+    # returns the binary mask of an already segmented image, or None
+    cached = result_cache.get_result(get_result_cache_key(img_path, prefilter))
+    if cached is None:
+        return None
+    return cached.binary_mask
+
+
+def cache_segmentation_result(img_path, binary, result, prefilter=slice_prefilter):
+    result_cache.put_result(
+        get_result_cache_key(img_path, prefilter),
+        binary,
+        result.object_prediction_list,
+        metadata={'durations_in_seconds': result.durations_in_seconds}
+    )
+
+
+def get_journal(img_path, prefilter=slice_prefilter):
+    # one journal per image, model and parameters, like the result cache
+    return SliceJournal(os.path.join(JOURNAL_DIR, get_result_cache_key(img_path, prefilter) + '.journal'))
+
+
+def get_binary_mask(helper, img_path, **kwargs):
+    # an image already segmented with the same model and parameters is not predicted again,
+    # kwargs are passed to get_segmentation_result
+    binary = load_cached_binary(img_path)
+    if binary is None:
+        journal = get_journal(img_path)
+        result = get_segmentation_result(helper, img_path, journal=journal, **kwargs)
+        check_cancelled = getattr(helper, 'check_cancelled', None)
+        if check_cancelled is not None:
+            check_cancelled()
+        binary = create_binary_from_yolo(result)
+        cache_segmentation_result(img_path, binary, result)
+        journal.remove()
+    return binary
+
+
+@profiled()
 def create_binary_from_yolo(result):
+    if result.binary_mask is not None:
+        return result.binary_mask
+
     first_mask = result.object_prediction_list[0]
     mask = np.asarray(first_mask.mask.bool_mask)
     combined_mask = mask
@@ -62,6 +257,7 @@ def binary_to_color_mask(binary_image):
     return color_image
 
 
+@profiled()
 def binary_to_skeleton(binary_image):
     # Skeletonize the image
     skeleton = skeletonize(binary_image)
@@ -75,6 +271,32 @@ def binary_to_skeleton(binary_image):
     return skeleton_image
 
 
+@profiled()
+def compute_outputs_from_binary(binary, binary_path, color_mask_path, skeleton_path, color_skeleton_path):
+    color_mask = binary_to_color_mask(binary)
+    skel = binary_to_skeleton(binary)
+    color_skel = binary_to_color_mask(skel)
+
+    # save the 4 images
+    with profile('save_images'):
+        image = Image.fromarray(binary)
+        image.save(binary_path)
+        image = Image.fromarray(color_mask)
+        image.save(color_mask_path)
+        image = Image.fromarray(skel)
+        image.save(skeleton_path)
+        image = Image.fromarray(color_skel)
+        image.save(color_skeleton_path)
+
+    # compute junctions from skeleton image
+    junctions, endpoints = find_junctions_endpoints(skeleton_path)
+    graph = build_graph(junctions, endpoints, skel)
+    lookup_table = segment_lookup_table(graph)
+
+    return junctions, endpoints, graph, lookup_table
+
+
+@profiled()
 def find_junctions_endpoints(skel_path):
     img = cv2.imread(skel_path, 0)
     _, skel = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
@@ -213,6 +435,7 @@ def remove_mask_from_paint(img, coords):
 
 
 
+@profiled()
 def build_graph(junctions, endpoints, skel):
     G = nx.Graph()
 
@@ -310,6 +533,7 @@ def build_graph_old(junctions, endpoints, skel):
     return G
 
 
+@profiled()
 def segment_lookup_table(graph):
     lookup = {}
     for edge in graph.edges:
@@ -323,6 +547,38 @@ def segment_lookup_table(graph):
     return lookup
 
 
+@profiled()
+def get_crack_length(graph):
+    # length in pixels of all skeleton paths between junctions and endpoints, diagonal steps count sqrt(2)
+    length = 0.0
+    for start, end in graph.edges:
+        path = np.asarray(graph.edges[start, end]['path'])
+        if len(path) > 1:
+            length += np.linalg.norm(np.diff(path, axis=0), axis=1).sum()
+    return float(length)
+
+
+@profiled()
+def save_graph(graph, graph_path, junctions, endpoints):
+    # nodes as [y, x] pixels with their kind, edges as the skeleton path joining them
+    junction_set = set(map(tuple, np.asarray(junctions).tolist()))
+    node_ids = {node: i for i, node in enumerate(graph.nodes)}
+    data = {
+        'nodes': [
+            {'id': i, 'y': int(node[0]), 'x': int(node[1]),
+             'kind': 'junction' if tuple(map(int, node)) in junction_set else 'endpoint'}
+            for node, i in node_ids.items()
+        ],
+        'edges': [
+            {'source': node_ids[start], 'target': node_ids[end],
+             'path': [[int(y), int(x)] for y, x in graph.edges[start, end]['path']]}
+            for start, end in graph.edges
+        ],
+    }
+    with open(graph_path, 'w') as f:
+        json.dump(data, f)
+
+
 def get_segment_pixels(segment, graph):
     # Extract the start and end points from the segment
     start, end = segment
@@ -344,6 +600,9 @@ def find_path_bis(x, y, graph, lookup_table):
 
 
 def visualize_graph(graph, skel):
+    # debugging helper, matplotlib is slow to import
+    import matplotlib.pyplot as plt
+
     # Create a plot
     plt.figure(figsize=(12, 12))
 
@@ -0,0 +1,95 @@
+# OBSS SAHI Tool
+
+import unittest
+
+import numpy as np
+
+from sahi.models.base import DetectionModel
+from sahi.predict import get_sliced_prediction
+from sahi.prediction import ObjectPrediction
+
+
+class BrightPixelsModel(DetectionModel):
+    """
+    Predicts the nonzero pixels of an image as one instance with a fixed score, nothing on images larger than
+    max_image_size.
+    """
+
+    def __init__(self, score: float, max_image_size: int = None, **kwargs):
+        self.score = score
+        self.max_image_size = max_image_size
+        super().__init__(model=object(), category_mapping={"0": "crack"}, **kwargs)
+
+    def set_device(self):
+        pass
+
+    def set_model(self, model):
+        self.model = model
+
+    def perform_inference(self, image: np.ndarray):
+        if self.max_image_size is not None and max(image.shape[:2]) > self.max_image_size:
+            image = np.zeros_like(image)
+        self._original_predictions = [image.max(axis=2) > 0]
+
+    def _create_object_prediction_list_from_original_predictions(self, shift_amount_list=[[0, 0]], full_shape_list=None):
+        shift_amount = shift_amount_list[0] if isinstance(shift_amount_list[0], list) else shift_amount_list
+        full_shape = full_shape_list[0] if full_shape_list and isinstance(full_shape_list[0], list) else full_shape_list
+        object_prediction_list = []
+        bool_mask = self._original_predictions[0]
+        if bool_mask.any():
+            rows, columns = np.flatnonzero(bool_mask.any(axis=1)), np.flatnonzero(bool_mask.any(axis=0))
+            object_prediction_list.append(
+                ObjectPrediction(
+                    bbox=[int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1],
+                    category_id=0,
+                    category_name="crack",
+                    bool_mask=bool_mask,
+                    score=self.score,
+                    shift_amount=shift_amount,
+                    full_shape=full_shape,
+                )
+            )
+        self._object_prediction_list_per_image = [object_prediction_list]
+
+
+class TestHeatmapFusion(unittest.TestCase):
+    def test_single_detection_survives_fusion(self):
+        detection_model = BrightPixelsModel(score=0.3, confidence_threshold=0.2)
+        image = np.zeros((200, 300, 3), dtype=np.uint8)
+        # seen by a single slice, then by four overlapping slices
+        image[10:30, 10:30] = 255
+        image[85:95, 85:95] = 255
+        for postprocess_type in ["HEATMAP_MEAN", "HEATMAP_MAX"]:
+            result = get_sliced_prediction(
+                image,
+                detection_model,
+                slice_height=100,
+                slice_width=100,
+                overlap_height_ratio=0.2,
+                overlap_width_ratio=0.2,
+                postprocess_type=postprocess_type,
+                verbose=0,
+            )
+            self.assertTrue((result.binary_mask[10:30, 10:30] == 255).all(), postprocess_type)
+            self.assertTrue((result.binary_mask[85:95, 85:95] == 255).all(), postprocess_type)
+            self.assertEqual(int((result.binary_mask > 0).sum()), 20 * 20 + 10 * 10, postprocess_type)
+
+    def test_standard_prediction_does_not_dilute_mean(self):
+        # the full image predicts nothing, slices see the object
+        detection_model = BrightPixelsModel(score=0.3, max_image_size=100, confidence_threshold=0.2)
+        image = np.zeros((200, 300, 3), dtype=np.uint8)
+        image[10:30, 10:30] = 255
+        result = get_sliced_prediction(
+            image,
+            detection_model,
+            slice_height=100,
+            slice_width=100,
+            perform_standard_pred=True,
+            postprocess_type="HEATMAP_MEAN",
+            verbose=0,
+        )
+        self.assertEqual(int((result.binary_mask > 0).sum()), 20 * 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+# OBSS SAHI Tool
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from sahi.reader import ArrayImageReader, TiffImageReader
+from sahi.utils.cv import read_image_as_pil
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+
+class TestImageReader(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_array_reader_saturates_uint16(self):
+        array = np.array([[0, 44, 300, 65535]], dtype=np.uint16)
+        window = ArrayImageReader(array, convert_rgb=True).read()
+        self.assertEqual(window.dtype, np.uint8)
+        self.assertEqual(window[0, :, 0].tolist(), [0, 44, 255, 255])
+
+    @unittest.skipIf(tifffile is None, "tifffile is not installed")
+    def test_tiff_reader_uint16(self):
+        image = np.tile(np.array([[0, 44, 300, 65535]], dtype=np.uint16), (64, 16))
+        for name, kwargs in [("strips.tif", {}), ("tiles.tif", {"tile": (32, 32), "compression": "zlib"})]:
+            path = os.path.join(self.temp_dir.name, name)
+            tifffile.imwrite(path, image, **kwargs)
+            with TiffImageReader(path) as reader:
+                window = reader.read_window([2, 10, 50, 40])
+                full_image = reader.read()
+            expected = np.asarray(read_image_as_pil(path))
+            self.assertEqual(window.shape, (30, 48, 3))
+            self.assertTrue((window == expected[10:40, 2:50]).all())
+            self.assertTrue((full_image == expected).all())
+            self.assertEqual(full_image[0, :4, 0].tolist(), [0, 44, 255, 255])
+
+    @unittest.skipIf(tifffile is None, "tifffile is not installed")
+    def test_tiff_reader_palette(self):
+        rng = np.random.default_rng(0)
+        indices = rng.integers(0, 256, (100, 120), dtype=np.uint8)
+        colormap = rng.integers(0, 65536, (3, 256)).astype(np.uint16)
+        path = os.path.join(self.temp_dir.name, "palette.tif")
+        tifffile.imwrite(path, indices, photometric="palette", colormap=colormap, tile=(32, 32))
+        with TiffImageReader(path) as reader:
+            image = reader.read()
+        self.assertEqual(image.shape, (100, 120, 3))
+        self.assertTrue((image == np.asarray(read_image_as_pil(path))).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,282 @@
+"""
+Headless entry points of WhatTheCrack, for processing images without the GUI.
+
+    python whatthecrack.py batch <folder, image or list of images> --output_dir=results --num_workers=4
+    python whatthecrack.py batch <folder> --profile_dir=profile
+    python whatthecrack.py serve --port=8765
+
+Each image gets a folder in output_dir with the same mask, skeleton and graph outputs as the GUI, and
+output_dir/metrics.csv gets one row of crack metrics per image. serve shares one model between all the
+WhatTheCrack processes of a host started with WHATTHECRACK_SERVER=http://127.0.0.1:8765.
+--profile_dir times every stage of the batch, see sahi.utils.profiler.
+"""
+import concurrent.futures
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+import fire
+
+import segment_engine as seg
+from sahi.cache import get_cached_file_hash
+from sahi.server import serve as serve_model
+from sahi.utils.profiler import Profiler, profile
+from sahi.utils.progress import LoggingProgress, ProgressTracker, TqdmProgress
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp')
+
+# outputs written in the folder of each image, same images as the GUI
+OUT_BINARY_MASK = 'combined_binary_mask.png'
+OUT_COLOR_MASK = 'combined_color_mask.png'
+OUT_BINARY_SKELETON = 'skeleton_image.png'
+OUT_COLOR_SKELETON = 'skeleton_color.png'
+OUT_GRAPH = 'graph.json'
+# written last, an image whose metrics file is newer than the image and was computed with the same
+# model and parameters is up to date
+OUT_METRICS = 'metrics.json'
+METRICS_FILE = 'metrics.csv'
+
+METRICS_FIELDS = [
+    'image', 'status', 'width', 'height', 'crack_area_px', 'crack_length_px', 'crack_length_mm',
+    'num_junctions', 'num_endpoints', 'num_segments', 'seconds'
+]
+
+
+def list_images(source, recursive=False):
+    """
+    Returns (image path, output name) pairs of a folder, an image, a text file listing one image per line
+    or a list of any of those. Output names are relative to the folder an image was found in.
+    """
+    sources = [source] if isinstance(source, (str, os.PathLike)) else list(source)
+    images = []
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            pattern = '**/*' if recursive else '*'
+            for path in sorted(source.glob(pattern)):
+                if path.suffix.lower() in IMAGE_EXTENSIONS:
+                    images.append((path, path.relative_to(source).with_suffix('').as_posix()))
+        elif source.suffix.lower() == '.txt':
+            with open(source) as f:
+                for line in f:
+                    if line.strip():
+                        path = Path(line.strip())
+                        images.append((path, path.stem))
+        elif source.exists():
+            images.append((source, source.stem))
+        else:
+            raise FileNotFoundError(f'{source} does not exist')
+
+    names = [name for _, name in images]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'several images would be written to the same output folder: {duplicates}')
+    return images
+
+
+def get_batch_parameters():
+    # the outputs of an image are stale if any of these changed
+    return dict(seg.get_segmentation_parameters(), model=get_cached_file_hash(seg.model_path))
+
+
+def is_up_to_date(image_path, image_output_dir, parameters):
+    metrics_path = image_output_dir / OUT_METRICS
+    output_names = [OUT_BINARY_MASK, OUT_COLOR_MASK, OUT_BINARY_SKELETON, OUT_COLOR_SKELETON, OUT_GRAPH]
+    if not metrics_path.exists() or not all((image_output_dir / name).exists() for name in output_names):
+        return False
+    if metrics_path.stat().st_mtime < image_path.stat().st_mtime:
+        return False
+    with open(metrics_path) as f:
+        return json.load(f).get('parameters') == parameters
+
+
+def write_outputs(binary, image_output_dir, name, parameters, mm_per_pixel=None, seconds=0.0):
+    # runs in a worker process: skeleton, graph and image encoding do not wait for the model
+    time_start = time.time()
+    image_output_dir.mkdir(parents=True, exist_ok=True)
+    junctions, endpoints, graph, _ = seg.compute_outputs_from_binary(
+        binary,
+        str(image_output_dir / OUT_BINARY_MASK),
+        str(image_output_dir / OUT_COLOR_MASK),
+        str(image_output_dir / OUT_BINARY_SKELETON),
+        str(image_output_dir / OUT_COLOR_SKELETON),
+    )
+    seg.save_graph(graph, str(image_output_dir / OUT_GRAPH), junctions, endpoints)
+
+    crack_length = seg.get_crack_length(graph)
+    metrics = {
+        'image': name,
+        'status': 'ok',
+        'width': binary.shape[1],
+        'height': binary.shape[0],
+        'crack_area_px': int((binary > 0).sum()),
+        'crack_length_px': round(crack_length, 2),
+        'crack_length_mm': round(crack_length * mm_per_pixel, 2) if mm_per_pixel else None,
+        'num_junctions': len(junctions),
+        'num_endpoints': len(endpoints),
+        'num_segments': graph.number_of_edges(),
+        'seconds': round(seconds + time.time() - time_start, 2),
+    }
+    with open(image_output_dir / OUT_METRICS, 'w') as f:
+        json.dump(dict(metrics, parameters=parameters), f)
+    return metrics
+
+
+def write_outputs_profiled(*args):
+    # runs in a worker process, its spans are merged into the profile of the batch
+    with Profiler() as profiler:
+        metrics = write_outputs(*args)
+    return metrics, profiler.events
+
+
+def write_metrics_csv(metrics_list, csv_path):
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=METRICS_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for metrics in sorted(metrics_list, key=lambda metrics: metrics['image']):
+            writer.writerow(metrics)
+
+
+def batch(source, output_dir='whatthecrack_results', num_workers=2, mm_per_pixel=None, force=False,
+          recursive=False, progress='tqdm', profile_dir=None):
+    """
+    Segments every image of source with one shared model and writes their outputs and metrics.
+
+    Args:
+        source: folder, image, text file listing one image per line, or a list of those
+        output_dir: folder of the outputs, one sub folder per image and metrics.csv
+        num_workers: number of processes computing skeletons, graphs and output images while the model
+            predicts the next images, 0 computes them in this process
+        mm_per_pixel: image resolution, adds crack lengths in mm to the metrics
+        force: process images whose outputs are up to date as well
+        recursive: also look for images in sub folders of source folders
+        progress: 'tqdm' shows progress bars over images and over the slices of the current image, 'log'
+            logs progress with throughput, ETA and memory every 30 s, for runs whose output goes to a file
+        profile_dir: folder where the time spent in each stage (slicing, inference, merging, skeleton, graph...)
+            is written, as a summary (profile.json) and a trace (trace.json) to open in chrome://tracing or
+            https://ui.perfetto.dev, no profiling if None
+    Returns:
+        The path of the metrics CSV file.
+    """
+    images = list_images(source, recursive=recursive)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    parameters = get_batch_parameters()
+
+    metrics_list = []
+    todo = []
+    for image_path, name in images:
+        image_output_dir = output_dir / name
+        if not force and is_up_to_date(image_path, image_output_dir, parameters):
+            with open(image_output_dir / OUT_METRICS) as f:
+                metrics = json.load(f)
+            crack_length = metrics['crack_length_px']
+            metrics['crack_length_mm'] = round(crack_length * mm_per_pixel, 2) if mm_per_pixel else None
+            metrics_list.append(metrics)
+        else:
+            todo.append((image_path, name))
+    print(f'{len(todo)} of {len(images)} images to process, {len(images) - len(todo)} up to date')
+
+    if progress == 'tqdm':
+        progress_callback = TqdmProgress(units={'images': 'image', 'prediction': 'slice'})
+    elif progress == 'log':
+        progress_callback = LoggingProgress()
+    else:
+        raise ValueError(f"progress should be 'tqdm' or 'log' but given as {progress}")
+    executor = None
+    if num_workers > 0:
+        # spawned, the workers do not need a copy of the process holding the model
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=multiprocessing.get_context('spawn')
+        )
+    # output futures of the images being written, by image name
+    pending = {}
+
+    def failed(name, stage, error):
+        print(f'{name}: {stage} failed: {error}')
+        metrics_list.append({'image': name, 'status': f'{stage} failed: {error}'})
+
+    def collect(futures):
+        for future in futures:
+            name = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                failed(name, 'writing outputs', e)
+                continue
+            if profiler is not None:
+                result, events = result
+                profiler.add_events(events)
+            metrics_list.append(result)
+
+    with Profiler() if profile_dir is not None else contextlib.nullcontext() as profiler:
+        try:
+            images_progress = ProgressTracker(progress_callback, 'images', total=len(todo))
+            for ind, (image_path, name) in enumerate(todo):
+                images_progress.update(ind)
+                time_start = time.time()
+                try:
+                    with profile('segmentation', image=name):
+                        binary = seg.get_binary_mask(progress_callback, str(image_path))
+                except Exception as e:
+                    failed(name, 'segmentation', e)
+                    continue
+                args = (binary, output_dir / name, name, parameters, mm_per_pixel, time.time() - time_start)
+                if executor is None:
+                    try:
+                        with profile('write_outputs', image=name):
+                            metrics_list.append(write_outputs(*args))
+                    except Exception as e:
+                        failed(name, 'writing outputs', e)
+                    continue
+                task = write_outputs if profiler is None else write_outputs_profiled
+                pending[executor.submit(task, *args)] = name
+                # masks waiting for a worker are kept in memory, the model waits for the workers beyond that
+                if len(pending) >= 2 * num_workers:
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect(done)
+            images_progress.update(len(todo))
+            collect(list(concurrent.futures.as_completed(pending)))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            # also written when interrupted, with the images processed so far
+            csv_path = output_dir / METRICS_FILE
+            write_metrics_csv(metrics_list, csv_path)
+            if profiler is not None:
+                profile_dir = Path(profile_dir)
+                profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.save_summary(profile_dir / 'profile.json')
+                profiler.save_chrome_trace(profile_dir / 'trace.json')
+                print(f'Profile written to {profile_dir}')
+
+    num_failed = sum(metrics['status'] != 'ok' for metrics in metrics_list)
+    print(f'Metrics of {len(metrics_list)} images written to {csv_path}, {num_failed} failed')
+    return str(csv_path)
+
+
+def serve(host='127.0.0.1', port=8765, max_batch_size=8, max_wait_ms=10, device='cpu'):
+    """
+    Serves the segmentation model to the GUI and batch processes of this host, which predict their slices
+    with it instead of loading their own copy when WHATTHECRACK_SERVER is set to its url. Slices of
+    concurrent requests are predicted together, in batches of up to max_batch_size slices.
+
+    Args:
+        host: address to bind to, requests are not authenticated so keep it local
+        port: port to listen on
+        max_batch_size: maximum number of slices predicted in a single model call
+        max_wait_ms: maximum time a request waits for requests of other processes to join its batch
+        device: 'cpu' or 'cuda:0'
+    """
+    serve_model(
+        seg.model_path, model_type='yolov8', host=host, port=port, max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms, device=device
+    )
+
+
+if __name__ == '__main__':
+    fire.Fire({'batch': batch, 'serve': serve})